@@ -1,7 +1,6 @@
 from django.db import models
 
 from emotions.enums import EMOTION_COLORS
-from slugify import slugify
 
 
 class Emotion(models.Model):
@@ -32,6 +31,9 @@ class Emotion(models.Model):
     def save(self, *args, **kwargs):
         # Всегда генерируем slug, если он пустой
         if not self.slug or self.slug.strip() == "":
+            # Транслитерация нужна только здесь, не на старте процесса
+            from slugify import slugify
+
             self.slug = slugify(self.name)
 
         if self.slug:
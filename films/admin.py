@@ -1,7 +1,35 @@
-from django.contrib import admin
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.admin.helpers import ActionForm
+from django.core.exceptions import ValidationError
+from django.db import transaction
 from django.utils.html import format_html
 
-from .models import Film, FilmEmotionRating
+from movie_emotion.pagination import EstimatedCountPaginator
+from .models import Film, FilmEmotionRating, deferred_rating_updates
+
+
+class FilmEmotionRatingInline(admin.TabularInline):
+    model = FilmEmotionRating
+    extra = 1
+    fields = ["emotion", "intensity", "description", "rated_by"]
+    autocomplete_fields = ["rated_by"]
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("emotion", "rated_by")
+
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        formfield = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == "emotion":
+            # Эмоций немного - один запрос на все строки инлайна вместо запроса на строку
+            formfield.choices = list(formfield.choices)
+        return formfield
+
+
+class SetIntensityActionForm(ActionForm):
+    intensity = forms.IntegerField(
+        min_value=1, max_value=10, required=False, label="Интенсивность"
+    )
 
 
 @admin.register(Film)
@@ -19,6 +47,11 @@ class FilmAdmin(admin.ModelAdmin):
     list_filter = ["genre", "year", "is_published", "created_at"]
     search_fields = ["title", "director", "description", "country"]
     readonly_fields = ["created_at", "updated_at", "views_count", "rating"]
+    autocomplete_fields = ["created_by"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    inlines = [FilmEmotionRatingInline]
+    actions = ["recalculate_ratings"]
     fieldsets = (
         (
             "Основная информация",
@@ -69,6 +102,17 @@ class FilmAdmin(admin.ModelAdmin):
     def get_queryset(self, request):
         return super().get_queryset(request).select_related("created_by")
 
+    def changeform_view(self, request, object_id=None, form_url="", extra_context=None):
+        # Оценки из инлайна сохраняются без пересчета рейтинга на каждую строку:
+        # рейтинг и рассылка подписчикам - один раз на фильм после сохранения
+        with transaction.atomic(), deferred_rating_updates():
+            return super().changeform_view(request, object_id, form_url, extra_context)
+
+    @admin.action(description="Пересчитать рейтинг по эмоциональным оценкам")
+    def recalculate_ratings(self, request, queryset):
+        updated = queryset.update_ratings()
+        self.message_user(request, f"Рейтинг пересчитан для фильмов: {updated}")
+
 
 @admin.register(FilmEmotionRating)
 class FilmEmotionRatingAdmin(admin.ModelAdmin):
@@ -76,6 +120,11 @@ class FilmEmotionRatingAdmin(admin.ModelAdmin):
     list_filter = ["emotion", "intensity", "created_at"]
     search_fields = ["film__title", "emotion__name"]
     readonly_fields = ["created_at"]
+    autocomplete_fields = ["film", "rated_by"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    action_form = SetIntensityActionForm
+    actions = ["set_intensity"]
 
     def get_queryset(self, request):
         return (
@@ -83,3 +132,38 @@ class FilmEmotionRatingAdmin(admin.ModelAdmin):
             .get_queryset(request)
             .select_related("film", "emotion", "rated_by__user")
         )
+
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic(), deferred_rating_updates():
+            super().save_model(request, obj, form, change)
+
+    def delete_model(self, request, obj):
+        with transaction.atomic(), deferred_rating_updates():
+            super().delete_model(request, obj)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(), deferred_rating_updates() as film_ids:
+            film_ids.update(queryset.values_list("film_id", flat=True))
+            super().delete_queryset(request, queryset)
+
+    @admin.action(description="Установить интенсивность выбранным оценкам")
+    def set_intensity(self, request, queryset):
+        try:
+            intensity = SetIntensityActionForm.base_fields["intensity"].clean(
+                request.POST.get("intensity")
+            )
+        except ValidationError:
+            intensity = None
+        if intensity is None:
+            self.message_user(
+                request, "Укажите интенсивность от 1 до 10", messages.ERROR
+            )
+            return
+
+        with transaction.atomic(), deferred_rating_updates() as film_ids:
+            film_ids.update(queryset.values_list("film_id", flat=True))
+            updated = queryset.update(intensity=intensity)
+        self.message_user(
+            request,
+            f"Обновлено оценок: {updated}, фильмов: {len(film_ids)}",
+        )
@@ -1,11 +1,30 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_api_views
 from .api_views import FilmViewSet, EmotionViewSet
 
 router = DefaultRouter()
 router.register(r"films", FilmViewSet, basename="film")
 router.register(r"emotions", EmotionViewSet, basename="emotion")
 
+# Асинхронные версии горячих эндпоинтов для запуска под ASGI
+async_urlpatterns = [
+    path("films/", async_api_views.film_list, name="async-film-list"),
+    path(
+        "films/by_emotion/",
+        async_api_views.film_by_emotion,
+        name="async-film-by-emotion",
+    ),
+    path("films/<int:pk>/", async_api_views.film_detail, name="async-film-detail"),
+    path(
+        "films/<int:pk>/emotion_profile/",
+        async_api_views.film_emotion_profile,
+        name="async-film-emotion-profile",
+    ),
+    path("emotions/", async_api_views.emotion_list, name="async-emotion-list"),
+]
+
 urlpatterns = [
+    path("async/", include(async_urlpatterns)),
     path("", include(router.urls)),
 ]
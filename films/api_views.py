@@ -1,22 +1,62 @@
+import base64
+import hashlib
+import json
+
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
 from rest_framework import viewsets, filters
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
 
+from .facets import get_facets
 from .models import Film, FilmEmotionRating
+from .queries import EmotionFilter
+from .renderers import BINARY_RENDERER_CLASSES
 from .serializers import FilmSerializer, FilmListSerializer, EmotionSerializer
 from emotions.models import Emotion
 
 DjangoFilterBackend = None
 
+# Максимальное число фильмов в одном пакетном запросе
+BATCH_MAX_IDS = 100
+
+API_RENDERER_CLASSES = [
+    *api_settings.DEFAULT_RENDERER_CLASSES,
+    *BINARY_RENDERER_CLASSES,
+]
+
+
+class EmotionMatrixPagination(PageNumberPagination):
+    """Крупные страницы для выгрузки эмоциональной матрицы"""
+
+    page_size = 1000
+    page_size_query_param = "page_size"
+    max_page_size = 10000
+
+
+def build_emotion_profile(ratings):
+    """Эмоциональный профиль фильма по его оценкам (с загруженными эмоциями)"""
+    return {
+        rating.emotion.name: {
+            "intensity": rating.intensity,
+            "color": rating.emotion.color,
+            "icon": rating.emotion.icon,
+        }
+        for rating in ratings
+    }
+
 
 class FilmViewSet(viewsets.ReadOnlyModelViewSet):
     """
     ViewSet для работы с фильмами через API
     """
 
-    queryset = Film.objects.filter(is_published=True).prefetch_related(
-        "emotion_ratings__emotion"
-    )
+    queryset = Film.objects.filter(is_published=True)
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     if DjangoFilterBackend:
         filter_backends.insert(0, DjangoFilterBackend)
@@ -24,36 +64,106 @@ class FilmViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ["title", "description", "director"]
     ordering_fields = ["year", "rating", "views_count", "created_at"]
     ordering = ["-created_at"]
+    renderer_classes = API_RENDERER_CLASSES
+    query_budget = {
+        "list": 8,
+        "retrieve": 4,
+        "by_emotion": 4,
+        "emotion_profile": 4,
+        "emotion_matrix": 5,
+        "batch": 4,
+    }
+
+    # Дорогие действия расходуют отдельный, меньший лимит запросов
+    throttle_scopes = {
+        "by_emotion": "expensive",
+        "batch": "expensive",
+        "emotion_matrix": "expensive",
+    }
+
+    def get_throttle_scope(self):
+        # Текстовый поиск (icontains по трем полям) так же дорог
+        if self.action == "list" and self.request.query_params.get("search"):
+            return "expensive"
+        return self.throttle_scopes.get(self.action, "api")
 
     def get_serializer_class(self):
         if self.action == "list":
             return FilmListSerializer
         return FilmSerializer
 
+    def _get_list_param(self, name):
+        """Разбирает параметр вида ?name=a,b,c; None, если параметр не передан"""
+        if name not in self.request.query_params:
+            return None
+        values = ",".join(self.request.query_params.getlist(name))
+        return [value.strip() for value in values.split(",") if value.strip()]
+
+    def get_selected_fields(self):
+        """Поля ответа с учетом ?fields= и ?expand=; None - все поля по умолчанию"""
+        fields = self._get_list_param("fields")
+        expand = self._get_list_param("expand")
+        if fields is None and expand is None:
+            return None
+        return self.get_serializer_class().select_fields(fields, expand)
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        selected = self.get_selected_fields()
+
+        # Оценки эмоций подгружаем только если они попадут в ответ
+        needed = selected if selected is not None else serializer_class.Meta.fields
+        if self.action == "batch" or {"emotion_ratings", "emotion_profile"} & set(
+            needed
+        ):
+            queryset = queryset.prefetch_related(
+                Prefetch(
+                    "emotion_ratings",
+                    queryset=FilmEmotionRating.objects.select_related("emotion"),
+                )
+            )
+
+        if selected is not None:
+            queryset = queryset.only(*serializer_class.model_fields_for(selected))
+        return queryset
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        # Счетчики фасетов по текущему набору фильтров рядом со списком
+        if isinstance(response.data, dict):
+            response.data["facets"] = get_facets(
+                self.filter_queryset(self.get_queryset()),
+                request.query_params,
+                prefix="films:api",
+            )
+        return response
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["selected_fields"] = self.get_selected_fields()
+        return context
+
     @action(detail=False, methods=["get"])
     def by_emotion(self, request):
         """
-        Получить фильмы по эмоциям
-        Параметры: emotion_ids (список ID эмоций), min_intensity (минимальная интенсивность)
+        Получить фильмы по эмоциям (с пагинацией)
+        Параметры: emotion_ids (список ID эмоций), min_intensity / max_intensity
+        (диапазон интенсивности), ranges (диапазоны для отдельных эмоций, 3:5-8),
+        mode (any - любая из эмоций, all - все сразу), exclude_emotion_ids
+        (эмоции, которых не должно быть), ordering=match (по степени совпадения)
         """
-        emotion_ids = request.query_params.getlist("emotion_ids", [])
-        min_intensity = request.query_params.get("min_intensity", 1)
-
-        try:
-            min_intensity = int(min_intensity)
-        except ValueError:
-            min_intensity = 1
+        emotion_filter = EmotionFilter.from_params(request.query_params)
+        queryset = emotion_filter.apply(self.filter_queryset(self.get_queryset()))
 
-        queryset = self.get_queryset()
+        if request.query_params.get("ordering") == "match":
+            queryset = emotion_filter.annotate_match_score(queryset).order_by(
+                "-match_score", "-rating"
+            )
 
-        if emotion_ids:
-            queryset = queryset.filter(
-                emotion_ratings__emotion_id__in=emotion_ids,
-                emotion_ratings__intensity__gte=min_intensity,
-            ).distinct()
-
-        serializer = self.get_serializer(queryset, many=True)
-        return Response(serializer.data)
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
     @action(detail=True, methods=["get"])
     def emotion_profile(self, request, pk=None):
@@ -62,17 +172,115 @@ class FilmViewSet(viewsets.ReadOnlyModelViewSet):
         """
         film = self.get_object()
         ratings = FilmEmotionRating.objects.filter(film=film).select_related("emotion")
+        return Response(build_emotion_profile(ratings))
 
-        profile = {
-            rating.emotion.name: {
-                "intensity": rating.intensity,
-                "color": rating.emotion.color,
-                "icon": rating.emotion.icon,
-            }
-            for rating in ratings
-        }
+    @action(detail=False, methods=["get"])
+    def batch(self, request):
+        """
+        Получить несколько фильмов вместе с эмоциональными профилями за один запрос
+        Параметры: ids (список ID через запятую, не более BATCH_MAX_IDS)
+        Результаты идут в порядке ids, для ненайденных - {"id": ..., "error": "not_found"}.
+        Поддерживает If-None-Match. Last-Modified не отдается: пересчет рейтингов
+        и изменение эмоциональных оценок не обновляют Film.updated_at.
+        """
+        ids = []
+        for value in self._get_list_param("ids") or []:
+            try:
+                film_id = int(value)
+            except ValueError:
+                raise ValidationError({"ids": f"Некорректный ID фильма: {value}"})
+            if film_id not in ids:
+                ids.append(film_id)
+
+        if not ids:
+            raise ValidationError({"ids": "Укажите хотя бы один ID фильма"})
+        if len(ids) > BATCH_MAX_IDS:
+            raise ValidationError(
+                {"ids": f"Не более {BATCH_MAX_IDS} фильмов за один запрос"}
+            )
+
+        films = {film.id: film for film in self.get_queryset().filter(id__in=ids)}
+
+        results = []
+        for film_id in ids:
+            film = films.get(film_id)
+            if film is None:
+                results.append({"id": film_id, "error": "not_found"})
+                continue
+            results.append(
+                {
+                    "id": film_id,
+                    "film": self.get_serializer(film).data,
+                    "emotion_profile": build_emotion_profile(
+                        film.emotion_ratings.all()
+                    ),
+                }
+            )
+        data = {"results": results}
+
+        etag = quote_etag(
+            hashlib.md5(
+                json.dumps(data, cls=JSONEncoder, sort_keys=True).encode(),
+                usedforsecurity=False,
+            ).hexdigest()
+        )
+        not_modified = get_conditional_response(request, etag=etag)
+        if not_modified is not None:
+            return not_modified
 
-        return Response(profile)
+        response = Response(data)
+        response["ETag"] = etag
+        return response
+
+    @action(detail=False, methods=["get"])
+    def emotion_matrix(self, request):
+        """
+        Эмоциональные профили в колоночном виде:
+        film_ids (строки), emotion_ids (столбцы) и упакованный массив
+        интенсивностей uint8 построчно, 0 - оценки нет.
+        В JSON массив передается в base64, в msgpack/cbor - сырыми байтами.
+        """
+        paginator = EmotionMatrixPagination()
+        film_ids = paginator.paginate_queryset(
+            self.filter_queryset(self.get_queryset()).values_list("id", flat=True),
+            request,
+            view=self,
+        )
+        emotion_ids = list(
+            Emotion.objects.filter(is_active=True)
+            .order_by("id")
+            .values_list("id", flat=True)
+        )
+
+        rows = {film_id: index for index, film_id in enumerate(film_ids)}
+        columns = {emotion_id: index for index, emotion_id in enumerate(emotion_ids)}
+        intensities = bytearray(len(film_ids) * len(emotion_ids))
+
+        ratings = FilmEmotionRating.objects.filter(
+            film_id__in=film_ids, emotion_id__in=emotion_ids
+        ).values_list("film_id", "emotion_id", "intensity")
+        for film_id, emotion_id, intensity in ratings:
+            intensities[rows[film_id] * len(emotion_ids) + columns[emotion_id]] = (
+                intensity
+            )
+
+        if request.accepted_renderer.format in ("msgpack", "cbor"):
+            packed = bytes(intensities)
+            encoding = "raw"
+        else:
+            packed = base64.b64encode(intensities).decode("ascii")
+            encoding = "base64"
+
+        return paginator.get_paginated_response(
+            {
+                "film_ids": list(film_ids),
+                "emotion_ids": emotion_ids,
+                "shape": [len(film_ids), len(emotion_ids)],
+                "dtype": "uint8",
+                "encoding": encoding,
+                "intensities": packed,
+            }
+        )
 
 
 class EmotionViewSet(viewsets.ReadOnlyModelViewSet):
@@ -82,5 +290,7 @@ class EmotionViewSet(viewsets.ReadOnlyModelViewSet):
 
     queryset = Emotion.objects.filter(is_active=True)
     serializer_class = EmotionSerializer
+    renderer_classes = API_RENDERER_CLASSES
+    query_budget = {"list": 3, "retrieve": 2}
     filter_backends = [filters.SearchFilter]
     search_fields = ["name", "description"]
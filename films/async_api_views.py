@@ -0,0 +1,173 @@
+"""
+Асинхронные версии горячих read-only эндпоинтов API (/api/async/...).
+
+Запросы к БД идут через async ORM и не занимают поток на время ожидания,
+а построение QuerySet, фильтры, выбор полей и сериализация берутся
+у FilmViewSet/EmotionViewSet - ответы совпадают с синхронным API.
+Рассчитаны на запуск под ASGI (movie_emotion/asgi.py).
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import (
+    APIException,
+    AuthenticationFailed,
+    NotAuthenticated,
+    NotFound,
+)
+from rest_framework.renderers import JSONRenderer
+
+from movie_emotion.instrumentation import query_budget
+from movie_emotion.pagination import apaginate_queryset
+from .api_views import EmotionViewSet, FilmViewSet, build_emotion_profile
+from .facets import get_facets
+from .models import Film, FilmEmotionRating
+from .queries import EmotionFilter
+from .renderers import BINARY_RENDERER_CLASSES
+
+# Browsable API рендерит HTML-формы синхронно - здесь только JSON и бинарные форматы
+ASYNC_RENDERER_CLASSES = [JSONRenderer, *BINARY_RENDERER_CLASSES]
+
+
+def _render(view, data, status=200, force=False):
+    request = view.request
+    renderer, media_type = view.perform_content_negotiation(request, force=force)
+    content = renderer.render(
+        data, media_type, {"request": request, "view": view, "response": None}
+    )
+    if renderer.charset:
+        media_type = f"{media_type}; charset={renderer.charset}"
+    response = HttpResponse(content, status=status, content_type=media_type)
+    patch_vary_headers(response, ["Accept"])
+    return response
+
+
+def _check_request(view):
+    view.check_permissions(view.request)
+    view.check_throttles(view.request)
+
+
+def async_action(viewset_class, action):
+    """
+    Превращает корутину handler(view, **kwargs) -> data в async-представление.
+    view - экземпляр viewset_class с запросом DRF и action, как в синхронном API.
+    Ошибки API (404, 406, ...) отдаются тем же форматом, что и в DRF.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        async def view_func(request, **kwargs):
+            view = viewset_class(
+                action_map={"get": action, "head": action}, args=(), kwargs=kwargs
+            )
+            view.format_kwarg = None
+            view.renderer_classes = ASYNC_RENDERER_CLASSES
+            view.request = view.initialize_request(request, **kwargs)
+            try:
+                view.perform_content_negotiation(view.request)
+                # initial() здесь не вызывается - права и лимиты проверяются
+                # явно; аутентификация и кэш ведер синхронные
+                await sync_to_async(_check_request)(view)
+                data = await handler(view, **kwargs)
+            except APIException as exc:
+                header = None
+                if isinstance(exc, (NotAuthenticated, AuthenticationFailed)):
+                    # Как в APIView.handle_exception: 401 только при наличии
+                    # заголовка WWW-Authenticate, иначе 403
+                    header = view.get_authenticate_header(view.request)
+                    if not header:
+                        exc.status_code = 403
+                response = _render(
+                    view, {"detail": exc.detail}, exc.status_code, force=True
+                )
+                if header:
+                    response["WWW-Authenticate"] = header
+                if getattr(exc, "wait", None):
+                    response["Retry-After"] = "%d" % exc.wait
+                return response
+            return _render(view, data)
+
+        return view_func
+
+    return decorator
+
+
+async def _paginated(view, queryset):
+    paginator = view.paginator
+    page = (
+        await apaginate_queryset(paginator, queryset, view.request)
+        if paginator is not None
+        else None
+    )
+    if page is None:
+        objects = [obj async for obj in queryset]
+        return view.get_serializer(objects, many=True).data
+    return paginator.get_paginated_response(
+        view.get_serializer(page, many=True).data
+    ).data
+
+
+# Как у get_object_or_404() в синхронном API
+FILM_NOT_FOUND = f"No {Film._meta.object_name} matches the given query."
+
+
+async def _get_film(view, pk):
+    try:
+        return await view.filter_queryset(view.get_queryset()).aget(pk=pk)
+    except Film.DoesNotExist:
+        raise NotFound(FILM_NOT_FOUND)
+
+
+@query_budget(FilmViewSet.query_budget["list"])
+@async_action(FilmViewSet, "list")
+async def film_list(view):
+    queryset = view.filter_queryset(view.get_queryset())
+    data = await _paginated(view, queryset)
+    if isinstance(data, dict):
+        # Фасеты кэшируются, подсчет при промахе идет в потоке
+        data["facets"] = await sync_to_async(get_facets)(
+            queryset, view.request.query_params, prefix="films:api"
+        )
+    return data
+
+
+@query_budget(FilmViewSet.query_budget["retrieve"])
+@async_action(FilmViewSet, "retrieve")
+async def film_detail(view, pk):
+    return view.get_serializer(await _get_film(view, pk)).data
+
+
+@query_budget(FilmViewSet.query_budget["by_emotion"])
+@async_action(FilmViewSet, "by_emotion")
+async def film_by_emotion(view):
+    params = view.request.query_params
+    emotion_filter = EmotionFilter.from_params(params)
+    queryset = emotion_filter.apply(view.filter_queryset(view.get_queryset()))
+    if params.get("ordering") == "match":
+        queryset = emotion_filter.annotate_match_score(queryset).order_by(
+            "-match_score", "-rating"
+        )
+    return await _paginated(view, queryset)
+
+
+@query_budget(FilmViewSet.query_budget["emotion_profile"])
+@async_action(FilmViewSet, "emotion_profile")
+async def film_emotion_profile(view, pk):
+    if not await view.filter_queryset(view.get_queryset()).filter(pk=pk).aexists():
+        raise NotFound(FILM_NOT_FOUND)
+    ratings = [
+        rating
+        async for rating in FilmEmotionRating.objects.filter(film_id=pk).select_related(
+            "emotion"
+        )
+    ]
+    return build_emotion_profile(ratings)
+
+
+@query_budget(EmotionViewSet.query_budget["list"])
+@async_action(EmotionViewSet, "list")
+async def emotion_list(view):
+    return await _paginated(view, view.filter_queryset(view.get_queryset()))
@@ -0,0 +1,271 @@
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from unittest import mock
+
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from emotions.models import Emotion
+from movie_emotion.throttling import get_buckets
+from notifications.fanout import fan_out
+from notifications.models import Notification
+from notifications.signals import _notify_subscribers_for_film
+from users.models import UserProfile
+from .api_views import EmotionViewSet
+from .models import Film, FilmEmotionRating
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    index = min(int(round(percent / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def measure(func, iterations=20, warmup=2, profile_iterations=5):
+    """
+    Выполняет func iterations раз и возвращает перцентили задержки (мс),
+    количество SQL-запросов и пиковую память Python (КБ) на вызов.
+    Задержка замеряется в отдельном проходе без трассировки: tracemalloc
+    перехватывает каждое выделение памяти и замедляет код в разы, по-разному
+    для разных сценариев. Запросы и память считаются во втором проходе
+    из profile_iterations вызовов
+    """
+    for _ in range(warmup):
+        func()
+
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    queries, peaks = [], []
+    for _ in range(min(profile_iterations, iterations)):
+        tracemalloc.start()
+        try:
+            with CaptureQueriesContext(connection) as captured:
+                func()
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        finally:
+            tracemalloc.stop()
+        queries.append(len(captured))
+
+    return {
+        "iterations": iterations,
+        "latency_ms": {
+            "p50": round(_percentile(latencies, 50), 3),
+            "p90": round(_percentile(latencies, 90), 3),
+            "p99": round(_percentile(latencies, 99), 3),
+            "max": round(max(latencies), 3),
+            "mean": round(statistics.fmean(latencies), 3),
+        },
+        "queries": {"mean": statistics.fmean(queries), "max": max(queries)},
+        "peak_memory_kb": round(max(peaks), 1),
+    }
+
+
+def _get(client, url):
+    def request():
+        response = client.get(url)
+        assert response.status_code == 200, f"{url}: {response.status_code}"
+
+    return request
+
+
+def _notify_new_film(emotion_ids):
+    """Каждый вызов рассылает уведомления по новому фильму с оценками"""
+    state = {"number": 0}
+
+    def notify():
+        state["number"] += 1
+        film = Film.objects.create(
+            title=f"Бенчмарк {state['number']}",
+            description="",
+            year=2024,
+            duration=100,
+            country="США",
+            director="Бенчмарк",
+            genre="drama",
+            is_published=False,
+        )
+        FilmEmotionRating.objects.bulk_create(
+            FilmEmotionRating(film=film, emotion_id=emotion_id, intensity=10)
+            for emotion_id in emotion_ids
+        )
+        film.is_published = True
+        return film
+
+    return notify
+
+
+def run_hot_paths(iterations=20):
+    """Замеры для основных сценариев на текущих данных"""
+    client = Client()
+    film = Film.objects.filter(is_published=True).order_by("id").first()
+    emotion_ids = list(Emotion.objects.order_by("id").values_list("id", flat=True)[:3])
+    profile = (
+        UserProfile.objects.filter(
+            id__in=Notification.objects.values("user_id")[:1]
+        ).first()
+        or UserProfile.objects.first()
+    )
+
+    paths = {
+        "films:list": _get(client, "/"),
+        "films:list (emotions)": _get(
+            client, "/?" + "&".join(f"emotions={pk}" for pk in emotion_ids)
+        ),
+        "api:film-list": _get(client, "/api/films/"),
+        "api:film-by-emotion": _get(
+            client,
+            "/api/films/by_emotion/?emotion_ids=" + ",".join(map(str, emotion_ids)),
+        ),
+    }
+    if film is not None:
+        paths["films:detail"] = _get(client, f"/{film.id}/")
+        paths["api:film-detail"] = _get(client, f"/api/films/{film.id}/")
+
+    results = {name: measure(func, iterations) for name, func in paths.items()}
+
+    if profile is not None:
+        user_client = Client()
+        user_client.force_login(profile.user)
+        results["notifications:notification_list"] = measure(
+            _get(user_client, "/notifications/"), iterations
+        )
+
+    # Создание фильма не входит в замер - меряется только рассылка
+    make_film = _notify_new_film(emotion_ids)
+    films = [make_film() for _ in range(iterations + 2)]
+    results["_notify_subscribers_for_film"] = measure(
+        lambda: _notify_subscribers_for_film(films.pop()), iterations
+    )
+    return results
+
+
+def run_fanout(workers_list, shard_size=None):
+    """
+    Пропускная способность рассылки (уведомлений в секунду) в зависимости
+    от числа процессов. Для каждого прогона публикуется новый фильм с
+    максимальной интенсивностью всех эмоций - ему подходят все подписки.
+    """
+    emotion_ids = list(Emotion.objects.order_by("id").values_list("id", flat=True))
+    make_film = _notify_new_film(emotion_ids)
+    results = {}
+    for workers in workers_list:
+        film = make_film()
+        Film.objects.filter(pk=film.pk).update(is_published=True)
+
+        started = time.perf_counter()
+        reports = fan_out(film.pk, workers=workers, shard_size=shard_size)
+        elapsed = time.perf_counter() - started
+
+        created = sum(report["created"] for report in reports)
+        shard_ms = [
+            report["duration_ms"] for report in reports if not report["skipped"]
+        ]
+        results[f"workers={workers}"] = {
+            "notifications": created,
+            "seconds": round(elapsed, 3),
+            "per_second": round(created / elapsed, 1) if elapsed else None,
+            "shards": len(reports),
+            "shard_ms": {
+                "p50": _percentile(shard_ms, 50) if shard_ms else None,
+                "max": max(shard_ms, default=None),
+            },
+        }
+    return results
+
+
+# Режимы соединения с БД: новое на каждый запрос, постоянное и пул psycopg
+CONNECTION_MODES = {
+    "new": {"CONN_MAX_AGE": 0},
+    "persistent": {"CONN_MAX_AGE": 600, "CONN_HEALTH_CHECKS": True},
+    "pool": {"CONN_MAX_AGE": 0, "OPTIONS": {"pool": {"min_size": 1, "max_size": 4}}},
+}
+
+
+@contextmanager
+def connection_mode(mode):
+    """Временно переключает соединение default в режим из CONNECTION_MODES"""
+    changes = CONNECTION_MODES[mode]
+    saved = {key: connection.settings_dict.get(key) for key in changes}
+    connection.close()
+    for key, value in changes.items():
+        if key == "OPTIONS":
+            value = {**connection.settings_dict.get("OPTIONS", {}), **value}
+        connection.settings_dict[key] = value
+    try:
+        yield
+    finally:
+        connection.close()
+        if mode == "pool":
+            connection.close_pool()
+        connection.settings_dict.update(saved)
+
+
+def _request_cycle(client, url):
+    """Запрос с закрытием соединений до и после, как в WSGI-обработчике"""
+    request = _get(client, url)
+
+    def cycle():
+        close_old_connections()
+        request()
+        close_old_connections()
+
+    return cycle
+
+
+def run_connection_modes(modes, iterations=20):
+    """
+    Задержка легкого запроса (список эмоций API) при разных режимах
+    соединения с БД. Тестовый клиент сам соединения не закрывает, поэтому
+    цикл запроса воспроизводится явно. Пул есть только на PostgreSQL.
+    """
+    client = Client()
+    results = {}
+    for mode in modes:
+        if mode == "pool" and connection.vendor != "postgresql":
+            continue
+        with connection_mode(mode):
+            result = measure(_request_cycle(client, "/api/emotions/"), iterations)
+            if mode == "pool":
+                stats = connection.pool.get_stats()
+                result["pool"] = {
+                    "size": stats.get("pool_size", 0),
+                    "requests": stats.get("requests_num", 0),
+                    "wait_ms": stats.get("requests_wait_ms", 0),
+                }
+        results[mode] = result
+    return results
+
+
+def run_throttle_overhead(iterations=20):
+    """
+    Накладные расходы ограничения частоты: задержка легкого запроса API
+    (список эмоций) с ведрами и без них и время одного списания из ведра
+    в кэше API_THROTTLE_CACHE. Ставка заведомо не исчерпывается
+    """
+    client = Client()
+    unlimited = {
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"api_anon": "1000000/s"},
+    }
+    with override_settings(REST_FRAMEWORK=unlimited):
+        results = {"throttled": measure(_get(client, "/api/emotions/"), iterations)}
+        with mock.patch.object(EmotionViewSet, "throttle_classes", []):
+            results["unthrottled"] = measure(
+                _get(client, "/api/emotions/"), iterations
+            )
+
+        buckets = get_buckets()
+        takes = 1000
+        started = time.perf_counter()
+        for number in range(takes):
+            buckets.take(f"throttle:benchmark:{number % 100}", 1_000_000, 1_000_000)
+        results["take_us"] = round((time.perf_counter() - started) / takes * 1e6, 2)
+    return results
@@ -0,0 +1,98 @@
+import hashlib
+
+from django.core.cache import cache
+from django.db.models import Count, F
+
+from movie_emotion import metrics
+from .models import Film, FilmEmotionRating
+
+# Время жизни закэшированных счетчиков (сек)
+FACETS_CACHE_TIMEOUT = 300
+# Ширина корзины для годов выпуска
+YEAR_BUCKET_SIZE = 10
+# Параметры, которые не влияют на отфильтрованное множество фильмов
+NON_FILTER_PARAMS = {"page", "page_size", "ordering", "format", "fields", "expand"}
+
+
+def facets_cache_key(params, prefix="films"):
+    """Канонический ключ кэша: отсортированные параметры фильтрации без пагинации"""
+    canonical = "&".join(
+        f"{key}={','.join(sorted(params.getlist(key)))}"
+        for key in sorted(params)
+        if key not in NON_FILTER_PARAMS and any(params.getlist(key))
+    )
+    digest = hashlib.md5(canonical.encode(), usedforsecurity=False).hexdigest()
+    return f"{prefix}:facets:{digest}"
+
+
+def compute_facets(queryset):
+    """
+    Счетчики фильмов в отфильтрованном множестве по жанрам, десятилетиям,
+    странам и эмоциям - по одному агрегирующему запросу на фасет
+    """
+    films = queryset.prefetch_related(None).order_by()
+    genre_labels = dict(Film.GENRE_CHOICES)
+
+    genres = films.values("genre").annotate(count=Count("id")).order_by("genre")
+    years = (
+        films.annotate(bucket=F("year") / YEAR_BUCKET_SIZE * YEAR_BUCKET_SIZE)
+        .values("bucket")
+        .annotate(count=Count("id"))
+        .order_by("bucket")
+    )
+    countries = (
+        films.values("country")
+        .annotate(count=Count("id"))
+        .order_by("-count", "country")
+    )
+    emotions = (
+        FilmEmotionRating.objects.filter(film__in=films.values("id"))
+        .values("emotion_id", "emotion__name")
+        .annotate(count=Count("film_id"))
+        .order_by("emotion__name")
+    )
+
+    return {
+        "genre": [
+            {
+                "value": row["genre"],
+                "label": genre_labels.get(row["genre"], row["genre"]),
+                "count": row["count"],
+            }
+            for row in genres
+        ],
+        "year": [
+            {
+                "value": row["bucket"],
+                "label": f"{row['bucket']}-{row['bucket'] + YEAR_BUCKET_SIZE - 1}",
+                "count": row["count"],
+            }
+            for row in years
+        ],
+        "country": [
+            {"value": row["country"], "label": row["country"], "count": row["count"]}
+            for row in countries
+        ],
+        "emotion": [
+            {
+                "value": row["emotion_id"],
+                "label": row["emotion__name"],
+                "count": row["count"],
+            }
+            for row in emotions
+        ],
+    }
+
+
+def get_facets(queryset, params, prefix="films"):
+    """Счетчики фасетов с кэшированием по набору фильтров"""
+    key = facets_cache_key(params, prefix)
+    facets = cache.get(key)
+    if facets is not None:
+        metrics.inc("cache_requests_total", cache="facets", result="hit")
+        return facets
+
+    metrics.inc("cache_requests_total", cache="facets", result="miss")
+    facets = compute_facets(queryset)
+    cache.set(key, facets, FACETS_CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,230 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+
+from emotions.models import Emotion
+from .models import Film, FilmEmotionRating
+from .tasks import generate_poster_variants
+
+# Необязательные поля фильма и их разбор. Поле меняется, только если его
+# колонка есть в строке: при повторном импорте отсутствующая колонка
+# не затирает значение (и постер) существующего фильма
+OPTIONAL_FIELDS = {
+    "original_title": lambda value: value or "",
+    "description": lambda value: value or "",
+    "country": lambda value: value or "",
+    "director": lambda value: value or "",
+    "poster": lambda value: value or None,
+    "trailer_url": lambda value: value or "",
+    "is_published": lambda value: _parse_bool(value),
+}
+
+# Естественный ключ фильма (уникальное ограничение films_film_title_year_uniq)
+NATURAL_KEY = ["title", "year"]
+
+# Допустимая интенсивность (как у валидаторов FilmEmotionRating.intensity,
+# которые bulk_create не вызывает)
+MIN_INTENSITY, MAX_INTENSITY = 1, 10
+
+
+def read_jsonl(file):
+    """
+    Построчно читает JSONL: один фильм на строку, эмоции в виде
+    {"emotions": {"Радость": 8}} или [["Радость", 8], ...]
+    """
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def read_csv(file):
+    """Построчно читает CSV с заголовком, эмоции в колонке вида "Радость:8;Грусть:3" """
+    for row in csv.DictReader(file):
+        emotions = []
+        for part in (row.pop("emotions", "") or "").split(";"):
+            name, _, intensity = part.rpartition(":")
+            if name.strip():
+                emotions.append((name.strip(), intensity))
+        row["emotions"] = emotions
+        yield row
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() not in ("0", "false", "no", "нет", "")
+    return bool(value)
+
+
+def _parse_row(row):
+    """Приводит строку файла к полям Film и списку оценок (название эмоции, интенсивность)"""
+    fields = {
+        "title": row["title"].strip(),
+        "year": int(row["year"]),
+        "duration": int(row["duration"]),
+        "genre": row["genre"],
+    }
+    for name, parse in OPTIONAL_FIELDS.items():
+        if name in row:
+            fields[name] = parse(row[name])
+
+    emotions = row.get("emotions") or row.get("emotions_ratings") or []
+    if isinstance(emotions, dict):
+        emotions = emotions.items()
+    ratings = []
+    for name, intensity in emotions:
+        intensity = int(intensity)
+        if not MIN_INTENSITY <= intensity <= MAX_INTENSITY:
+            raise ValueError(
+                f"интенсивность эмоции '{name}' вне диапазона "
+                f"{MIN_INTENSITY}-{MAX_INTENSITY}: {intensity}"
+            )
+        ratings.append((name, intensity))
+    return fields, ratings
+
+
+class FilmImporter:
+    """
+    Пакетная загрузка фильмов с эмоциональными оценками.
+
+    Строки обрабатываются блоками по chunk_size: фильмы и оценки
+    загружаются через bulk_create(update_conflicts=True) по естественному
+    ключу - (title, year) у фильма, (film, emotion) у оценки. Рейтинг фильмов блока пересчитывается
+    одним UPDATE. save() и сигналы (в т.ч. рассылка подписчикам) не вызываются.
+    Память ограничена размером блока.
+    """
+
+    def __init__(self, chunk_size=1000, created_by=None, stdout=None):
+        self.chunk_size = chunk_size
+        self.created_by = created_by
+        self.stdout = stdout
+        self.emotion_ids = {}
+        self.unknown_emotions = set()
+        self.stats = {
+            "created": 0,
+            "updated": 0,
+            "ratings": 0,
+            "skipped": 0,
+        }
+
+    def _log(self, message):
+        if self.stdout is not None:
+            self.stdout.write(message)
+
+    def import_rows(self, rows):
+        """Загружает фильмы из итерируемого источника словарей, возвращает статистику"""
+        # Эмоции загружаются один раз: название и slug -> id
+        emotions = Emotion.objects.values_list("id", "name", "slug")
+        for emotion_id, name, slug in emotions:
+            self.emotion_ids[name] = emotion_id
+            self.emotion_ids[slug] = emotion_id
+
+        rows = iter(rows)
+        processed = 0
+        while chunk := list(islice(rows, self.chunk_size)):
+            self._import_chunk(chunk, first_line=processed + 1)
+            processed += len(chunk)
+            self._log(f"Обработано строк: {processed}")
+
+        for name in sorted(self.unknown_emotions):
+            self._log(f"Ошибка: эмоция '{name}' не найдена")
+        self.unknown_emotions.clear()
+        return self.stats
+
+    def _import_chunk(self, chunk, first_line):
+        parsed = {}
+        for line_number, row in enumerate(chunk, start=first_line):
+            try:
+                fields, ratings = _parse_row(row)
+            except (KeyError, TypeError, ValueError) as e:
+                self.stats["skipped"] += 1
+                self._log(f"Строка {line_number} пропущена: {e!r}")
+                continue
+            # Повтор фильма внутри блока - побеждает последняя строка
+            parsed[(fields["title"], fields["year"])] = (fields, ratings)
+
+        if not parsed:
+            return
+
+        with transaction.atomic():
+            # Поиск по (title, year) идет по уникальному индексу; нужен только
+            # для статистики - запись делает INSERT ... ON CONFLICT
+            existing = set(
+                Film.objects.filter(title__in={title for title, _ in parsed})
+                .values_list("title", "year")
+                .iterator()
+            ) & parsed.keys()
+
+            # Строки группируются по набору колонок: при конфликте
+            # обновляются только поля, которые есть в строке
+            groups = {}
+            for fields, _ in parsed.values():
+                groups.setdefault(tuple(fields), []).append(
+                    Film(created_by=self.created_by, **fields)
+                )
+            film_ids = {}
+            for columns, films in groups.items():
+                Film.objects.bulk_create(
+                    films,
+                    update_conflicts=True,
+                    unique_fields=NATURAL_KEY,
+                    update_fields=[
+                        *(name for name in columns if name not in NATURAL_KEY),
+                        "updated_at",
+                    ],
+                )
+                film_ids.update(
+                    ((film.title, film.year), film.pk)
+                    for film in films
+                    if film.pk is not None
+                )
+            if len(film_ids) < len(parsed):
+                # Бэкенд не вернул id строк - дочитываем их
+                film_ids.update(
+                    ((title, year), film_id)
+                    for film_id, title, year in Film.objects.filter(
+                        title__in={title for title, _ in parsed}
+                    ).values_list("id", "title", "year")
+                    if (title, year) in parsed
+                )
+
+            # Ключ (фильм, эмоция) - одна строка на конфликт в ON CONFLICT
+            ratings = {}
+            for key, (_, film_ratings) in parsed.items():
+                for name, intensity in film_ratings:
+                    emotion_id = self.emotion_ids.get(name)
+                    if emotion_id is None:
+                        self.unknown_emotions.add(name)
+                        continue
+                    ratings[(film_ids[key], emotion_id)] = FilmEmotionRating(
+                        film_id=film_ids[key],
+                        emotion_id=emotion_id,
+                        intensity=intensity,
+                        rated_by=self.created_by,
+                    )
+            if ratings:
+                FilmEmotionRating.objects.bulk_create(
+                    ratings.values(),
+                    update_conflicts=True,
+                    unique_fields=["film", "emotion"],
+                    update_fields=["intensity"],
+                )
+
+            Film.objects.filter(id__in=film_ids.values()).update_ratings()
+
+            # bulk_create/bulk_update не отправляют сигналов - копии постеров
+            # ставятся в очередь явно; неизменившийся постер задача пропустит,
+            # а для очищенного удалит копии прежнего
+            generate_poster_variants.enqueue_many(
+                [
+                    (film_ids[key],)
+                    for key, (fields, _) in parsed.items()
+                    if "poster" in fields
+                ]
+            )
+
+        self.stats["created"] += len(parsed) - len(existing)
+        self.stats["updated"] += len(existing)
+        self.stats["ratings"] += len(ratings)
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from films.benchmarks import _percentile
+
+DEFAULT_PATHS = [
+    "/api/films/",
+    "/api/films/by_emotion/?emotion_ids=1&ordering=match",
+    "/api/emotions/",
+]
+
+
+class _Connection:
+    """Keep-alive соединение HTTP/1.1; переоткрывается, если сервер его закрыл"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, raw):
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port
+            )
+        self.writer.write(raw)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+            headers["connection"] = "close"
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест read-only API на запущенном сервере: запросов в секунду "
+        "и хвостовые задержки при заданной конкурентности. С --compare каждый путь "
+        "прогоняется и в синхронной (/api/...), и в асинхронной (/api/async/...) "
+        "версии. Все запросы идут с одного адреса, поэтому сервер запускается с "
+        "API_THROTTLE_ENABLED=false, иначе тест измеряет ответы 429"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000",
+            help="Адрес сервера (по умолчанию http://127.0.0.1:8000)",
+        )
+        parser.add_argument(
+            "--path",
+            action="append",
+            dest="paths",
+            help="Путь для нагрузки, можно указать несколько раз "
+            f"(по умолчанию {', '.join(DEFAULT_PATHS)})",
+        )
+        parser.add_argument(
+            "--compare",
+            action="store_true",
+            help="Прогнать и асинхронную версию каждого пути /api/...",
+        )
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=100,
+            help="Одновременных клиентов (по умолчанию 100)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=2000,
+            help="Запросов на каждый путь (по умолчанию 2000)",
+        )
+        parser.add_argument("--output", help="Записать результат в JSON-файл")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("Поддерживается только http://")
+
+        paths = []
+        for path in options["paths"] or DEFAULT_PATHS:
+            paths.append(path)
+            if options["compare"] and path.startswith("/api/"):
+                paths.append("/api/async/" + path[len("/api/") :])
+
+        results = {}
+        for path in paths:
+            result = asyncio.run(
+                self.run(url, path, options["concurrency"], options["requests"])
+            )
+            results[path] = result
+            self.stdout.write(
+                f"{path}: {result['rps']} запр/с, p50 {result['latency_ms']['p50']} мс, "
+                f"p99 {result['latency_ms']['p99']} мс, ошибок {result['errors']}"
+            )
+
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(results, indent=2, ensure_ascii=False), encoding="utf-8"
+            )
+
+    async def run(self, url, path, concurrency, total):
+        raw = (
+            f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+            "Accept: application/json\r\n\r\n"
+        ).encode()
+        latencies, errors = [], []
+        statuses = Counter()
+        remaining = total
+
+        async def client():
+            nonlocal remaining
+            connection = _Connection(url.hostname, url.port or 80)
+            try:
+                while remaining > 0:
+                    remaining -= 1
+                    started = time.perf_counter()
+                    try:
+                        status = await connection.request(raw)
+                    except (OSError, ValueError, IndexError) as error:
+                        connection.close()
+                        errors.append(str(error) or type(error).__name__)
+                        continue
+                    latencies.append((time.perf_counter() - started) * 1000)
+                    statuses[status] += 1
+                    if status != 200:
+                        errors.append(f"HTTP {status}")
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+        if not latencies:
+            raise CommandError(f"{path}: нет ни одного ответа ({errors[0]})")
+        # Задержки отказов (429 от ограничения частоты) ничего не говорят о
+        # производительности пути, поэтому такой прогон не выдается за результат
+        failed = sum(n for status, n in statuses.items() if not 200 <= status < 300)
+        if failed * 2 > len(latencies):
+            codes = ", ".join(f"{code}: {n}" for code, n in sorted(statuses.items()))
+            hint = ""
+            if 429 in statuses:
+                hint = "; запустите сервер с API_THROTTLE_ENABLED=false"
+            raise CommandError(f"{path}: большинство ответов не 2xx ({codes}){hint}")
+        return {
+            "requests": len(latencies),
+            "errors": len(errors),
+            "statuses": {str(status): n for status, n in sorted(statuses.items())},
+            "concurrency": concurrency,
+            "rps": round(len(latencies) / elapsed, 1),
+            "latency_ms": {
+                "p50": round(_percentile(latencies, 50), 1),
+                "p90": round(_percentile(latencies, 90), 1),
+                "p99": round(_percentile(latencies, 99), 1),
+                "max": round(max(latencies), 1),
+                "mean": round(statistics.fmean(latencies), 1),
+            },
+        }
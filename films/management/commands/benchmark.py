@@ -0,0 +1,154 @@
+import json
+import platform
+from pathlib import Path
+
+import django
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from films.benchmarks import (
+    CONNECTION_MODES,
+    run_connection_modes,
+    run_fanout,
+    run_hot_paths,
+    run_throttle_overhead,
+)
+from films.synthetic import generate_dataset, scale_counts
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер задержки, количества запросов и пиковой памяти основных сценариев "
+        "на синтетических данных разного размера. Работает на временной тестовой БД"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            default="100,1000,10000",
+            help="Количество фильмов для каждого прогона через запятую",
+        )
+        parser.add_argument(
+            "--iterations", type=int, default=20, help="Повторов на каждый сценарий"
+        )
+        parser.add_argument("--seed", type=int, default=0, help="Зерно генератора")
+        parser.add_argument(
+            "--output", default="bench_output.json", help="Файл с результатами (JSON)"
+        )
+        parser.add_argument(
+            "--fanout-workers",
+            default="",
+            help="Число процессов рассылки через запятую, например 1,2,4 "
+            "(замер пропускной способности рассылки уведомлений)",
+        )
+        parser.add_argument(
+            "--shard-size",
+            type=int,
+            default=None,
+            help="Размер шарда рассылки (по умолчанию NOTIFY_SHARD_SIZE)",
+        )
+        parser.add_argument(
+            "--throttle",
+            action="store_true",
+            help="Замерить накладные расходы ограничения частоты API",
+        )
+        parser.add_argument(
+            "--connection-modes",
+            default="",
+            help="Режимы соединения с БД через запятую из "
+            f"{', '.join(CONNECTION_MODES)} (задержка запроса с пулом и без; "
+            "pool - только на PostgreSQL)",
+        )
+
+    def handle(self, *args, **options):
+        scales = [int(scale) for scale in options["scales"].split(",") if scale]
+        connection_modes = [
+            mode for mode in options["connection_modes"].split(",") if mode
+        ]
+        unknown = set(connection_modes) - CONNECTION_MODES.keys()
+        if unknown:
+            raise CommandError(f"Неизвестные режимы соединения: {', '.join(unknown)}")
+        if "pool" in connection_modes and connection.vendor != "postgresql":
+            self.stdout.write("Пул соединений есть только на PostgreSQL, pool пропущен")
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "iterations": options["iterations"],
+            "seed": options["seed"],
+            "runs": [],
+        }
+
+        # Все прогоны идут на отдельной тестовой БД, рабочие данные не затрагиваются.
+        # Лимиты частоты API выключены: повторы одного запроса быстро их исчерпают
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        unthrottled = override_settings(
+            REST_FRAMEWORK={**settings.REST_FRAMEWORK, "DEFAULT_THROTTLE_RATES": {}}
+        )
+        unthrottled.enable()
+        try:
+            for films in scales:
+                call_command("flush", interactive=False, verbosity=0)
+                counts = scale_counts(films)
+                self.stdout.write(f"Прогон: {counts}")
+                generate_dataset(seed=options["seed"], **counts)
+
+                results = run_hot_paths(iterations=options["iterations"])
+                for name, result in results.items():
+                    self.stdout.write(
+                        f"  {name}: p50={result['latency_ms']['p50']}мс "
+                        f"p99={result['latency_ms']['p99']}мс "
+                        f"запросов={result['queries']['max']} "
+                        f"память={result['peak_memory_kb']}КБ"
+                    )
+                run = {"scale": counts, "results": results}
+
+                fanout_workers = [
+                    int(workers)
+                    for workers in options["fanout_workers"].split(",")
+                    if workers
+                ]
+                if fanout_workers:
+                    run["fanout"] = run_fanout(fanout_workers, options["shard_size"])
+                    for name, result in run["fanout"].items():
+                        self.stdout.write(
+                            f"  рассылка {name}: {result['notifications']} уведомлений "
+                            f"за {result['seconds']}с ({result['per_second']}/с), "
+                            f"шардов={result['shards']}"
+                        )
+
+                if connection_modes:
+                    run["connections"] = run_connection_modes(
+                        connection_modes, options["iterations"]
+                    )
+                    for name, result in run["connections"].items():
+                        self.stdout.write(
+                            f"  соединение {name}: p50={result['latency_ms']['p50']}мс "
+                            f"p99={result['latency_ms']['p99']}мс"
+                        )
+
+                if options["throttle"]:
+                    run["throttle"] = run_throttle_overhead(options["iterations"])
+                    self.stdout.write(
+                        "  ограничение частоты: p50 "
+                        f"{run['throttle']['throttled']['latency_ms']['p50']}мс "
+                        f"(без него {run['throttle']['unthrottled']['latency_ms']['p50']}мс), "
+                        f"списание из ведра {run['throttle']['take_us']}мкс"
+                    )
+                report["runs"].append(run)
+        finally:
+            unthrottled.disable()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        Path(options["output"]).write_text(
+            json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8"
+        )
+        self.stdout.write(self.style.SUCCESS(f"✅ Результаты: {options['output']}"))
@@ -0,0 +1,40 @@
+import gzip
+
+from django.core.management.base import BaseCommand
+
+from films.snapshots import export_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгрузка снимка каталога (фильмы, эмоции, оценки; с --with-users "
+        "также пользователи и подписки) в сжатый файл для наполнения окружений"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл снимка (.jsonl.gz)")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=5000,
+            help="Количество строк в одной пачке (по умолчанию 5000)",
+        )
+        parser.add_argument(
+            "--with-users",
+            action="store_true",
+            help=(
+                "Выгрузить также пользователей, профили и подписки "
+                "(личные данные: почта, имена; пароли не выгружаются)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Выгрузка снимка в {options['path']}...")
+        with gzip.open(options["path"], "wt", encoding="utf-8") as file:
+            export_snapshot(
+                file,
+                chunk_size=options["chunk_size"],
+                include_users=options["with_users"],
+                stdout=self.stdout,
+            )
+        self.stdout.write(self.style.SUCCESS("✅ Снимок выгружен"))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from films.synthetic import generate_dataset, scale_counts
+
+
+class Command(BaseCommand):
+    help = "Генерация синтетического набора данных для нагрузочного тестирования"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--films", type=int, default=1000, help="Количество фильмов"
+        )
+        parser.add_argument("--emotions", type=int, help="Количество эмоций")
+        parser.add_argument("--ratings", type=int, help="Количество оценок эмоций")
+        parser.add_argument("--users", type=int, help="Количество пользователей")
+        parser.add_argument("--subscriptions", type=int, help="Количество подписок")
+        parser.add_argument("--notifications", type=int, help="Количество уведомлений")
+        parser.add_argument(
+            "--seed", type=int, default=0, help="Зерно генератора (по умолчанию 0)"
+        )
+
+    def handle(self, *args, **options):
+        # Не указанные размеры берутся пропорционально количеству фильмов
+        counts = scale_counts(options["films"])
+        for name in counts:
+            if options.get(name) is not None:
+                counts[name] = options[name]
+
+        self.stdout.write(f"Генерация данных: {counts}")
+        with transaction.atomic():
+            created = generate_dataset(seed=options["seed"], **counts)
+        self.stdout.write(self.style.SUCCESS(f"✅ Создано: {created}"))
@@ -0,0 +1,66 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from films.models import Film
+from films.posters import build_poster_variants
+from movie_emotion.processes import map_in_processes
+
+
+class Command(BaseCommand):
+    help = (
+        "Построение копий постеров (JPEG/WebP для srcset и размытая заглушка) "
+        "для уже загруженных фильмов в пуле процессов"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Число процессов (по умолчанию по числу ядер)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Перестроить копии, даже если постер не менялся",
+        )
+        parser.add_argument(
+            "--limit", type=int, help="Обработать не больше указанного числа фильмов"
+        )
+
+    def handle(self, *args, **options):
+        films = Film.objects.exclude(poster="").exclude(poster__isnull=True)
+        posters = dict(films.order_by("pk").values_list("pk", "poster"))
+        film_ids = list(posters)[: options["limit"]]
+        if not film_ids:
+            self.stdout.write("Фильмов с постерами нет")
+            return
+
+        workers = options["workers"]
+        args_list = [(film_id, options["force"]) for film_id in film_ids]
+        started = time.perf_counter()
+        # SQLite не допускает параллельной записи - там фильмы идут по очереди
+        if workers <= 1 or connection.vendor == "sqlite":
+            results = [build_poster_variants(*args) for args in args_list]
+        else:
+            results = map_in_processes(
+                "films.posters.build_poster_variants", args_list, workers
+            )
+        elapsed = time.perf_counter() - started
+
+        missing = [
+            film_id
+            for film_id, variants in zip(film_ids, results)
+            if (variants or {}).get("source") != posters[film_id]
+        ]
+        for film_id in missing:
+            self.stdout.write(f"Фильм {film_id}: файл постера не найден")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Постеров обработано: {len(film_ids) - len(missing)} "
+                f"из {len(film_ids)} за {elapsed:.1f} с"
+            )
+        )
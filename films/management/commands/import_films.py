@@ -0,0 +1,53 @@
+import gzip
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from films.importers import FilmImporter, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = (
+        "Потоковая загрузка каталога фильмов с эмоциональными оценками "
+        "из JSONL или CSV (в т.ч. .gz)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="Файлы JSONL/CSV")
+        parser.add_argument(
+            "--format",
+            choices=["jsonl", "csv"],
+            help="Формат файлов (по умолчанию определяется по расширению)",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Количество строк в одной пачке (по умолчанию 1000)",
+        )
+
+    def handle(self, *args, **options):
+        importer = FilmImporter(chunk_size=options["chunk_size"], stdout=self.stdout)
+
+        for path in map(Path, options["paths"]):
+            if not path.exists():
+                raise CommandError(f"Файл не найден: {path}")
+
+            suffixes = [suffix.lower() for suffix in path.suffixes]
+            file_format = options["format"] or (
+                "csv" if ".csv" in suffixes else "jsonl"
+            )
+            reader = read_csv if file_format == "csv" else read_jsonl
+            opener = gzip.open if suffixes[-1:] == [".gz"] else open
+
+            self.stdout.write(f"Загрузка {path} ({file_format})...")
+            with opener(path, "rt", encoding="utf-8", newline="") as file:
+                importer.import_rows(reader(file))
+
+        stats = importer.stats
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✅ Создано фильмов: {stats['created']}, обновлено: {stats['updated']}, "
+                f"оценок: {stats['ratings']}, пропущено строк: {stats['skipped']}"
+            )
+        )
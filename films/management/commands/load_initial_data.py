@@ -4,6 +4,7 @@ from django.db import transaction
 from slugify import slugify
 
 from emotions.models import Emotion
+from films.importers import FilmImporter
 from films.models import Film, FilmEmotionRating
 from users.models import UserProfile
 from movie_emotion.config import env_settings
@@ -595,55 +596,10 @@ class Command(BaseCommand):
                 },
             ]
 
-            created_films = 0
-            for film_data in films_data:
-                emotions_ratings = film_data.pop("emotions_ratings")
-
-                try:
-                    film = Film.objects.get(
-                        title=film_data["title"], year=film_data["year"]
-                    )
-                    for key, value in film_data.items():
-                        setattr(film, key, value)
-                    film.save()
-                    self.stdout.write(f"Обновлен фильм: {film_data['title']}")
-                except Film.DoesNotExist:
-                    film = Film(
-                        title=film_data["title"],
-                        original_title=film_data.get("original_title", ""),
-                        year=film_data["year"],
-                        duration=film_data["duration"],
-                        country=film_data["country"],
-                        director=film_data["director"],
-                        genre=film_data["genre"],
-                        description=film_data["description"],
-                        created_by=profile,
-                        is_published=True,
-                    )
-                    film.save()
-                    created_films += 1
-                    self.stdout.write(f"Создан фильм: {film_data['title']}")
-
-                    if film_data.get("poster"):
-                        film.poster = film_data["poster"]
-                        film.save(update_fields=["poster"])
-                        self.stdout.write(f"  ✓ Указан постер: {film_data['poster']}")
-
-                    # Создаем оценки эмоций для фильма
-                    for emotion_name, intensity in emotions_ratings:
-                        try:
-                            emotion = Emotion.objects.get(name=emotion_name)
-                            rating = FilmEmotionRating(
-                                film=film,
-                                emotion=emotion,
-                                intensity=intensity,
-                                rated_by=profile,
-                            )
-                            rating.save()
-                        except Emotion.DoesNotExist:
-                            self.stdout.write(
-                                f"Ошибка: эмоция '{emotion_name}' не найдена"
-                            )
+            # Фильмы и оценки загружаются пачкой, рейтинг пересчитывается один раз
+            stats = FilmImporter(created_by=profile).import_rows(films_data)
+            created_films = stats["created"]
+            self.stdout.write(f"Обновлено {stats['updated']} фильмов")
 
             self.stdout.write(f"Создано {created_films} новых фильмов")
             self.stdout.write(
@@ -0,0 +1,47 @@
+import gzip
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from films.snapshots import restore_snapshot
+
+
+class Command(BaseCommand):
+    help = "Загрузка снимка каталога, выгруженного командой export_snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Файл снимка (.jsonl.gz)")
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить существующие данные перед загрузкой",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Размер пачки для bulk_create (по умолчанию 5000)",
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options["path"])
+        if not path.exists():
+            raise CommandError(f"Файл не найден: {path}")
+
+        self.stdout.write(f"Загрузка снимка из {path}...")
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                restore_snapshot(
+                    file,
+                    clear=options["clear"],
+                    batch_size=options["batch_size"],
+                    stdout=self.stdout,
+                )
+        except ValueError as e:
+            raise CommandError(str(e))
+        except IntegrityError as e:
+            raise CommandError(
+                f"Конфликт с существующими данными ({e}). Используйте --clear"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ Снимок загружен"))
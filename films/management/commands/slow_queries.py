@@ -0,0 +1,70 @@
+from django.core.management.base import BaseCommand
+
+from movie_emotion.instrumentation import read_slow_query_log
+
+
+class Command(BaseCommand):
+    help = "Сводка по журналу медленных SQL-запросов: самые затратные шаблоны"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--file", help="Файл журнала (по умолчанию SLOW_QUERY_LOG_FILE)"
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=10,
+            help="Сколько шаблонов показать (по умолчанию 10)",
+        )
+        parser.add_argument(
+            "--sort",
+            choices=["total", "max", "count"],
+            default="total",
+            help="Сортировка: суммарное время, максимум или число повторов",
+        )
+        parser.add_argument(
+            "--plans", action="store_true", help="Показать последний снятый план"
+        )
+
+    def handle(self, *args, **options):
+        groups = {}
+        for entry in read_slow_query_log(options["file"]):
+            group = groups.setdefault(
+                entry["sql"],
+                {"durations": [], "views": set(), "plan": None},
+            )
+            group["durations"].append(entry["duration_ms"])
+            if entry.get("view"):
+                group["views"].add(entry["view"])
+            if entry.get("plan"):
+                group["plan"] = entry["plan"]
+
+        if not groups:
+            self.stdout.write("Журнал медленных запросов пуст")
+            return
+
+        sort_keys = {
+            "total": lambda group: sum(group["durations"]),
+            "max": lambda group: max(group["durations"]),
+            "count": lambda group: len(group["durations"]),
+        }
+        ranked = sorted(
+            groups.items(),
+            key=lambda item: sort_keys[options["sort"]](item[1]),
+            reverse=True,
+        )
+
+        for number, (sql, group) in enumerate(ranked[: options["limit"]], 1):
+            durations = sorted(group["durations"])
+            p95 = durations[min(int(len(durations) * 0.95), len(durations) - 1)]
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{number}. {len(durations)} раз, всего {sum(durations):.0f} мс, "
+                    f"p95 {p95:.0f} мс, max {durations[-1]:.0f} мс"
+                )
+            )
+            self.stdout.write(f"   view: {', '.join(sorted(group['views'])) or '-'}")
+            self.stdout.write(f"   {sql}")
+            if options["plans"] and group["plan"]:
+                for line in group["plan"].splitlines():
+                    self.stdout.write(f"      {line}")
@@ -0,0 +1,92 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from movie_emotion.startup import STARTUP_TARGETS, package_times, profile_startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер холодного старта manage.py и воркера очереди: время запуска "
+        "нового процесса и время импорта по модулям и пакетам (python -X importtime)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "targets",
+            nargs="*",
+            help=f"Что замерять: {', '.join(STARTUP_TARGETS)} (по умолчанию все)",
+        )
+        parser.add_argument(
+            "--runs",
+            type=int,
+            default=3,
+            help="Запусков для замера времени, берется лучший (по умолчанию 3)",
+        )
+        parser.add_argument(
+            "--limit",
+            type=int,
+            default=20,
+            help="Сколько самых медленных модулей и пакетов показать",
+        )
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Завершиться с ошибкой, если старт не уложился в бюджет",
+        )
+        parser.add_argument("--output", help="Записать результат в JSON-файл")
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        unknown = set(options["targets"]) - STARTUP_TARGETS.keys()
+        if unknown:
+            raise CommandError(f"Неизвестные цели: {', '.join(unknown)}")
+
+        report, over_budget = {}, []
+        for target in options["targets"] or STARTUP_TARGETS:
+            command, budget = STARTUP_TARGETS[target]
+            try:
+                result = profile_startup(command, runs=options["runs"])
+            except RuntimeError as error:
+                raise CommandError(str(error))
+
+            modules = sorted(
+                result["modules"],
+                key=lambda module: module["cumulative_ms"],
+                reverse=True,
+            )
+            packages = package_times(result["modules"])
+            report[target] = {
+                "command": command,
+                "seconds": result["seconds"],
+                "budget_seconds": budget,
+                "import_ms": round(sum(module["self_ms"] for module in modules), 1),
+                "packages_ms": {
+                    name: round(ms, 1) for name, ms in list(packages.items())[:limit]
+                },
+                "modules": modules[:limit],
+            }
+            if result["seconds"] > budget:
+                over_budget.append(target)
+
+            self.stdout.write(
+                f"{target} (manage.py {' '.join(command)}): {result['seconds']} с "
+                f"при бюджете {budget} с, импорт {report[target]['import_ms']} мс"
+            )
+            self.stdout.write("  Пакеты (собственное время импорта):")
+            for name, ms in report[target]["packages_ms"].items():
+                self.stdout.write(f"    {name}: {ms} мс")
+            self.stdout.write("  Модули (вместе с зависимостями):")
+            for module in report[target]["modules"]:
+                self.stdout.write(
+                    f"    {module['module']}: {module['cumulative_ms']} мс "
+                    f"(свое {module['self_ms']} мс)"
+                )
+
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8"
+            )
+        if options["check"] and over_budget:
+            raise CommandError(f"Старт дольше бюджета: {', '.join(over_budget)}")
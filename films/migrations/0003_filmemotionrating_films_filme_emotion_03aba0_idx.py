@@ -0,0 +1,19 @@
+# Generated by Django 6.1.2 on 2026-10-19 11:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emotions', '0001_initial'),
+        ('films', '0002_initial'),
+        ('users', '0002_emailconfirmation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filmemotionrating',
+            index=models.Index(fields=['emotion', 'intensity', 'film'], name='films_filme_emotion_03aba0_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-19 11:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('emotions', '0001_initial'),
+        ('films', '0003_filmemotionrating_films_filme_emotion_03aba0_idx'),
+        ('users', '0002_emailconfirmation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['country'], name='films_film_country_2d3398_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='film',
+            index=models.Index(fields=['is_published', 'genre', 'year'], name='films_film_is_publ_4e72cd_idx'),
+        ),
+    ]
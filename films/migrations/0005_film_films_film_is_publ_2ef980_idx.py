@@ -0,0 +1,22 @@
+# Generated by Django 6.1.2 on 2026-10-19 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emotions", "0001_initial"),
+        ("films", "0004_film_films_film_country_2d3398_idx_and_more"),
+        ("users", "0002_emailconfirmation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="film",
+            index=models.Index(
+                fields=["is_published", "-created_at"],
+                name="films_film_is_publ_2ef980_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 6.1.2 on 2026-10-19 12:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("films", "0005_film_films_film_is_publ_2ef980_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="film",
+            name="poster_variants",
+            field=models.JSONField(
+                blank=True, default=dict, editable=False, verbose_name="Версии постера"
+            ),
+        ),
+    ]
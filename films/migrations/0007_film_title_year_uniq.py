@@ -0,0 +1,21 @@
+# Generated by Django 6.1.2 on 2026-10-19 13:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emotions", "0001_initial"),
+        ("films", "0006_film_poster_variants"),
+        ("users", "0002_emailconfirmation"),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name="film",
+            constraint=models.UniqueConstraint(
+                fields=("title", "year"), name="films_film_title_year_uniq"
+            ),
+        ),
+    ]
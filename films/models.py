@@ -1,9 +1,51 @@
 import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+
 from django.db import models
 from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db.models.functions import Round
 
 from emotions.models import Emotion
 from users.models import UserProfile
+from .signals import ratings_changed
+
+# Фильмы, пересчет рейтинга которых отложен до выхода из deferred_rating_updates
+_deferred_films = ContextVar("deferred_rating_films", default=None)
+
+
+@contextmanager
+def deferred_rating_updates():
+    """
+    Откладывает пересчет рейтинга фильмов при сохранении оценок:
+    внутри блока FilmEmotionRating.save() только запоминает фильм, а на
+    выходе рейтинг каждого затронутого фильма пересчитывается один раз
+    (без Film.save() и его сигналов) и отправляется ratings_changed.
+    Вложенные блоки присоединяются к внешнему.
+    """
+    if _deferred_films.get() is not None:
+        yield _deferred_films.get()
+        return
+
+    film_ids = set()
+    token = _deferred_films.set(film_ids)
+    try:
+        yield film_ids
+    finally:
+        _deferred_films.reset(token)
+
+    if film_ids:
+        Film.objects.filter(pk__in=film_ids).update_ratings()
+        ratings_changed.send(sender=Film, film_ids=film_ids)
+
+
+def defer_rating_update(film_id):
+    """Запоминает фильм для пересчета, если пересчет сейчас отложен"""
+    film_ids = _deferred_films.get()
+    if film_ids is None:
+        return False
+    film_ids.add(film_id)
+    return True
 
 
 def film_poster_path(instance, filename):
@@ -13,6 +55,24 @@ def film_poster_path(instance, filename):
     return os.path.join("films/posters/", filename)
 
 
+class FilmQuerySet(models.QuerySet):
+    def update_ratings(self):
+        """
+        Пересчитывает рейтинг фильмов выборки одним UPDATE по средней
+        интенсивности эмоциональных оценок (без save() и сигналов)
+        """
+        ratings = FilmEmotionRating.objects.filter(film=models.OuterRef("pk"))
+        average = (
+            ratings.order_by()
+            .values("film")
+            .annotate(avg=models.Avg("intensity"))
+            .values("avg")
+        )
+        return self.filter(models.Exists(ratings)).update(
+            rating=Round(models.Subquery(average), 1)
+        )
+
+
 class Film(models.Model):
     """Модель фильма"""
 
@@ -47,6 +107,10 @@ class Film(models.Model):
     poster = models.ImageField(
         upload_to=film_poster_path, verbose_name="Постер", blank=True, null=True
     )
+    # Уменьшенные копии постера и размытая заглушка (см. posters.py)
+    poster_variants = models.JSONField(
+        default=dict, blank=True, editable=False, verbose_name="Версии постера"
+    )
     trailer_url = models.URLField(blank=True, verbose_name="Ссылка на трейлер")
     country = models.CharField(max_length=100, verbose_name="Страна производства")
     director = models.CharField(max_length=200, verbose_name="Режиссер")
@@ -74,6 +138,8 @@ class Film(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата добавления")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Дата обновления")
 
+    objects = FilmQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Фильм"
         verbose_name_plural = "Фильмы"
@@ -82,6 +148,18 @@ class Film(models.Model):
             models.Index(fields=["year"]),
             models.Index(fields=["rating"]),
             models.Index(fields=["genre"]),
+            models.Index(fields=["country"]),
+            # Группировки фасетов по опубликованным фильмам
+            models.Index(fields=["is_published", "genre", "year"]),
+            # Лента опубликованных фильмов (ordering = -created_at)
+            models.Index(fields=["is_published", "-created_at"]),
+        ]
+        constraints = [
+            # Естественный ключ фильма: по нему импорт находит существующие
+            # строки (ON CONFLICT), уникальный индекс заодно ускоряет поиск
+            models.UniqueConstraint(
+                fields=["title", "year"], name="films_film_title_year_uniq"
+            ),
         ]
 
     def __str__(self):
@@ -143,11 +221,24 @@ class FilmEmotionRating(models.Model):
         verbose_name_plural = "Оценки эмоций фильмов"
         unique_together = ["film", "emotion"]
         ordering = ["-intensity"]
+        indexes = [
+            # Покрывающий индекс для поиска фильмов по эмоции и интенсивности
+            models.Index(fields=["emotion", "intensity", "film"]),
+        ]
 
     def __str__(self):
         return f"{self.film.title} - {self.emotion.name}: {self.intensity}/10"
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        # Обновляем рейтинг фильма при изменении оценки
-        self.film.update_rating()
+        # Обновляем рейтинг фильма при изменении оценки (в фоне, через очередь)
+        if not defer_rating_update(self.film_id):
+            from .tasks import update_ratings
+
+            update_ratings.enqueue([self.film_id])
+
+    def delete(self, *args, **kwargs):
+        film_id = self.film_id
+        result = super().delete(*args, **kwargs)
+        defer_rating_update(film_id)
+        return result
@@ -0,0 +1,183 @@
+"""
+Уменьшенные копии постеров для адаптивной выдачи (srcset).
+
+Для каждого постера строятся JPEG и WebP фиксированной ширины
+(POSTER_WIDTHS) и крошечная размытая заглушка, которая встраивается в
+страницу как data URI и видна, пока грузится картинка. В имени файла -
+хэш содержимого исходника, поэтому файлы неизменяемы и их можно отдавать
+с Cache-Control: immutable: новый постер получает новые имена, а файлы
+старого удаляются. Результат хранится в Film.poster_variants:
+
+    {"source": имя исходника, "hash": ..., "placeholder": data URI,
+     "jpeg": {"200": имя файла, ...}, "webp": {...}}
+
+Pillow импортируется только при построении копий: выдаче страниц и API
+он не нужен.
+"""
+
+import base64
+import hashlib
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+from movie_emotion import metrics
+from .models import Film
+
+POSTER_WIDTHS = (200, 300, 400, 600)
+PLACEHOLDER_WIDTH = 16
+DERIVED_DIR = "films/posters/derived"
+
+# Формат Pillow и параметры сохранения; порядок - порядок <source> в <picture>
+POSTER_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+
+def derived_dir(film_id):
+    return f"{DERIVED_DIR}/{film_id}"
+
+
+def derived_name(film_id, digest, width, ext):
+    return f"{derived_dir(film_id)}/{digest}-{width}.{ext}"
+
+
+def _encode(image, ext):
+    pil_format, options = POSTER_FORMATS[ext]
+    buffer = BytesIO()
+    image.save(buffer, pil_format, **options)
+    return buffer.getvalue()
+
+
+def _placeholder(image):
+    from PIL import ImageFilter
+
+    small = image.copy()
+    small.thumbnail((PLACEHOLDER_WIDTH, PLACEHOLDER_WIDTH * 2))
+    small = small.filter(ImageFilter.GaussianBlur(1))
+    data = base64.b64encode(_encode(small, "jpeg")).decode("ascii")
+    return f"data:image/jpeg;base64,{data}"
+
+
+def render_variants(data, film_id, digest, storage):
+    """Строит и сохраняет копии изображения data, возвращает poster_variants"""
+    from PIL import Image, ImageOps
+
+    with Image.open(BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source).convert("RGB")
+
+    # Увеличивать постер смысла нет: узкий исходник дает одну копию своей ширины
+    widths = [width for width in POSTER_WIDTHS if width < image.width]
+    widths = widths or [image.width]
+
+    variants = {"hash": digest, "placeholder": _placeholder(image)}
+    for ext in POSTER_FORMATS:
+        variants[ext] = {}
+    for width in widths:
+        height = round(image.height * width / image.width)
+        resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        for ext in POSTER_FORMATS:
+            name = derived_name(film_id, digest, width, ext)
+            # Имя зависит от содержимого: готовый файл не перезаписываем
+            if not storage.exists(name):
+                name = storage.save(name, ContentFile(_encode(resized, ext)))
+            variants[ext][str(width)] = name
+    return variants
+
+
+def _by_width(files):
+    """[(ширина, имя файла)] по возрастанию ширины"""
+    return sorted(((int(width), name) for width, name in files.items()))
+
+
+def _derived_files(variants):
+    return {name for ext in POSTER_FORMATS for name in variants.get(ext, {}).values()}
+
+
+def _delete_stale(storage, film_id, keep):
+    """
+    Удаляет копии прежних постеров фильма. Список берется из каталога, а не
+    из старого poster_variants: его могло затереть сохранение устаревшего
+    экземпляра фильма
+    """
+    directory = derived_dir(film_id)
+    try:
+        _, files = storage.listdir(directory)
+    except FileNotFoundError:
+        return
+    for filename in files:
+        name = f"{directory}/{filename}"
+        if name not in keep:
+            storage.delete(name)
+
+
+def build_poster_variants(film_id, force=False):
+    """
+    Строит копии постера фильма, если постер изменился (или force).
+    Возвращает новое значение poster_variants или None, если фильма нет
+    """
+    film = (
+        Film.objects.only("id", "poster", "poster_variants").filter(pk=film_id).first()
+    )
+    if film is None:
+        return None
+    old = film.poster_variants or {}
+    storage = film.poster.storage
+
+    if not film.poster:
+        if not old:
+            return old
+        variants = {}
+    elif not force and old.get("source") == film.poster.name:
+        return old
+    else:
+        try:
+            with film.poster.open("rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            metrics.inc("poster_variants_total", result="missing")
+            return old
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        if not force and old.get("hash") == digest:
+            # Тот же файл под другим именем - копии уже есть
+            variants = {**old, "source": film.poster.name}
+        else:
+            with metrics.timer("poster_variants_duration_seconds"):
+                variants = render_variants(data, film.pk, digest, storage)
+            variants["source"] = film.poster.name
+            metrics.inc("poster_variants_total", result="generated")
+
+    # update() без save(): сигналы фильма (и повторная постановка задачи) не нужны
+    Film.objects.filter(pk=film.pk).update(poster_variants=variants)
+    _delete_stale(storage, film.pk, _derived_files(variants))
+    return variants
+
+
+def _url(storage, name, request=None):
+    url = storage.url(name)
+    return request.build_absolute_uri(url) if request is not None else url
+
+
+def poster_sources(film, request=None):
+    """
+    Адреса копий постера для <picture> и API:
+    {"webp": srcset, "jpeg": srcset, "src": запасной адрес, "placeholder": ...}.
+    Пока копии не построены - только адрес исходника
+    """
+    if not film.poster:
+        return None
+    storage = film.poster.storage
+    variants = film.poster_variants or {}
+    if variants.get("source") != film.poster.name:
+        return {"src": _url(storage, film.poster.name, request)}
+
+    sources = {"placeholder": variants["placeholder"]}
+    for ext in POSTER_FORMATS:
+        sources[ext] = ", ".join(
+            f"{_url(storage, name, request)} {width}w"
+            for width, name in _by_width(variants[ext])
+        )
+    # Браузеры без srcset получают самую крупную копию JPEG
+    sources["src"] = _url(storage, _by_width(variants["jpeg"])[-1][1], request)
+    return sources
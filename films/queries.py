@@ -0,0 +1,150 @@
+from django.db.models import Exists, IntegerField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import FilmEmotionRating
+
+MIN_INTENSITY = 1
+MAX_INTENSITY = 10
+
+MODE_ANY = "any"
+MODE_ALL = "all"
+
+
+def _parse_ids(values):
+    """Список ID из значений вида ["1,2", "3"]; некорректные значения пропускаются"""
+    ids = []
+    for value in values:
+        for part in value.split(","):
+            part = part.strip()
+            if part.isdigit() and int(part) not in ids:
+                ids.append(int(part))
+    return ids
+
+
+def _parse_intensity(value, default):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return min(max(value, MIN_INTENSITY), MAX_INTENSITY)
+
+
+class EmotionCriterion:
+    """Условие на интенсивность одной эмоции в фильме"""
+
+    def __init__(
+        self, emotion_id, min_intensity=MIN_INTENSITY, max_intensity=MAX_INTENSITY
+    ):
+        self.emotion_id = emotion_id
+        self.min_intensity = min_intensity
+        self.max_intensity = max_intensity
+
+    def as_q(self):
+        return Q(
+            emotion_id=self.emotion_id,
+            intensity__gte=self.min_intensity,
+            intensity__lte=self.max_intensity,
+        )
+
+
+class EmotionFilter:
+    """
+    Фильтр фильмов по эмоциям. Компилируется в EXISTS-подзапросы
+    к FilmEmotionRating (без JOIN и distinct()), поэтому дубликатов
+    не бывает и фильтр корректно сочетается с пагинацией.
+
+    mode="any" - хотя бы одна эмоция из criteria, mode="all" - все сразу,
+    exclude_ids - у фильма не должно быть оценок этих эмоций.
+    """
+
+    def __init__(self, criteria=(), mode=MODE_ANY, exclude_ids=()):
+        self.criteria = list(criteria)
+        self.mode = mode if mode in (MODE_ANY, MODE_ALL) else MODE_ANY
+        self.exclude_ids = list(exclude_ids)
+
+    @classmethod
+    def from_params(cls, params, ids_param="emotion_ids"):
+        """
+        Собирает фильтр из GET-параметров:
+        emotion_ids=1,2 (или повторяющийся параметр), min_intensity, max_intensity,
+        ranges=3:5-8,4:1-3 (диапазон для отдельной эмоции), mode=any|all,
+        exclude_emotion_ids=5,6
+        """
+        min_intensity = _parse_intensity(params.get("min_intensity"), MIN_INTENSITY)
+        max_intensity = _parse_intensity(params.get("max_intensity"), MAX_INTENSITY)
+
+        criteria = {
+            emotion_id: EmotionCriterion(emotion_id, min_intensity, max_intensity)
+            for emotion_id in _parse_ids(params.getlist(ids_param))
+        }
+
+        for value in params.getlist("ranges"):
+            for part in value.split(","):
+                emotion_id, _, bounds = part.partition(":")
+                low, _, high = bounds.partition("-")
+                if not emotion_id.strip().isdigit():
+                    continue
+                emotion_id = int(emotion_id)
+                criteria[emotion_id] = EmotionCriterion(
+                    emotion_id,
+                    _parse_intensity(low, min_intensity),
+                    _parse_intensity(high or low, max_intensity),
+                )
+
+        return cls(
+            criteria=criteria.values(),
+            mode=params.get("mode", MODE_ANY),
+            exclude_ids=_parse_ids(params.getlist("exclude_emotion_ids")),
+        )
+
+    def __bool__(self):
+        return bool(self.criteria or self.exclude_ids)
+
+    def _ratings(self):
+        return FilmEmotionRating.objects.filter(film=OuterRef("pk"))
+
+    def _match_q(self):
+        match_q = Q()
+        for criterion in self.criteria:
+            match_q |= criterion.as_q()
+        return match_q
+
+    def apply(self, queryset):
+        """Накладывает фильтр на QuerySet фильмов"""
+        if self.criteria:
+            if self.mode == MODE_ALL:
+                for criterion in self.criteria:
+                    queryset = queryset.filter(
+                        Exists(self._ratings().filter(criterion.as_q()))
+                    )
+            else:
+                queryset = queryset.filter(
+                    Exists(self._ratings().filter(self._match_q()))
+                )
+
+        if self.exclude_ids:
+            queryset = queryset.filter(
+                ~Exists(self._ratings().filter(emotion_id__in=self.exclude_ids))
+            )
+        return queryset
+
+    def annotate_match_score(self, queryset):
+        """
+        Добавляет match_score - сумму интенсивностей подходящих эмоций фильма
+        """
+        if not self.criteria:
+            return queryset.annotate(match_score=Value(0, output_field=IntegerField()))
+
+        scores = (
+            self._ratings()
+            .filter(self._match_q())
+            .order_by()
+            .values("film")
+            .annotate(total=Sum("intensity"))
+            .values("total")
+        )
+        return queryset.annotate(
+            match_score=Coalesce(
+                Subquery(scores, output_field=IntegerField()), Value(0)
+            )
+        )
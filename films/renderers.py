@@ -0,0 +1,58 @@
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+_json_encoder = JSONEncoder()
+
+
+class MessagePackRenderer(BaseRenderer):
+    """Компактный бинарный формат MessagePack (Accept: application/msgpack)"""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        # Типы, неизвестные msgpack (Decimal, UUID, lazy-строки), приводим так же, как JSONRenderer
+        return msgpack.packb(data, default=_json_encoder.default, use_bin_type=True)
+
+
+class CBORRenderer(BaseRenderer):
+    """Компактный бинарный формат CBOR (Accept: application/cbor)"""
+
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return cbor2.dumps(
+            data,
+            default=lambda encoder, value: encoder.encode(_json_encoder.default(value)),
+        )
+
+
+# Бинарные рендереры подключаются только при установленных библиотеках
+BINARY_RENDERER_CLASSES = [
+    renderer
+    for renderer, library in (
+        (MessagePackRenderer, msgpack),
+        (CBORRenderer, cbor2),
+    )
+    if library is not None
+]
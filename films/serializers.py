@@ -1,8 +1,64 @@
 from rest_framework import serializers
 from .models import Film, FilmEmotionRating
+from .posters import poster_sources
 from emotions.models import Emotion
 
 
+class SparseFieldsMixin:
+    """
+    Отбор полей сериализатора по параметрам ?fields= и ?expand=.
+    Вложенные (expandable_fields) поля без ?fields= отдаются только
+    при явном перечислении в ?expand=.
+    """
+
+    expandable_fields = []
+    # Поля модели, от которых зависят вычисляемые поля сериализатора
+    source_fields = {}
+
+    @classmethod
+    def select_fields(cls, fields=None, expand=None):
+        """Возвращает список отобранных полей в порядке Meta.fields"""
+        expand = set(expand or []) & set(cls.expandable_fields)
+        if fields:
+            wanted = set(fields) | expand
+            return [name for name in cls.Meta.fields if name in wanted]
+        return [
+            name
+            for name in cls.Meta.fields
+            if name not in cls.expandable_fields or name in expand
+        ]
+
+    @classmethod
+    def model_fields_for(cls, selected):
+        """Поля модели, которые нужно загрузить для отобранных полей (для only())"""
+        concrete = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        model_fields = {"id"}
+        for name in selected:
+            for source in cls.source_fields.get(name, [name]):
+                if source in concrete:
+                    model_fields.add(source)
+        return sorted(model_fields)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.context.get("selected_fields")
+        if selected is not None:
+            for name in set(self.fields) - set(selected):
+                self.fields.pop(name)
+
+
+class PosterSourcesField(serializers.Field):
+    """Адреса копий постера для srcset (см. posters.poster_sources)"""
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, film):
+        return poster_sources(film, self.context.get("request"))
+
+
 class EmotionSerializer(serializers.ModelSerializer):
     class Meta:
         model = Emotion
@@ -17,10 +73,17 @@ class FilmEmotionRatingSerializer(serializers.ModelSerializer):
         fields = ["emotion", "intensity", "description"]
 
 
-class FilmSerializer(serializers.ModelSerializer):
+class FilmSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    expandable_fields = ["emotion_ratings", "emotion_profile"]
+    source_fields = {
+        "duration_hours": ["duration"],
+        "poster_srcset": ["poster", "poster_variants"],
+    }
+
     emotion_ratings = FilmEmotionRatingSerializer(many=True, read_only=True)
     duration_hours = serializers.ReadOnlyField()
     emotion_profile = serializers.SerializerMethodField()
+    poster_srcset = PosterSourcesField()
 
     class Meta:
         model = Film
@@ -33,6 +96,7 @@ class FilmSerializer(serializers.ModelSerializer):
             "duration",
             "duration_hours",
             "poster",
+            "poster_srcset",
             "trailer_url",
             "country",
             "director",
@@ -47,12 +111,20 @@ class FilmSerializer(serializers.ModelSerializer):
         read_only_fields = ["rating", "views_count", "created_at"]
 
     def get_emotion_profile(self, obj):
-        return obj.emotion_profile
+        # Используем предзагруженные оценки вместо запроса на каждый фильм
+        return {
+            rating.emotion.name: rating.intensity
+            for rating in obj.emotion_ratings.all()
+        }
 
 
-class FilmListSerializer(serializers.ModelSerializer):
+class FilmListSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """Упрощенный сериализатор для списка фильмов"""
 
+    source_fields = {"poster_srcset": ["poster", "poster_variants"]}
+
+    poster_srcset = PosterSourcesField()
+
     class Meta:
         model = Film
         fields = [
@@ -63,5 +135,6 @@ class FilmListSerializer(serializers.ModelSerializer):
             "genre",
             "rating",
             "poster",
+            "poster_srcset",
             "duration",
         ]
@@ -0,0 +1,23 @@
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+# Отправляется после пересчета рейтингов фильмов, чьи эмоциональные оценки
+# изменились (см. models.deferred_rating_updates). Аргумент: film_ids
+ratings_changed = Signal()
+
+
+# Модель задается строкой: models.py сам импортирует этот модуль
+@receiver(post_save, sender="films.Film")
+def _schedule_poster_variants(sender, instance, update_fields=None, **kwargs):
+    """Ставит в очередь построение копий постера, если постер сменился"""
+    if update_fields is not None and "poster" not in update_fields:
+        return
+    if "poster_variants" in instance.get_deferred_fields():
+        return
+    source = (instance.poster_variants or {}).get("source")
+    if (instance.poster.name or None) == source:
+        return
+
+    from .tasks import generate_poster_variants
+
+    generate_poster_variants.enqueue(instance.pk)
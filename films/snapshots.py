@@ -0,0 +1,220 @@
+import json
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.contrib.auth.hashers import make_password
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+SNAPSHOT_VERSION = 1
+
+# Модели снимка в порядке зависимостей по внешним ключам
+SNAPSHOT_MODELS = [
+    "auth.User",
+    "emotions.Emotion",
+    "users.UserProfile",
+    "films.Film",
+    "films.FilmEmotionRating",
+    "users.UserProfile.preferred_emotions",
+    "users.UserProfile.favorite_films",
+    "notifications.Subscription",
+]
+
+# Снимок по умолчанию - только каталог: он попадает на стенды, и личные
+# данные пользователей (почта, имена, подписки) выгружаются лишь по явному
+# include_users. Ссылки каталога на пользователей (автор фильма, оценки)
+# в таком снимке пустые
+CATALOGUE_MODELS = {"emotions.Emotion", "films.Film", "films.FilmEmotionRating"}
+
+
+# Значения, которые не выгружаются как есть: снимок попадает на стенды,
+# поэтому вместо хэшей паролей пишется непригодный для входа пароль
+SANITIZED_FIELDS = {
+    "auth.User": {"password": lambda: make_password(None)},
+}
+
+
+def get_snapshot_models(include_users=False):
+    """Модели снимка; "app.Model.field" - промежуточная таблица ManyToMany"""
+    models = []
+    for label in SNAPSHOT_MODELS:
+        if not include_users and label not in CATALOGUE_MODELS:
+            continue
+        app_label, model_name, *m2m_field = label.split(".")
+        model = apps.get_model(app_label, model_name)
+        if m2m_field:
+            model = model._meta.get_field(m2m_field[0]).remote_field.through
+        models.append(model)
+    return models
+
+
+def _model_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def _write_chunk(file, label, fields, rows):
+    chunk = {"model": label, "fields": fields, "rows": rows}
+    file.write(json.dumps(chunk, cls=DjangoJSONEncoder, ensure_ascii=False) + "\n")
+
+
+def _detached_fields(model, models):
+    """Индексы полей-ссылок на модели вне снимка: они выгружаются пустыми"""
+    detached = []
+    for index, field in enumerate(model._meta.concrete_fields):
+        if field.is_relation and field.related_model not in models:
+            if not field.null:
+                raise ValueError(
+                    f"{model._meta.label}.{field.name} ссылается на "
+                    f"{field.related_model._meta.label}, которой нет в снимке"
+                )
+            detached.append(index)
+    return detached
+
+
+def export_snapshot(file, chunk_size=5000, include_users=False, stdout=None):
+    """
+    Потоково выгружает каталог в JSONL: заголовок, затем пачки строк
+    {"model": ..., "fields": [...], "rows": [[...], ...]}.
+    На PostgreSQL iterator() читает через серверный курсор.
+    Пользователи, профили и подписки выгружаются только с include_users.
+    """
+    models = get_snapshot_models(include_users)
+    header = {
+        "snapshot": SNAPSHOT_VERSION,
+        "models": [model._meta.label for model in models],
+    }
+    file.write(json.dumps(header) + "\n")
+
+    counts = {}
+    for model in models:
+        label = model._meta.label
+        fields = _model_fields(model)
+        counts[label] = 0
+        sanitized = [
+            (fields.index(name), make_value)
+            for name, make_value in SANITIZED_FIELDS.get(label, {}).items()
+        ]
+        sanitized += [
+            (index, lambda: None) for index in _detached_fields(model, models)
+        ]
+
+        queryset = model._default_manager.order_by("pk").values_list(*fields)
+        rows = []
+        for row in queryset.iterator(chunk_size=chunk_size):
+            if sanitized:
+                row = list(row)
+                for index, make_value in sanitized:
+                    row[index] = make_value()
+            rows.append(row)
+            if len(rows) >= chunk_size:
+                _write_chunk(file, label, fields, rows)
+                counts[label] += len(rows)
+                rows = []
+        if rows:
+            _write_chunk(file, label, fields, rows)
+            counts[label] += len(rows)
+
+        if stdout is not None:
+            stdout.write(f"{label}: {counts[label]}")
+    return counts
+
+
+@contextmanager
+def _raw_timestamps(model):
+    """Отключает auto_now/auto_now_add, чтобы сохранить даты из снимка"""
+    fields = [
+        field
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _referencing_fields(models):
+    """Поля моделей вне снимка, строки которых ссылаются на таблицы снимка"""
+    snapshot = set(models)
+    found = []
+    for model in apps.get_models(include_auto_created=True):
+        if model in snapshot:
+            continue
+        for field in model._meta.concrete_fields:
+            if field.is_relation and field.related_model in snapshot:
+                lookup = {f"{field.name}__isnull": False}
+                if model._default_manager.filter(**lookup).exists():
+                    found.append(f"{model._meta.label}.{field.name}")
+    return found
+
+
+def _clear(models):
+    """
+    Очищает только таблицы снимка. Если на них ссылаются данные других
+    таблиц (уведомления, задачи, журнал админки), загрузка прерывается:
+    каскадное удаление стерло бы данные, которых нет в снимке
+    """
+    referencing = _referencing_fields(models)
+    if referencing:
+        raise ValueError(
+            "На данные снимка ссылаются таблицы вне снимка: " + ", ".join(referencing)
+        )
+    # DELETE, а не TRUNCATE: PostgreSQL не усекает таблицу, на которую
+    # ссылаются внешние ключи других таблиц, даже пустых, без CASCADE
+    with connection.cursor() as cursor:
+        for model in reversed(models):
+            table = connection.ops.quote_name(model._meta.db_table)
+            cursor.execute(f"DELETE FROM {table}")
+
+
+def restore_snapshot(file, clear=False, batch_size=5000, stdout=None):
+    """
+    Загружает снимок пачками через bulk_create в одной транзакции
+    (на PostgreSQL проверка внешних ключей отложена до коммита),
+    затем сдвигает последовательности первичных ключей.
+    Сигналы и save() не вызываются.
+    """
+    header = json.loads(file.readline())
+    if header.get("snapshot") != SNAPSHOT_VERSION:
+        raise ValueError(f"Неподдерживаемая версия снимка: {header.get('snapshot')}")
+
+    # Загружаются и очищаются только таблицы, которые есть в снимке
+    known = {model._meta.label: model for model in get_snapshot_models(True)}
+    unknown = set(header["models"]) - set(known)
+    if unknown:
+        raise ValueError(f"Неизвестные модели в снимке: {', '.join(sorted(unknown))}")
+    models = {label: known[label] for label in header["models"]}
+    counts = dict.fromkeys(header["models"], 0)
+
+    with transaction.atomic():
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET CONSTRAINTS ALL DEFERRED")
+        if clear:
+            _clear(list(models.values()))
+
+        for line in file:
+            chunk = json.loads(line)
+            model = models[chunk["model"]]
+            objs = [model(**dict(zip(chunk["fields"], row))) for row in chunk["rows"]]
+            with _raw_timestamps(model):
+                model._default_manager.bulk_create(objs, batch_size=batch_size)
+            counts[chunk["model"]] += len(objs)
+
+        sequence_sql = connection.ops.sequence_reset_sql(
+            no_style(), list(models.values())
+        )
+        if sequence_sql:
+            with connection.cursor() as cursor:
+                for sql in sequence_sql:
+                    cursor.execute(sql)
+
+    if stdout is not None:
+        for label, count in counts.items():
+            stdout.write(f"{label}: {count}")
+    return counts
@@ -0,0 +1,166 @@
+import random
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+
+from emotions.enums import EMOTION_COLORS, EMOTION_ICONS
+from emotions.models import Emotion
+from notifications.models import Notification, Subscription
+from users.models import UserProfile
+from .models import Film, FilmEmotionRating
+
+BATCH_SIZE = 5000
+
+COUNTRIES = ["США", "Россия", "Франция", "Германия", "Япония", "Италия", "Индия"]
+
+
+def scale_counts(films):
+    """Типовые размеры остальных таблиц для каталога из films фильмов"""
+    users = max(films // 10, 10)
+    return {
+        "films": films,
+        "emotions": 12,
+        "ratings": films * 4,
+        "users": users,
+        "subscriptions": users * 3,
+        "notifications": users * 20,
+    }
+
+
+def _bulk_create(model, objs):
+    """bulk_create пачками из генератора, возвращает id созданных объектов"""
+    objs = iter(objs)
+    ids = []
+    while batch := list(islice(objs, BATCH_SIZE)):
+        model.objects.bulk_create(batch)
+        ids.extend(obj.pk for obj in batch)
+    return ids
+
+
+def _spread(rng, total, owners, choices):
+    """
+    Распределяет total уникальных пар (owner, choice) равномерно по owners,
+    для каждого owner выбирая разные choices
+    """
+    per_owner, extra = divmod(total, len(owners)) if owners else (0, 0)
+    for index, owner in enumerate(owners):
+        count = min(per_owner + (1 if index < extra else 0), len(choices))
+        for choice in rng.sample(choices, count):
+            yield owner, choice
+
+
+def generate_dataset(
+    films=1000,
+    emotions=12,
+    ratings=4000,
+    users=100,
+    subscriptions=300,
+    notifications=2000,
+    seed=0,
+):
+    """
+    Детерминированно (по seed) генерирует синтетический каталог через bulk_create.
+    save() и сигналы не вызываются, рейтинг фильмов пересчитывается в конце.
+    Возвращает количество созданных объектов по моделям.
+    """
+    rng = random.Random(seed)
+    genres = [value for value, _ in Film.GENRE_CHOICES]
+
+    emotion_ids = _bulk_create(
+        Emotion,
+        (
+            Emotion(
+                name=f"Синтетическая эмоция {seed}-{i}",
+                slug=f"synthetic-{seed}-{i}",
+                description="Сгенерировано для нагрузочного тестирования",
+                color=rng.choice(EMOTION_COLORS)[0],
+                icon=rng.choice(EMOTION_ICONS)[0],
+            )
+            for i in range(emotions)
+        ),
+    )
+
+    # Хэш пароля считается один раз - он медленный намеренно
+    password = make_password(f"synthetic-{seed}")
+    user_ids = _bulk_create(
+        User,
+        (
+            User(
+                username=f"synthetic_{seed}_{i}",
+                email=f"synthetic_{seed}_{i}@example.com",
+                password=password,
+            )
+            for i in range(users)
+        ),
+    )
+    profile_ids = _bulk_create(
+        UserProfile, (UserProfile(user_id=user_id) for user_id in user_ids)
+    )
+
+    film_ids = _bulk_create(
+        Film,
+        (
+            Film(
+                title=f"Фильм {seed}-{i}",
+                description=f"Синтетическое описание фильма номер {i}",
+                year=rng.randint(1950, 2025),
+                duration=rng.randint(70, 200),
+                country=rng.choice(COUNTRIES),
+                director=f"Режиссер {rng.randint(1, max(films // 20, 1))}",
+                genre=rng.choice(genres),
+                is_published=True,
+            )
+            for i in range(films)
+        ),
+    )
+
+    rating_ids = _bulk_create(
+        FilmEmotionRating,
+        (
+            FilmEmotionRating(
+                film_id=film_id, emotion_id=emotion_id, intensity=rng.randint(1, 10)
+            )
+            for film_id, emotion_id in _spread(rng, ratings, film_ids, emotion_ids)
+        ),
+    )
+    Film.objects.filter(id__in=film_ids).update_ratings()
+
+    subscription_ids = _bulk_create(
+        Subscription,
+        (
+            Subscription(
+                user_id=profile_id,
+                emotion_id=emotion_id,
+                min_intensity=rng.randint(1, 10),
+            )
+            for profile_id, emotion_id in _spread(
+                rng, subscriptions, profile_ids, emotion_ids
+            )
+        ),
+    )
+
+    notification_ids = _bulk_create(
+        Notification,
+        (
+            Notification(
+                user_id=rng.choice(profile_ids),
+                film_id=rng.choice(film_ids),
+                emotion_id=rng.choice(emotion_ids),
+                notification_type="subscription",
+                title="Новый фильм",
+                message="Синтетическое уведомление",
+                is_read=rng.random() < 0.5,
+            )
+            for _ in range(notifications if profile_ids and film_ids else 0)
+        ),
+    )
+
+    return {
+        "emotions": len(emotion_ids),
+        "users": len(user_ids),
+        "films": len(film_ids),
+        "ratings": len(rating_ids),
+        "subscriptions": len(subscription_ids),
+        "notifications": len(notification_ids),
+    }
@@ -0,0 +1,15 @@
+from tasks.queue import task
+from .models import Film
+from .posters import build_poster_variants
+
+
+@task
+def update_ratings(film_ids):
+    """Пересчет рейтинга фильмов по эмоциональным оценкам"""
+    Film.objects.filter(pk__in=film_ids).update_ratings()
+
+
+@task(timeout=120)
+def generate_poster_variants(film_id):
+    """Копии постера для srcset и размытая заглушка (см. posters.py)"""
+    build_poster_variants(film_id)
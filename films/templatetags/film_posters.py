@@ -0,0 +1,21 @@
+from django import template
+
+from films.posters import poster_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag("films/poster_picture.html")
+def poster_picture(film, sizes="100vw", css_class="", style="", loading="lazy"):
+    """
+    <picture> с копиями постера: WebP и JPEG через srcset/sizes и размытая
+    заглушка фоном, пока картинка не загрузилась. Без копий - исходник
+    """
+    return {
+        "film": film,
+        "sources": poster_sources(film),
+        "sizes": sizes,
+        "css_class": css_class,
+        "style": style,
+        "loading": loading,
+    }
@@ -1,3 +1,1050 @@
-from django.test import TestCase
+import asyncio
+import base64
+import gzip
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipUnless
+from urllib.parse import urlsplit
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import DatabaseError, connection, transaction
+from django.http import HttpResponse
+from django.test import (
+    Client,
+    RequestFactory,
+    SimpleTestCase,
+    TestCase,
+    override_settings,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from rest_framework.permissions import IsAuthenticated
+
+from emotions.models import Emotion
+from movie_emotion import db_pool, metrics
+from movie_emotion.metrics import DEFAULT_BUCKETS
+from movie_emotion.db_router import PIN_COOKIE, stick_to_primary, use_primary
+from movie_emotion.instrumentation import (
+    QueryRecorder,
+    SlowQueryLog,
+    get_query_budget,
+    read_slow_query_log,
+)
+from movie_emotion.middleware import PrimaryPinMiddleware, brotli
+from movie_emotion.testing import (
+    DatasetTestCase,
+    QueryBudgetTestMixin,
+    QueryPlanTestMixin,
+)
+from movie_emotion.throttling import CacheBuckets
+from notifications.models import Notification, Subscription
+from tasks.models import Task
+from tasks.worker import Worker
+from users.models import UserProfile
+from .api_views import FilmViewSet
+from .management.commands.api_load_test import Command as ApiLoadTestCommand
+from .benchmarks import measure
+from .models import Film, FilmEmotionRating
+from .posters import build_poster_variants, poster_sources
+from .importers import FilmImporter, read_csv
+from .queries import EmotionCriterion, EmotionFilter
+from .snapshots import export_snapshot, restore_snapshot
+from .renderers import cbor2, msgpack
+
+
+class ApiFormatTests(DatasetTestCase):
+    dataset = {"films": 30, "emotions": 3, "ratings": 60, "users": 1, "seed": 1}
+
+    def matrix_from_db(self, film_ids, emotion_ids):
+        ratings = {
+            (film_id, emotion_id): intensity
+            for film_id, emotion_id, intensity in FilmEmotionRating.objects.values_list(
+                "film_id", "emotion_id", "intensity"
+            )
+        }
+        return bytes(
+            ratings.get((film_id, emotion_id), 0)
+            for film_id in film_ids
+            for emotion_id in emotion_ids
+        )
+
+    @skipUnless(msgpack and cbor2, "нужны msgpack и cbor2 (extra api)")
+    def test_emotion_matrix_formats(self):
+        url = reverse("film-emotion-matrix")
+
+        response = self.client.get(url)
+        self.assertEqual(response["Content-Type"], "application/json")
+        data = response.json()["results"]
+        self.assertEqual(data["encoding"], "base64")
+        self.assertEqual(data["shape"], [30, 3])
+        self.assertEqual(
+            base64.b64decode(data["intensities"]),
+            self.matrix_from_db(data["film_ids"], data["emotion_ids"]),
+        )
+
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(response["Content-Type"], "application/msgpack")
+        packed = msgpack.unpackb(response.content)["results"]
+        self.assertEqual(packed["encoding"], "raw")
+        self.assertEqual(packed["film_ids"], data["film_ids"])
+        self.assertEqual(packed["intensities"], base64.b64decode(data["intensities"]))
+
+        response = self.client.get(url + "?format=cbor")
+        self.assertEqual(response["Content-Type"], "application/cbor")
+        self.assertEqual(
+            cbor2.loads(response.content)["results"]["intensities"],
+            packed["intensities"],
+        )
+
+    @skipUnless(msgpack and cbor2, "нужны msgpack и cbor2 (extra api)")
+    def test_binary_renderers_on_regular_endpoints(self):
+        url = reverse("film-list")
+        expected = self.client.get(url).json()
+        response = self.client.get(url, HTTP_ACCEPT="application/msgpack")
+        self.assertEqual(msgpack.unpackb(response.content), expected)
+        response = self.client.get(url, HTTP_ACCEPT="application/cbor")
+        self.assertEqual(cbor2.loads(response.content), expected)
+
+    def test_compression(self):
+        url = reverse("film-list")
+        plain = self.client.get(url)
+        self.assertFalse(plain.has_header("Content-Encoding"))
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        if brotli is not None:
+            response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+            self.assertEqual(response["Content-Encoding"], "br")
+            self.assertEqual(brotli.decompress(response.content), plain.content)
+
+        # Страницы сайта и мелкие ответы не сжимаются
+        response = self.client.get(reverse("films:list"), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+        with override_settings(API_COMPRESSION_MIN_SIZE=len(plain.content) + 1):
+            # Порог читается при создании middleware - нужен новый клиент
+            response = Client().get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertFalse(response.has_header("Content-Encoding"))
+
+    def test_compressed_etag_is_weak(self):
+        ids = ",".join(map(str, Film.objects.values_list("pk", flat=True)[:10]))
+        url = reverse("film-batch") + f"?ids={ids}"
+        etag = self.client.get(url)["ETag"]
+        self.assertTrue(etag.startswith('"'))
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["ETag"], "W/" + etag)
+
+
+class FilmBatchTests(DatasetTestCase):
+    def test_conditional_requests_follow_emotion_ratings(self):
+        rating = FilmEmotionRating.objects.first()
+        url = reverse("film-batch") + f"?ids={rating.film_id}"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Оценки меняются без Film.updated_at - ответ должен обновиться
+        FilmEmotionRating.objects.filter(pk=rating.pk).update(
+            intensity=rating.intensity % 10 + 1
+        )
+        response = self.client.get(
+            url,
+            HTTP_IF_NONE_MATCH=etag,
+            HTTP_IF_MODIFIED_SINCE="Fri, 01 Jan 2100 00:00:00 GMT",
+        )
+        self.assertEqual(response.status_code, 200)
+        profile = response.json()["results"][0]["emotion_profile"]
+        self.assertEqual(
+            profile[rating.emotion.name]["intensity"], rating.intensity % 10 + 1
+        )
+
+
+# Предзагрузка оценок: выборка по списку id фильмов (не подзапрос фасетов)
+RATINGS_PREFETCH = re.compile(r'"films_filmemotionrating"\."film_id" IN \(\d')
+
+
+class SparseFieldsTests(DatasetTestCase):
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json(), [query["sql"] for query in queries]
+
+    def test_fields_limit_response_and_columns(self):
+        data, queries = self.get(reverse("film-list") + "?fields=id,title")
+        self.assertTrue(data["results"])
+        for film in data["results"]:
+            self.assertEqual(set(film), {"id", "title"})
+        page_query = next(sql for sql in queries if "LIMIT" in sql)
+        self.assertNotIn('"films_film"."description"', page_query)
+        self.assertFalse([sql for sql in queries if RATINGS_PREFETCH.search(sql)])
+
+    def test_unknown_fields_ignored(self):
+        data, _ = self.get(reverse("film-list") + "?fields=id,no_such_field")
+        self.assertEqual(set(data["results"][0]), {"id"})
+
+    def test_expand_adds_nested_data(self):
+        film = Film.objects.filter(
+            is_published=True, emotion_ratings__isnull=False
+        ).first()
+        url = reverse("film-detail", args=[film.pk])
+        # Без параметров ответ прежний - со всеми вложенными данными
+        data, queries = self.get(url)
+        self.assertIn("emotion_ratings", data)
+        self.assertIn("emotion_profile", data)
+        self.assertTrue([sql for sql in queries if RATINGS_PREFETCH.search(sql)])
+
+        data, queries = self.get(url + "?fields=id,title")
+        self.assertEqual(set(data), {"id", "title"})
+        self.assertFalse([sql for sql in queries if RATINGS_PREFETCH.search(sql)])
+
+        data, _ = self.get(url + "?fields=id,title&expand=emotion_ratings")
+        self.assertEqual(set(data), {"id", "title", "emotion_ratings"})
+        self.assertIn("name", data["emotion_ratings"][0]["emotion"])
+
+        # ?expand= без ?fields= отдает обычные поля и только названные вложенные
+        data, _ = self.get(url + "?expand=emotion_profile")
+        self.assertIn("description", data)
+        self.assertIn("emotion_profile", data)
+        self.assertNotIn("emotion_ratings", data)
+
+    def test_emotion_profile_uses_prefetch(self):
+        emotion_ids = ",".join(map(str, Emotion.objects.values_list("id", flat=True)))
+        data, queries = self.get(
+            reverse("film-by-emotion")
+            + f"?emotion_ids={emotion_ids}&fields=id&expand=emotion_profile"
+        )
+        self.assertGreater(len(data["results"]), 1)
+        self.assertTrue(all("emotion_profile" in film for film in data["results"]))
+        # Один запрос оценок на страницу, а не на каждый фильм
+        prefetches = [sql for sql in queries if RATINGS_PREFETCH.search(sql)]
+        self.assertEqual(len(prefetches), 1)
+
+
+class FilmImporterTests(TestCase):
+    ROW = {
+        "title": "Интерстеллар",
+        "original_title": "Interstellar",
+        "description": "Фильм о космосе",
+        "year": 2014,
+        "duration": 169,
+        "country": "США",
+        "director": "Кристофер Нолан",
+        "genre": "sci_fi",
+        "poster": "films/posters/interstellar.jpg",
+        "is_published": False,
+        "emotions": {"Радость": 8},
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.joy = Emotion.objects.create(name="Радость", description="", color="#ff0")
+        cls.fear = Emotion.objects.create(name="Страх", description="", color="#000")
+
+    def import_rows(self, rows):
+        return FilmImporter().import_rows(rows)
+
+    def test_reimport_keeps_missing_columns(self):
+        self.import_rows([self.ROW])
+        stats = self.import_rows(
+            [
+                {
+                    "title": "Интерстеллар",
+                    "year": 2014,
+                    "duration": 170,
+                    "genre": "sci_fi",
+                    "emotions": {"Страх": 6},
+                }
+            ]
+        )
+        self.assertEqual((stats["created"], stats["updated"]), (0, 1))
+
+        film = Film.objects.get()
+        self.assertEqual(film.duration, 170)
+        self.assertEqual(film.poster.name, "films/posters/interstellar.jpg")
+        self.assertEqual(film.description, "Фильм о космосе")
+        self.assertEqual(film.director, "Кристофер Нолан")
+        self.assertFalse(film.is_published)
+        self.assertEqual(film.emotion_profile, {"Радость": 8, "Страх": 6})
+
+    def test_reimport_updates_present_columns(self):
+        self.import_rows([self.ROW])
+        csv_file = StringIO(
+            "title,year,duration,genre,poster,is_published,emotions\n"
+            "Интерстеллар,2014,169,sci_fi,,1,Радость:3\n"
+        )
+        self.import_rows(read_csv(csv_file))
+
+        film = Film.objects.get()
+        self.assertFalse(film.poster)
+        self.assertTrue(film.is_published)
+        self.assertEqual(film.original_title, "Interstellar")
+        self.assertEqual(film.emotion_profile, {"Радость": 3})
+
+    def test_same_title_different_years(self):
+        remake = {**self.ROW, "year": 2030, "emotions": {"Страх": 4}}
+        stats = self.import_rows([self.ROW, remake])
+        self.assertEqual(stats["created"], 2)
+        stats = self.import_rows([{**remake, "duration": 120}])
+        self.assertEqual((stats["created"], stats["updated"]), (0, 1))
+
+        films = dict(Film.objects.values_list("year", "duration"))
+        self.assertEqual(films, {2014: 169, 2030: 120})
+
+    def test_rejects_intensity_out_of_range(self):
+        self.import_rows([self.ROW])
+        stats = self.import_rows(
+            [
+                {**self.ROW, "emotions": {"Радость": 11}},
+                {**self.ROW, "title": "Новый фильм", "emotions": [["Страх", 0]]},
+            ]
+        )
+        self.assertEqual(stats["skipped"], 2)
+        self.assertEqual(Film.objects.count(), 1)
+        self.assertEqual(Film.objects.get().emotion_profile, {"Радость": 8})
+
+
+class SnapshotTests(DatasetTestCase):
+    dataset = {"films": 5, "emotions": 3, "ratings": 10, "users": 2, "seed": 1}
+
+    def export(self, include_users=False):
+        file = StringIO()
+        export_snapshot(file, include_users=include_users)
+        file.seek(0)
+        return file
+
+    def test_catalogue_only_by_default(self):
+        user = User.objects.filter(email__gt="").first()
+        Film.objects.update(created_by=user.profile)
+        snapshot = self.export().getvalue()
+        self.assertNotIn(user.email, snapshot)
+        self.assertNotIn('"auth.User"', snapshot)
+
+        Notification.objects.all().delete()
+        Subscription.objects.all().delete()
+        UserProfile.favorite_films.through.objects.all().delete()
+        restore_snapshot(StringIO(snapshot), clear=True)
+        self.assertEqual(Film.objects.count(), 5)
+        self.assertFalse(Film.objects.filter(created_by__isnull=False).exists())
+        # Пользователи не входят в снимок и не удаляются
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
+
+    def test_export_drops_password_hashes(self):
+        user = User.objects.first()
+        user.set_password("secret-password")
+        user.save()
+        self.assertNotIn(user.password, self.export(include_users=True).getvalue())
+
+        Notification.objects.all().delete()
+        restore_snapshot(self.export(include_users=True), clear=True)
+        user.refresh_from_db()
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(Film.objects.count(), 5)
+
+    def test_clear_refuses_to_drop_foreign_data(self):
+        notifications = Notification.objects.count()
+        self.assertGreater(notifications, 0)
+        with self.assertRaisesMessage(ValueError, "notifications.Notification.user"):
+            restore_snapshot(self.export(include_users=True), clear=True)
+        self.assertEqual(Notification.objects.count(), notifications)
+        self.assertEqual(Film.objects.count(), 5)
+
+
+class BenchmarkMeasureTests(TestCase):
+    def test_latency_measured_without_tracing(self):
+        tracing = []
+
+        def func():
+            tracing.append(tracemalloc.is_tracing())
+            Film.objects.exists()
+
+        result = measure(func, iterations=4, warmup=1, profile_iterations=2)
+        # Прогрев и замер задержки - без трассировки, затем проход с ней
+        self.assertEqual(tracing, [False] * 5 + [True] * 2)
+        self.assertEqual(result["queries"], {"mean": 1, "max": 1})
+        self.assertGreater(result["peak_memory_kb"], 0)
+
+
+class ApiLoadTestTests(SimpleTestCase):
+    def load(self, status):
+        """Прогон api_load_test против сервера, отвечающего статусом status"""
+
+        async def respond(reader, writer):
+            while await reader.readline():
+                while await reader.readline() not in (b"\r\n", b""):
+                    pass
+                writer.write(
+                    f"HTTP/1.1 {status} X\r\nContent-Length: 2\r\n\r\n{{}}".encode()
+                )
+                await writer.drain()
+            writer.close()
+
+        async def run():
+            server = await asyncio.start_server(respond, "127.0.0.1", 0)
+            url = urlsplit(f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+            async with server:
+                return await ApiLoadTestCommand().run(url, "/api/films/", 4, 20)
+
+        return asyncio.run(run())
+
+    def test_counts_statuses(self):
+        result = self.load(200)
+        self.assertEqual(result["statuses"], {"200": 20})
+        self.assertEqual(result["errors"], 0)
+
+    def test_throttled_run_fails(self):
+        with self.assertRaisesMessage(CommandError, "API_THROTTLE_ENABLED=false"):
+            self.load(429)
+
+
+class QueryRecorderTests(DatasetTestCase):
+    def test_detects_repeated_templates(self):
+        recorder = QueryRecorder()
+        with recorder.record():
+            for film in Film.objects.all():
+                list(film.emotion_ratings.all())
+        self.assertEqual(recorder.count, 6)
+        self.assertEqual(recorder.repeated_templates()[0][1], 5)
+
+    def test_collapses_in_lists(self):
+        recorder = QueryRecorder()
+        with recorder.record():
+            list(Film.objects.filter(id__in=[1, 2]))
+            list(Film.objects.filter(id__in=[1, 2, 3]))
+            list(Film.objects.filter(id__in=[4, 5, 6, 7]))
+        self.assertEqual(len(recorder.repeated_templates()), 1)
+
+
+class FilmQueryBudgetTests(QueryBudgetTestMixin, DatasetTestCase):
+    dataset = {
+        "films": 40,
+        "emotions": 6,
+        "ratings": 160,
+        "users": 5,
+        "subscriptions": 10,
+        "notifications": 50,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.film = Film.objects.filter(is_published=True).first()
+        cls.emotion_ids = list(Emotion.objects.values_list("id", flat=True)[:2])
+        cls.user = User.objects.first()
+        cls.user.profile.favorite_films.add(cls.film)
+
+    def test_film_list(self):
+        self.assertViewWithinBudget(reverse("films:list"))
+
+    def test_film_list_by_emotions(self):
+        query = "&".join(f"emotions={pk}" for pk in self.emotion_ids)
+        self.assertViewWithinBudget(reverse("films:list") + "?" + query)
+
+    def test_film_detail(self):
+        self.assertViewWithinBudget(reverse("films:detail", args=[self.film.pk]))
+
+    def test_film_detail_authenticated(self):
+        self.client.force_login(self.user)
+        response = self.assertViewWithinBudget(
+            reverse("films:detail", args=[self.film.pk])
+        )
+        self.assertTrue(response.context["is_favorite"])
+
+    def test_api_film_list(self):
+        self.assertViewWithinBudget(reverse("film-list"))
+
+    def test_api_film_detail(self):
+        self.assertViewWithinBudget(reverse("film-detail", args=[self.film.pk]))
+
+    def test_api_by_emotion(self):
+        ids = ",".join(map(str, self.emotion_ids))
+        self.assertViewWithinBudget(
+            reverse("film-by-emotion") + f"?emotion_ids={ids}&ordering=match"
+        )
+
+    def test_api_batch(self):
+        ids = ",".join(map(str, Film.objects.values_list("id", flat=True)[:10]))
+        self.assertViewWithinBudget(reverse("film-batch") + f"?ids={ids}")
+
+    def test_api_emotion_matrix(self):
+        self.assertViewWithinBudget(reverse("film-emotion-matrix"))
+
+    def test_api_emotion_list(self):
+        self.assertViewWithinBudget(reverse("emotion-list"))
+
+
+class AsyncApiTests(QueryBudgetTestMixin, DatasetTestCase):
+    dataset = {
+        "films": 40,
+        "emotions": 6,
+        "ratings": 160,
+        "users": 2,
+        "subscriptions": 4,
+        "notifications": 0,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.film = Film.objects.filter(is_published=True).first()
+        cls.hidden_film = Film.objects.create(
+            title="Черновик", year=2020, duration=90, is_published=False
+        )
+        cls.emotion_ids = ",".join(
+            map(str, Emotion.objects.values_list("id", flat=True)[:2])
+        )
+
+    def get_async(self, url):
+        return async_to_sync(self.async_client.get)(url)
+
+    def test_matches_sync_api(self):
+        cases = [
+            ("film-list", [], "?page=2&ordering=year"),
+            ("film-detail", [self.film.pk], ""),
+            ("film-emotion-profile", [self.film.pk], ""),
+            ("film-by-emotion", [], f"?emotion_ids={self.emotion_ids}&ordering=match"),
+            ("emotion-list", [], ""),
+        ]
+        for name, args, query in cases:
+            with self.subTest(name=name):
+                expected = self.client.get(reverse(name, args=args) + query)
+                url = reverse(f"async-{name}", args=args)
+                with self.assertMaxQueries(get_query_budget(resolve(url).func)):
+                    response = self.get_async(url + query)
+                self.assertEqual(response.status_code, 200)
+                # Ссылки на страницы ведут на асинхронные URL
+                content = response.content.decode().replace("/api/async/", "/api/")
+                self.assertEqual(json.loads(content), expected.json())
+
+    def test_not_found(self):
+        for url in [
+            reverse("async-film-detail", args=[self.hidden_film.pk]),
+            reverse("async-film-emotion-profile", args=[self.hidden_film.pk]),
+            reverse("async-film-list") + "?page=100",
+        ]:
+            with self.subTest(url=url):
+                response = self.get_async(url)
+                self.assertEqual(response.status_code, 404)
+                self.assertIn("detail", response.json())
+
+    def test_permissions_checked(self):
+        with mock.patch.object(FilmViewSet, "permission_classes", [IsAuthenticated]):
+            expected = self.client.get(reverse("film-list"))
+            response = self.get_async(reverse("async-film-list"))
+        self.assertEqual(expected.status_code, 401)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response["WWW-Authenticate"], expected["WWW-Authenticate"])
+        self.assertEqual(response.json(), expected.json())
+
+
+class MetricsTests(DatasetTestCase):
+    @override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"])
+    def test_request_metrics_exported(self):
+        self.client.get(reverse("films:list"))
+        self.client.get(reverse("films:list"))
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn(
+            'http_request_duration_seconds_count{method="GET",status="2xx",'
+            'view="films:list"}',
+            body,
+        )
+        self.assertIn('db_queries_total{view="films:list"}', body)
+        self.assertIn('cache_requests_total{cache="facets",result="hit"}', body)
+
+    def test_forbidden_for_unknown_hosts(self):
+        response = self.client.get(reverse("metrics"), REMOTE_ADDR="10.0.0.5")
+        self.assertEqual(response.status_code, 403)
+        # Адрес локального прокси по умолчанию не доверенный
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+
+    @override_settings(METRICS_TOKEN="scrape-token")
+    def test_token_access(self):
+        url = reverse("metrics")
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer scrape-token")
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url, HTTP_AUTHORIZATION="Bearer wrong")
+        self.assertEqual(response.status_code, 403)
+
+    def test_aggregates_worker_files(self):
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            with override_settings(METRICS_DIR=metrics_dir):
+                metrics.inc("test_worker_total", 2, kind="a")
+                # Файл другого воркера
+                Path(metrics_dir, "1.json").write_text(
+                    json.dumps(
+                        {
+                            "counters": [["test_worker_total", [["kind", "a"]], 3]],
+                            "histograms": [],
+                        }
+                    )
+                )
+                counters, _, _ = metrics.collect()
+        self.assertGreaterEqual(counters[("test_worker_total", (("kind", "a"),))], 5)
+
+    def test_dead_worker_counters_survive(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            dead_file = Path(metrics_dir, f"{process.pid}.json")
+            dead_file.write_text(
+                json.dumps(
+                    {
+                        "counters": [["test_dead_total", [], 3]],
+                        "gauges": [["test_dead_gauge", [], 1]],
+                        "histograms": [
+                            [
+                                "test_dead_seconds",
+                                [],
+                                {
+                                    "buckets": [1] + [0] * (len(DEFAULT_BUCKETS) - 1),
+                                    "sum": 0.001,
+                                    "count": 1,
+                                },
+                            ]
+                        ],
+                    }
+                )
+            )
+            with override_settings(METRICS_DIR=metrics_dir):
+                first = metrics.collect()
+                # Повторный сбор не должен ни терять, ни удваивать перенесенное
+                counters, gauges, histograms = metrics.collect()
+            self.assertFalse(dead_file.exists())
+            self.assertTrue(Path(metrics_dir, metrics.DEAD_PROCESSES_FILE).exists())
+        self.assertEqual(first[0][("test_dead_total", ())], 3)
+        self.assertEqual(counters[("test_dead_total", ())], 3)
+        self.assertEqual(histograms[("test_dead_seconds", ())]["count"], 1)
+        self.assertNotIn(("test_dead_gauge", ()), gauges)
+
+    def test_gauges_sum_live_workers_only(self):
+        process = subprocess.Popen([sys.executable, "-c", "pass"])
+        process.wait()
+        key = ("db_pool_size", (("database", "test_gauges"),))
+        snapshot = {
+            "counters": [],
+            "gauges": [["db_pool_size", [["database", "test_gauges"]], 4]],
+            "histograms": [],
+        }
+        with tempfile.TemporaryDirectory() as metrics_dir:
+            # Живой процесс (родитель тестов) и завершившийся воркер
+            for pid in (os.getppid(), process.pid):
+                Path(metrics_dir, f"{pid}.json").write_text(json.dumps(snapshot))
+            with override_settings(METRICS_DIR=metrics_dir):
+                metrics.set_gauge("db_pool_size", 2, database="test_gauges")
+                _, gauges, _ = metrics.collect()
+        self.assertEqual(gauges[key], 6)
+
+    def test_pool_metrics_exported(self):
+        pool = mock.Mock()
+        pool.pop_stats.return_value = {
+            "pool_size": 4,
+            "pool_available": 1,
+            "pool_max": 10,
+            "requests_num": 7,
+            "requests_wait_ms": 250,
+        }
+        with mock.patch.object(db_pool, "connections", {"pooled": mock.Mock(pool=pool)}):
+            db_pool.record_pool_metrics(["pooled"])
+        body = metrics.render_prometheus()
+        self.assertIn("# TYPE db_pool_size gauge", body)
+        self.assertIn('db_pool_size{database="pooled"} 4', body)
+        self.assertIn('db_pool_available{database="pooled"} 1', body)
+        self.assertIn('db_pool_wait_seconds_total{database="pooled"}', body)
+        self.assertNotIn("db_pool_timeouts_total", body)
+
+
+class SlowQueryLogTests(DatasetTestCase):
+    def test_logs_queries_with_view_and_plan(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = Path(log_dir, "slow.jsonl")
+            with override_settings(
+                SLOW_QUERY_THRESHOLD_MS=0,
+                SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1.0,
+                SLOW_QUERY_LOG_FILE=log_file,
+            ), self.assertLogs("movie_emotion.instrumentation", "WARNING"):
+                self.client.get(reverse("film-list"))
+            entries = list(read_slow_query_log(log_file))
+
+            self.assertTrue(entries)
+            self.assertEqual({entry["view"] for entry in entries}, {"film-list"})
+            self.assertTrue(all(entry.get("plan") for entry in entries))
+            self.assertTrue(any("films_film" in entry["plan"] for entry in entries))
+
+            out = StringIO()
+            call_command("slow_queries", file=log_file, limit=1, stdout=out)
+            self.assertIn("view: film-list", out.getvalue())
+
+    def test_explain_with_parameters(self):
+        slow_log = SlowQueryLog()
+        queryset = Film.objects.filter(year__gte=2000, title__contains="%фильм")
+        sql, params = queryset.query.sql_with_params()
+        plan = slow_log.explain(connection, sql, params)
+        self.assertTrue(plan)
+        self.assertIn("films_film", plan)
+        if connection.vendor == "sqlite":
+            self.assertRegex(plan, r"^(SCAN|SEARCH) ")
+
+    def test_failed_queries_are_not_logged(self):
+        with tempfile.TemporaryDirectory() as log_dir:
+            log_file = Path(log_dir, "slow.jsonl")
+            with override_settings(
+                SLOW_QUERY_THRESHOLD_MS=0,
+                SLOW_QUERY_EXPLAIN_SAMPLE_RATE=1.0,
+                SLOW_QUERY_LOG_FILE=log_file,
+            ):
+                slow_log = SlowQueryLog()
+                with slow_log.record(), self.assertLogs(
+                    "movie_emotion.instrumentation", "WARNING"
+                ):
+                    with self.assertRaises(DatabaseError), transaction.atomic():
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT * FROM missing_table")
+                logged = [entry["sql"] for entry in read_slow_query_log(log_file)]
+                self.assertFalse([sql for sql in logged if "missing_table" in sql])
+
+                with transaction.atomic():
+                    transaction.set_rollback(True)
+                    self.assertIsNone(slow_log.explain(connection, "SELECT 1", ()))
+
+
+class ProfilingTests(DatasetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+
+    def test_not_profiled_for_regular_users(self):
+        response = self.client.get(reverse("films:list"), HTTP_X_PROFILE="1")
+        self.assertNotIn("X-Profile-Id", response)
+
+    def test_staff_profile_is_retrievable(self):
+        self.client.force_login(self.staff)
+        with tempfile.TemporaryDirectory() as profiles_dir:
+            with override_settings(PROFILING_DIR=profiles_dir):
+                response = self.client.get(reverse("films:list") + "?_profile=1")
+                profile_id = response["X-Profile-Id"]
+
+                stats = self.client.get(
+                    reverse("profile_detail", args=[profile_id, "stats"])
+                )
+                self.assertContains(stats, "cumulative")
+                allocations = self.client.get(
+                    reverse("profile_detail", args=[profile_id, "allocations"])
+                )
+                self.assertEqual(allocations.status_code, 200)
+                missing = self.client.get(
+                    reverse("profile_detail", args=[profile_id, "unknown"])
+                )
+                self.assertEqual(missing.status_code, 404)
+
+
+class FilmQueryPlanTests(QueryPlanTestMixin, DatasetTestCase):
+    dataset = {"films": 200, "emotions": 6, "ratings": 800, "users": 2, "seed": 1}
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.emotion_id = Emotion.objects.values_list("id", flat=True).first()
+
+    def test_published_feed(self):
+        self.assertNoFullScan(
+            Film.objects.filter(is_published=True).order_by("-created_at")[:12],
+            "films_film",
+        )
+
+    def test_emotion_filter(self):
+        emotion_filter = EmotionFilter([EmotionCriterion(self.emotion_id, 6, 10)])
+        self.assertNoFullScan(
+            emotion_filter.apply(Film.objects.filter(is_published=True)),
+            "films_filmemotionrating",
+        )
+
+
+class FilmAdminRatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", password="x")
+        cls.emotions = [
+            Emotion.objects.create(name=f"Эмоция {i}", slug=f"emotion-{i}")
+            for i in range(3)
+        ]
+        cls.film = Film.objects.create(
+            title="Фильм",
+            description="Описание",
+            year=2020,
+            duration=100,
+            country="Россия",
+            director="Режиссер",
+            genre="drama",
+            is_published=True,
+        )
+        cls.profile = UserProfile.objects.create(user=cls.admin)
+        Subscription.objects.create(
+            user=cls.profile, emotion=cls.emotions[0], min_intensity=5
+        )
+        # Рассылка при создании опубликованного фильма в тестах не нужна
+        Task.objects.all().delete()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def _change_form_data(self, intensities):
+        data = {
+            "title": self.film.title,
+            "original_title": "",
+            "description": self.film.description,
+            "trailer_url": "",
+            "year": self.film.year,
+            "duration": self.film.duration,
+            "country": self.film.country,
+            "director": self.film.director,
+            "genre": self.film.genre,
+            "is_published": "on",
+            "created_by": self.profile.pk,
+            "emotion_ratings-TOTAL_FORMS": len(intensities),
+            "emotion_ratings-INITIAL_FORMS": 0,
+            "emotion_ratings-MIN_NUM_FORMS": 0,
+            "emotion_ratings-MAX_NUM_FORMS": 1000,
+        }
+        for i, (emotion, intensity) in enumerate(zip(self.emotions, intensities)):
+            data[f"emotion_ratings-{i}-emotion"] = emotion.pk
+            data[f"emotion_ratings-{i}-intensity"] = intensity
+            data[f"emotion_ratings-{i}-description"] = ""
+            data[f"emotion_ratings-{i}-rated_by"] = self.profile.pk
+        return data
+
+    def test_inline_save_recomputes_once(self):
+        url = reverse("admin:films_film_change", args=[self.film.pk])
+        with mock.patch.object(Film, "update_rating") as update_rating:
+            response = self.client.post(url, self._change_form_data([9, 4, 2]))
+
+        self.assertEqual(response.status_code, 302)
+        update_rating.assert_not_called()
+        # Одна рассылка на фильм и никаких отдельных пересчетов на каждую оценку
+        self.assertEqual(
+            list(Task.objects.values_list("name", "args")),
+            [("notifications.tasks.notify_subscribers", [self.film.pk])],
+        )
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.rating, 5.0)
+
+    def test_set_intensity_action(self):
+        for emotion in self.emotions:
+            FilmEmotionRating.objects.create(
+                film=self.film, emotion=emotion, intensity=2
+            )
+        self.client.post(
+            reverse("admin:films_filmemotionrating_changelist"),
+            {
+                "action": "set_intensity",
+                "intensity": 8,
+                "_selected_action": list(
+                    FilmEmotionRating.objects.values_list("pk", flat=True)
+                ),
+            },
+        )
+        Worker().run_pending()
+        self.film.refresh_from_db()
+        self.assertEqual(self.film.rating, 8.0)
+        self.assertTrue(self.profile.notifications.filter(film=self.film).exists())
+
+
+@override_settings(REPLICA_DATABASES=["replica"], REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def handle(self, request, view=None):
+        """Запрос через PrimaryPinMiddleware; возвращает ответ и БД чтения в view"""
+        databases = []
+
+        def get_response(request):
+            if view is not None:
+                view(request)
+            databases.append(Film.objects.all().db)
+            return HttpResponse()
+
+        response = PrimaryPinMiddleware(get_response)(request)
+        return response, databases[0]
+
+    def test_routes_catalogue_reads_to_replica(self):
+        self.assertEqual(Film.objects.all().db, "replica")
+        self.assertEqual(Emotion.objects.all().db, "replica")
+        self.assertEqual(User.objects.all().db, "default")
+        with use_primary():
+            self.assertEqual(Film.objects.all().db, "default")
+        self.assertEqual(Film.objects.all().db, "replica")
+
+    def test_unsafe_requests_read_and_stick_to_primary(self):
+        response, database = self.handle(self.factory.get("/films/"))
+        self.assertEqual(database, "replica")
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+        response, database = self.handle(self.factory.post("/films/"))
+        self.assertEqual(database, "default")
+        self.assertEqual(response.cookies[PIN_COOKIE]["max-age"], 5)
+        self.assertEqual(Film.objects.all().db, "replica")
+
+    def test_sticky_cookie_pins_following_reads(self):
+        request = self.factory.get("/films/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        response, database = self.handle(request)
+        self.assertEqual(database, "default")
+
+    def test_get_view_can_stick_to_primary(self):
+        response, database = self.handle(
+            self.factory.get("/users/favorite/1/"), view=stick_to_primary
+        )
+        self.assertEqual(database, "default")
+        self.assertIn(PIN_COOKIE, response.cookies)
+        self.assertEqual(Film.objects.all().db, "replica")
+
+    @override_settings(REPLICA_DATABASES=[])
+    def test_disabled_without_replicas(self):
+        self.assertEqual(Film.objects.all().db, "default")
+
+
+@override_settings(
+    REST_FRAMEWORK={
+        **settings.REST_FRAMEWORK,
+        "DEFAULT_THROTTLE_RATES": {"api_anon": "3/min", "expensive_anon": "1/min"},
+    }
+)
+class ApiThrottleTests(DatasetTestCase):
+    def test_token_bucket_per_scope(self):
+        for _ in range(3):
+            self.assertEqual(self.client.get(reverse("emotion-list")).status_code, 200)
+        response = self.client.get(reverse("film-list"))
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "20")
+
+        # У дорогих действий свое ведро
+        by_emotion = reverse("film-by-emotion") + "?emotion_ids=1"
+        self.assertEqual(self.client.get(by_emotion).status_code, 200)
+        self.assertEqual(self.client.get(by_emotion).status_code, 429)
+        search = reverse("film-list") + "?search=фильм"
+        self.assertEqual(self.client.get(search).status_code, 429)
+
+    def test_async_endpoints_throttled(self):
+        for _ in range(3):
+            self.client.get(reverse("emotion-list"))
+        response = async_to_sync(self.async_client.get)(reverse("async-film-list"))
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+
+    def test_bucket_refills(self):
+        buckets = CacheBuckets(cache)
+        with mock.patch("movie_emotion.throttling.time.time", return_value=1000.0):
+            self.assertEqual(buckets.take("bucket", 2, 1.0), (True, 0.0))
+            self.assertEqual(buckets.take("bucket", 2, 1.0), (True, 0.0))
+            self.assertEqual(buckets.take("bucket", 2, 1.0), (False, 1.0))
+        with mock.patch("movie_emotion.throttling.time.time", return_value=1001.5):
+            self.assertEqual(buckets.take("bucket", 2, 1.0), (True, 0.0))
+
+
+def poster_upload(width, height, color="red", name="poster.jpg"):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "JPEG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/jpeg")
+
+
+class PosterPipelineTests(DatasetTestCase):
+    dataset = {"films": 2, "emotions": 2, "ratings": 2, "users": 1, "seed": 1}
+
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.film = Film.objects.filter(is_published=True).first()
+
+    def upload(self, *args, **kwargs):
+        self.film.poster = poster_upload(*args, **kwargs)
+        self.film.save()
+        return build_poster_variants(self.film.pk)
+
+    def test_upload_enqueues_generation(self):
+        self.film.poster = poster_upload(800, 1200)
+        self.film.save()
+        task_name = "films.tasks.generate_poster_variants"
+        self.assertEqual(Task.objects.filter(name=task_name).count(), 1)
+
+        build_poster_variants(self.film.pk)
+        self.film.refresh_from_db()
+        self.film.title = "Новое название"
+        self.film.save()
+        # Постер не менялся - повторная генерация не нужна
+        self.assertEqual(Task.objects.filter(name=task_name).count(), 1)
+
+    def test_variants_are_content_hashed(self):
+        variants = self.upload(800, 1200)
+        self.assertEqual(list(variants["webp"]), ["200", "300", "400", "600"])
+        for ext in ("jpeg", "webp"):
+            for name in variants[ext].values():
+                self.assertIn(variants["hash"], name)
+                self.assertTrue(default_storage.exists(name))
+        self.assertTrue(variants["placeholder"].startswith("data:image/jpeg;base64,"))
+        self.assertLess(len(variants["placeholder"]), 1000)
+
+        # Тот же постер не перестраивается
+        self.assertEqual(build_poster_variants(self.film.pk), variants)
+
+        replaced = self.upload(800, 1200, color="blue")
+        self.assertNotEqual(replaced["hash"], variants["hash"])
+        for name in variants["jpeg"].values():
+            self.assertFalse(default_storage.exists(name))
+
+    def test_narrow_poster_not_upscaled(self):
+        variants = self.upload(150, 220)
+        self.assertEqual(list(variants["jpeg"]), ["150"])
+
+    def test_templates_and_api_emit_srcset(self):
+        self.upload(800, 1200)
+        self.film.refresh_from_db()
+        sources = poster_sources(self.film)
+        self.assertIn("-600.webp 600w", sources["webp"])
+
+        response = self.client.get(reverse("films:detail", args=[self.film.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, sources["jpeg"])
+
+        response = self.client.get(reverse("film-detail", args=[self.film.pk]))
+        self.assertIn("600w", response.json()["poster_srcset"]["webp"])
+        response = self.client.get(reverse("film-list") + "?fields=id,poster_srcset")
+        films = {film["id"]: film for film in response.json()["results"]}
+        self.assertEqual(set(films[self.film.pk]), {"id", "poster_srcset"})
+        self.assertIn("600w", films[self.film.pk]["poster_srcset"]["jpeg"])
+
+    def test_backfill_command(self):
+        self.film.poster.save("poster.jpg", poster_upload(400, 600))
+        self.assertEqual(Film.objects.get(pk=self.film.pk).poster_variants, {})
+
+        out = StringIO()
+        call_command("generate_posters", workers=1, stdout=out)
+        self.assertIn("Постеров обработано: 1 из 1", out.getvalue())
+        variants = Film.objects.get(pk=self.film.pk).poster_variants
+        self.assertEqual(variants["source"], self.film.poster.name)
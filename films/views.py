@@ -1,12 +1,15 @@
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q, Count, Avg
+from django.db.models import Q, Count, Avg, F
 from django.core.paginator import Paginator
 from django.views.generic import ListView, DetailView
 from django.db.models import Prefetch
 
 from .models import Film, FilmEmotionRating
 from emotions.models import Emotion
+from users.models import UserProfile
 from .forms import FilmSearchForm
+from .facets import get_facets
+from .queries import EmotionFilter
 
 
 class FilmListView(ListView):
@@ -14,6 +17,7 @@ class FilmListView(ListView):
     template_name = "films/list.html"
     context_object_name = "films"
     paginate_by = 12
+    query_budget = 10
 
     def get_queryset(self):
         queryset = Film.objects.filter(is_published=True).select_related("created_by__user")
@@ -34,21 +38,42 @@ class FilmListView(ListView):
         year = self.request.GET.get("year")
         if year:
             queryset = queryset.filter(year=year)
+
+        # Фильтр по стране
+        country = self.request.GET.get("country")
+        if country:
+            queryset = queryset.filter(country=country)
         
         # Поиск по эмоциям
-        emotion_ids = self.request.GET.getlist("emotions")
-        if emotion_ids:
-            queryset = queryset.filter(
-                emotion_ratings__emotion_id__in=emotion_ids
-            ).distinct()
+        emotion_filter = EmotionFilter.from_params(
+            self.request.GET, ids_param="emotions"
+        )
+        if emotion_filter:
+            queryset = emotion_filter.apply(queryset)
         
         return queryset.order_by("-created_at")
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["emotions"] = Emotion.objects.filter(is_active=True)
-        context["search_form"] = FilmSearchForm(self.request.GET)
+        facets = get_facets(self.object_list, self.request.GET, prefix="films:list")
+
+        # Количество фильмов для каждой эмоции и жанра в текущей выборке
+        emotion_counts = {row["value"]: row["count"] for row in facets["emotion"]}
+        emotions = list(Emotion.objects.filter(is_active=True))
+        for emotion in emotions:
+            emotion.facet_count = emotion_counts.get(emotion.id, 0)
+
+        search_form = FilmSearchForm(self.request.GET)
+        genre_counts = {row["value"]: row["count"] for row in facets["genre"]}
+        search_form.fields["genre"].choices = [("", "Все жанры")] + [
+            (value, f"{label} ({genre_counts.get(value, 0)})")
+            for value, label in Film.GENRE_CHOICES
+        ]
+
+        context["emotions"] = emotions
+        context["search_form"] = search_form
         context["genres"] = Film.GENRE_CHOICES
+        context["facets"] = facets
         return context
 
 
@@ -56,20 +81,22 @@ class FilmDetailView(DetailView):
     model = Film
     template_name = "films/detail.html"
     context_object_name = "film"
+    query_budget = 8
 
     def get_queryset(self):
         return Film.objects.filter(is_published=True).prefetch_related(
-            "emotion_ratings__emotion"
+            Prefetch(
+                "emotion_ratings",
+                queryset=FilmEmotionRating.objects.select_related("emotion"),
+            )
         )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         film = self.object
         
-        # Получаем эмоциональный профиль
-        emotion_ratings = FilmEmotionRating.objects.filter(
-            film=film
-        ).select_related("emotion")
+        # Получаем эмоциональный профиль (оценки уже предзагружены)
+        emotion_ratings = film.emotion_ratings.all()
         
         context["emotion_ratings"] = emotion_ratings
         context["emotion_profile"] = {
@@ -80,9 +107,15 @@ class FilmDetailView(DetailView):
         context["similar_films"] = Film.objects.filter(
             genre=film.genre, is_published=True
         ).exclude(id=film.id)[:6]
+
+        # Один запрос вместо загрузки профиля и всего списка избранного в шаблоне
+        if self.request.user.is_authenticated:
+            context["is_favorite"] = UserProfile.objects.filter(
+                user=self.request.user, favorite_films=film
+            ).exists()
         
-        # Увеличиваем счетчик просмотров
+        # Увеличиваем счетчик просмотров одним UPDATE, без сигналов сохранения
         film.views_count += 1
-        film.save(update_fields=["views_count"])
+        Film.objects.filter(pk=film.pk).update(views_count=F("views_count") + 1)
         
         return context
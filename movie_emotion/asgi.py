@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'movie_emotion.settings')
 
 application = get_asgi_application()
+
+# Долгие подключения к потоку уведомлений обслуживаются в цикле событий,
+# минуя обработчик запросов Django
+from notifications.stream import NotificationStreamApp  # noqa: E402
+
+application = NotificationStreamApp(application)
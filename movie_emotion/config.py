@@ -32,6 +32,19 @@ class PostgresSettings(BaseSettingsConfig):
     POSTGRES_USER: SecretStr
     POSTGRES_PASS: SecretStr
     POSTGRES_PORT: int
+    # Постоянные соединения: сколько секунд держать соединение между запросами
+    POSTGRES_CONN_MAX_AGE: int = 60
+    POSTGRES_CONN_HEALTH_CHECKS: bool = True
+    # Пул psycopg (нужен psycopg[pool]); постоянные соединения при нем отключены
+    POSTGRES_POOL: bool = False
+    POSTGRES_POOL_MIN_SIZE: int = 2
+    POSTGRES_POOL_MAX_SIZE: int = 10
+    # Сколько секунд ждать свободного соединения из пула
+    POSTGRES_POOL_TIMEOUT: float = 10
+    # Реплики только для чтения: "host" или "host:port"
+    POSTGRES_REPLICA_HOSTS: list[str] = []
+    # Сколько секунд после записи пользователь читает с основной БД
+    POSTGRES_REPLICA_STICKY_SECONDS: int = 5
 
 
 class EmailSettings(BaseSettingsConfig):
@@ -45,12 +58,34 @@ class EmailSettings(BaseSettingsConfig):
     EMAIL_HOST_PASSWORD: SecretStr
 
 
+class MonitoringSettings(BaseSettingsConfig):
+    """Настройки сбора метрик"""
+
+    # Общий каталог для метрик всех воркеров gunicorn (None - только свой процесс)
+    METRICS_DIR: str | None = None
+    # За обратным прокси на той же машине REMOTE_ADDR всех клиентов - 127.0.0.1,
+    # поэтому по умолчанию адреса не доверяются: нужен токен или вход персонала
+    METRICS_ALLOWED_IPS: list[str] = []
+    # Токен для Prometheus: заголовок "Authorization: Bearer <токен>"
+    METRICS_TOKEN: SecretStr | None = None
+
+
+class ApiSettings(BaseSettingsConfig):
+    """Настройки API"""
+
+    # Ограничение частоты запросов (REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"]);
+    # выключается только для нагрузочных тестов: они идут с одного адреса
+    API_THROTTLE_ENABLED: bool = True
+
+
 class Settings(BaseSettings):
     """Общий класс настроек"""
 
     admin: AdminSettings = AdminSettings()
     postgres: PostgresSettings = PostgresSettings()
     email: EmailSettings = EmailSettings()
+    monitoring: MonitoringSettings = MonitoringSettings()
+    api: ApiSettings = ApiSettings()
 
 
 env_settings = Settings()
@@ -0,0 +1,54 @@
+"""
+Метрики пулов соединений psycopg (POSTGRES_POOL=true).
+
+Статистика пула снимается после каждого запроса (MetricsMiddleware):
+размер пула, свободные соединения и очередь ожидающих - как gauge,
+число выдач соединения, суммарное ожидание и таймауты - как счетчики.
+"""
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+
+def pooled_aliases():
+    """Базы данных, для которых включен пул"""
+    return [
+        alias
+        for alias, database in settings.DATABASES.items()
+        if database.get("OPTIONS", {}).get("pool")
+    ]
+
+
+def record_pool_metrics(aliases=None):
+    for alias in pooled_aliases() if aliases is None else aliases:
+        pool = connections[alias].pool
+        if pool is None:
+            continue
+        # pop_stats обнуляет счетчики пула: в метрики попадает только прирост
+        stats = pool.pop_stats()
+        metrics.set_gauge("db_pool_size", stats.get("pool_size", 0), database=alias)
+        metrics.set_gauge(
+            "db_pool_available", stats.get("pool_available", 0), database=alias
+        )
+        metrics.set_gauge("db_pool_max_size", stats.get("pool_max", 0), database=alias)
+        metrics.set_gauge(
+            "db_pool_requests_waiting", stats.get("requests_waiting", 0), database=alias
+        )
+        if stats.get("requests_num"):
+            metrics.inc("db_pool_requests_total", stats["requests_num"], database=alias)
+        if stats.get("requests_wait_ms"):
+            metrics.inc(
+                "db_pool_wait_seconds_total",
+                stats["requests_wait_ms"] / 1000,
+                database=alias,
+            )
+        if stats.get("requests_errors"):
+            metrics.inc("db_pool_timeouts_total", stats["requests_errors"], database=alias)
+        if stats.get("connections_num"):
+            metrics.inc(
+                "db_pool_connections_opened_total",
+                stats["connections_num"],
+                database=alias,
+            )
@@ -0,0 +1,83 @@
+"""
+Чтение каталога и уведомлений с реплик PostgreSQL (REPLICA_DATABASES).
+
+Запись всегда идет в default. Чтобы пользователь сразу видел свои
+изменения, чтение закрепляется за основной БД:
+- на время запроса с небезопасным методом (POST, PUT, ...) или после
+  stick_to_primary() - и еще REPLICA_STICKY_SECONDS секунд через cookie
+  (см. middleware.PrimaryPinMiddleware);
+- внутри транзакции на default и в блоке use_primary() (фоновые задачи).
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+
+from django.conf import settings
+from django.db import connections
+
+# Приложения, чтение которых допускает отставание реплики
+REPLICA_APPS = {"films", "emotions", "notifications"}
+
+PIN_COOKIE = "primary_pin"
+
+_pinned = ContextVar("primary_pinned", default=False)
+
+
+def replica_databases():
+    return getattr(settings, "REPLICA_DATABASES", [])
+
+
+def is_pinned():
+    return _pinned.get()
+
+
+@contextmanager
+def use_primary(pinned=True):
+    """
+    Блок (или декоратор), в котором все чтение идет с основной БД.
+    С pinned=False только восстанавливает закрепление по выходу из блока
+    """
+    token = _pinned.set(pinned)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def stick_to_primary(request):
+    """
+    Запрос меняет данные (например, GET-ссылка в избранное): его чтение
+    и следующие REPLICA_STICKY_SECONDS секунд идут с основной БД
+    """
+    _pinned.set(True)
+    request.sticks_to_primary = True
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_databases()
+        if not replicas or model._meta.app_label not in REPLICA_APPS:
+            return None
+        # Связанные объекты читаем оттуда же, откуда загружен исходный
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        if _pinned.get() or connections["default"].in_atomic_block:
+            return "default"
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        databases = {"default", *replica_databases()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Схема реплик приходит с основной БД репликацией
+        if db in replica_databases():
+            return False
+        return None
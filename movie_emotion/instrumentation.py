@@ -0,0 +1,264 @@
+import json
+import logging
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import ExitStack, asynccontextmanager, contextmanager
+from pathlib import Path
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# Сколько повторов одного шаблона SQL считать признаком N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+# Точка сохранения, в которой снимается план медленного запроса
+EXPLAIN_SAVEPOINT = "slow_query_explain"
+
+re_placeholders = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+def normalize_sql(sql):
+    """Шаблон запроса: списки плейсхолдеров IN (%s, %s, ...) сворачиваются"""
+    return re_placeholders.sub("%s...", sql)
+
+
+def _enter_all_connections(wrapper):
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(wrapper))
+    return stack
+
+
+@asynccontextmanager
+async def in_sync_thread(context_manager):
+    """
+    Входит в context_manager в потоке, где async ORM выполняет запросы
+    текущего запроса (sync_to_async с thread_sensitive). Соединения с БД
+    у каждого потока свои, и execute_wrapper, установленный из цикла
+    событий, запросов представления не увидел бы.
+    """
+    value = await sync_to_async(context_manager.__enter__)()
+    try:
+        yield value
+    except BaseException:
+        if not await sync_to_async(context_manager.__exit__)(*sys.exc_info()):
+            raise
+    else:
+        await sync_to_async(context_manager.__exit__)(None, None, None)
+
+
+class QueryRecorder:
+    """
+    Счетчик SQL-запросов через connection.execute_wrapper:
+    количество, суммарное время и повторяющиеся шаблоны (вероятные N+1)
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, params, time.perf_counter() - started))
+
+    @contextmanager
+    def record(self):
+        with _enter_all_connections(self):
+            yield self
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        """Суммарное время запросов в секундах"""
+        return sum(duration for _, _, duration in self.queries)
+
+    def duplicates(self):
+        """Полностью одинаковые запросы (SQL и параметры) с числом повторов"""
+        counter = Counter((sql, repr(params)) for sql, params, _ in self.queries)
+        return [(sql, count) for (sql, _), count in counter.items() if count > 1]
+
+    def repeated_templates(self, threshold=None):
+        """Шаблоны, выполненные не меньше threshold раз с разными параметрами"""
+        if threshold is None:
+            threshold = getattr(
+                settings, "QUERY_N_PLUS_ONE_THRESHOLD", N_PLUS_ONE_THRESHOLD
+            )
+        counter = Counter(normalize_sql(sql) for sql, _, _ in self.queries)
+        return [
+            (sql, count) for sql, count in counter.most_common() if count >= threshold
+        ]
+
+    def report(self):
+        lines = [f"{self.count} запросов, {self.total_time * 1000:.1f} мс"]
+        for sql, count in self.repeated_templates():
+            lines.append(f"  вероятно N+1 ({count} раз): {sql[:300]}")
+        for sql, count in self.duplicates():
+            lines.append(f"  дубликат ({count} раз): {sql[:300]}")
+        return "\n".join(lines)
+
+
+def _format_plan(connection, rows):
+    if connection.vendor == "sqlite":
+        # Строки EXPLAIN QUERY PLAN: (id, parent, notused, detail) - отступ
+        # по вложенности, как в консоли sqlite3
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + str(detail))
+        return "\n".join(lines)
+    return "\n".join(" ".join(str(column) for column in row) for row in rows)
+
+
+class SlowQueryLog:
+    """
+    Пишет в SLOW_QUERY_LOG_FILE (JSON Lines) запросы дольше
+    SLOW_QUERY_THRESHOLD_MS: шаблон SQL без параметров, view и путь.
+    Для доли SLOW_QUERY_EXPLAIN_SAMPLE_RATE медленных SELECT добавляется
+    план выполнения (на PostgreSQL - EXPLAIN (ANALYZE, BUFFERS)).
+    """
+
+    def __init__(self, request=None):
+        self.request = request
+        self.threshold = getattr(settings, "SLOW_QUERY_THRESHOLD_MS", 200) / 1000
+        self.sample_rate = getattr(settings, "SLOW_QUERY_EXPLAIN_SAMPLE_RATE", 0.1)
+        self.path = Path(settings.SLOW_QUERY_LOG_FILE)
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        # Упавший запрос не журналируем: после ошибки транзакция PostgreSQL
+        # непригодна, и EXPLAIN заменил бы исходное исключение своим
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - started
+        if duration >= self.threshold:
+            self.log(sql, params, many, duration, context["connection"])
+        return result
+
+    @contextmanager
+    def record(self):
+        with _enter_all_connections(self):
+            yield self
+
+    @property
+    def view(self):
+        match = getattr(self.request, "resolver_match", None)
+        return match.view_name if match else None
+
+    def explain(self, connection, sql, params):
+        """
+        План запроса или None, если его не удалось получить. Префикс EXPLAIN
+        берется у бэкенда: EXPLAIN (ANALYZE, BUFFERS) на PostgreSQL,
+        EXPLAIN QUERY PLAN на SQLite
+        """
+        if connection.vendor == "postgresql":
+            prefix = connection.ops.explain_query_prefix(analyze=True, buffers=True)
+        else:
+            prefix = connection.ops.explain_query_prefix()
+
+        # Запрос выполняется на курсоре бэкенда (cursor.cursor) мимо
+        # execute_wrapper: план не должен попадать в журнал и счетчики
+        # запросов. Параметры в стиле %s этот курсор принимает на всех
+        # бэкендах Django (на SQLite их переводит SQLiteCursorWrapper). ANALYZE
+        # повторяет запрос - внутри транзакции делаем это в точке сохранения,
+        # чтобы ошибка не сломала транзакцию запроса
+        if connection.needs_rollback:
+            # Транзакция уже помечена к откату - любой запрос в ней упадет
+            return None
+        savepoint = connection.in_atomic_block
+        savepoint_created = False
+        with connection.cursor() as cursor:
+            raw_cursor = cursor.cursor
+            try:
+                if savepoint:
+                    raw_cursor.execute(
+                        connection.ops.savepoint_create_sql(EXPLAIN_SAVEPOINT)
+                    )
+                    savepoint_created = True
+                raw_cursor.execute(f"{prefix} {sql}", params)
+                return _format_plan(connection, raw_cursor.fetchall())
+            except connection.Database.Error:
+                logger.debug("Не удалось получить план запроса", exc_info=True)
+                return None
+            finally:
+                if savepoint_created:
+                    raw_cursor.execute(
+                        connection.ops.savepoint_rollback_sql(EXPLAIN_SAVEPOINT)
+                    )
+
+    def log(self, sql, params, many, duration, connection):
+        entry = {
+            "time": timezone.now().isoformat(),
+            "duration_ms": round(duration * 1000, 1),
+            "sql": normalize_sql(sql),
+            "view": self.view,
+            "path": getattr(self.request, "path", None),
+            "database": connection.alias,
+        }
+        # Планы снимаем только для чтения: ANALYZE повторил бы изменение данных
+        if (
+            not many
+            and sql.lstrip()[:6].upper() == "SELECT"
+            and random.random() < self.sample_rate
+        ):
+            entry["plan"] = self.explain(connection, sql, params)
+
+        logger.warning(
+            "Медленный запрос %.1f мс (%s): %s",
+            entry["duration_ms"],
+            entry["view"],
+            entry["sql"][:300],
+        )
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def read_slow_query_log(path=None):
+    """Записи журнала медленных запросов (битые строки пропускаются)"""
+    path = Path(path or settings.SLOW_QUERY_LOG_FILE)
+    if not path.exists():
+        return
+    with path.open(encoding="utf-8") as log_file:
+        for line in log_file:
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def query_budget(budget):
+    """
+    Декоратор view-функции: максимальное число SQL-запросов на запрос.
+    Для классов представлений - атрибут query_budget (число или словарь
+    {action: число} для ViewSet).
+    """
+
+    def decorator(view_func):
+        view_func.query_budget = budget
+        return view_func
+
+    return decorator
+
+
+def get_query_budget(view_func, method="GET"):
+    """Бюджет запросов, объявленный у view (функции, CBV или ViewSet), либо None"""
+    view_class = getattr(view_func, "view_class", None) or getattr(
+        view_func, "cls", None
+    )
+    budget = getattr(view_class or view_func, "query_budget", None)
+    if isinstance(budget, dict):
+        actions = getattr(view_func, "actions", None) or {}
+        budget = budget.get(actions.get(method.lower()))
+    return budget
@@ -0,0 +1,291 @@
+"""
+Легковесный реестр метрик в памяти процесса.
+
+Каждый процесс (воркер gunicorn) периодически сбрасывает свое состояние
+в файл METRICS_DIR/<pid>.json, эндпоинт /metrics/ суммирует файлы всех
+процессов и отдает результат в текстовом формате Prometheus. Счетчики
+и гистограммы завершившихся процессов при сборе переносятся в общий файл
+DEAD_PROCESSES_FILE (суммы не убывают, работа коротких процессов пула
+не теряется), а их gauge отбрасываются - как mark_process_dead
+в prometheus_client. Каталог должен быть локальным для машины: pid
+других машин здесь не проверить.
+Без METRICS_DIR метрики видны только в пределах процесса.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Не чаще, чем раз в столько секунд процесс пишет свой файл метрик
+FLUSH_INTERVAL = 1.0
+
+# Накопленные счетчики и гистограммы завершившихся процессов
+DEAD_PROCESSES_FILE = "_dead.json"
+
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_histograms = {}
+_last_flush = 0.0
+
+
+def _key(name, labels):
+    return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def inc(name, value=1, **labels):
+    """Увеличивает счетчик"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    _maybe_flush()
+
+
+def set_gauge(name, value, **labels):
+    """
+    Задает текущее значение. По процессам значения суммируются; gauge
+    завершившихся процессов collect() отбрасывает
+    """
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+    _maybe_flush()
+
+
+def observe(name, value, **labels):
+    """Добавляет наблюдение в гистограмму"""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {
+                "buckets": [0] * len(DEFAULT_BUCKETS),
+                "sum": 0.0,
+                "count": 0,
+            }
+        index = bisect_left(DEFAULT_BUCKETS, value)
+        if index < len(DEFAULT_BUCKETS):
+            histogram["buckets"][index] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+    _maybe_flush()
+
+
+@contextmanager
+def timer(name, **labels):
+    """Замеряет длительность блока в секундах и пишет ее в гистограмму name"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started, **labels)
+
+
+def _metrics_dir():
+    metrics_dir = getattr(settings, "METRICS_DIR", None)
+    return Path(metrics_dir) if metrics_dir else None
+
+
+def _snapshot():
+    with _lock:
+        return {
+            "counters": [
+                [name, labels, value] for (name, labels), value in _counters.items()
+            ],
+            "gauges": [
+                [name, labels, value] for (name, labels), value in _gauges.items()
+            ],
+            "histograms": [
+                [name, labels, dict(histogram, buckets=list(histogram["buckets"]))]
+                for (name, labels), histogram in _histograms.items()
+            ],
+        }
+
+
+def flush():
+    """Записывает состояние процесса в METRICS_DIR (атомарно через rename)"""
+    global _last_flush
+    metrics_dir = _metrics_dir()
+    _last_flush = time.monotonic()
+    if metrics_dir is None:
+        return
+    metrics_dir.mkdir(parents=True, exist_ok=True)
+    _write_snapshot(metrics_dir / f"{os.getpid()}.json", _snapshot())
+
+
+def _maybe_flush():
+    if time.monotonic() - _last_flush >= FLUSH_INTERVAL:
+        flush()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Процесс есть, но принадлежит другому пользователю
+        return True
+    return True
+
+
+def _read_snapshot(path):
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        # Файл мог быть заменен или перенесен другим процессом во время чтения
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(snapshot), encoding="utf-8")
+    os.replace(tmp_path, path)
+
+
+def _sum_snapshots(snapshots):
+    counters, gauges, histograms = {}, {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        # Файлы, записанные до появления gauge, их не содержат
+        for name, labels, value in snapshot.get("gauges", []):
+            key = (name, tuple(map(tuple, labels)))
+            gauges[key] = gauges.get(key, 0) + value
+        for name, labels, histogram in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            total = histograms.setdefault(
+                key, {"buckets": [0] * len(DEFAULT_BUCKETS), "sum": 0.0, "count": 0}
+            )
+            total["buckets"] = [a + b for a, b in zip(total["buckets"], histogram["buckets"])]
+            total["sum"] += histogram["sum"]
+            total["count"] += histogram["count"]
+    return counters, gauges, histograms
+
+
+@contextmanager
+def _directory_lock(metrics_dir):
+    """Блокировка каталога метрик между процессами (flock, где он есть)"""
+    with open(metrics_dir / ".lock", "a") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _merge_dead_processes(metrics_dir, paths):
+    """
+    Переносит счетчики и гистограммы завершившихся процессов в
+    DEAD_PROCESSES_FILE и удаляет их файлы; gauge отбрасываются.
+    Под блокировкой: /metrics/ могут одновременно собирать несколько воркеров
+    """
+    aggregate_path = metrics_dir / DEAD_PROCESSES_FILE
+    with _directory_lock(metrics_dir):
+        merged = []
+        aggregate = _read_snapshot(aggregate_path)
+        snapshots = [aggregate or {"counters": [], "histograms": []}]
+        for path in paths:
+            # Файл уже перенес другой процесс
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+                merged.append(path)
+        if not merged:
+            return
+        counters, _, histograms = _sum_snapshots(snapshots)
+        _write_snapshot(
+            aggregate_path,
+            {
+                "counters": [
+                    [name, labels, value] for (name, labels), value in counters.items()
+                ],
+                "histograms": [
+                    [name, labels, histogram]
+                    for (name, labels), histogram in histograms.items()
+                ],
+            },
+        )
+        for path in merged:
+            path.unlink(missing_ok=True)
+
+
+def collect():
+    """Суммарные метрики всех процессов: (counters, gauges, histograms)"""
+    metrics_dir = _metrics_dir()
+    if metrics_dir is None:
+        return _sum_snapshots([_snapshot()])
+
+    flush()
+    # Воркер завершился (перезапуск gunicorn, max_requests, процесс пула)
+    dead = [
+        path
+        for path in metrics_dir.glob("*.json")
+        if path.stem.isdigit() and not _process_alive(int(path.stem))
+    ]
+    if dead:
+        _merge_dead_processes(metrics_dir, dead)
+
+    snapshots = []
+    for path in metrics_dir.glob("*.json"):
+        snapshot = _read_snapshot(path)
+        if snapshot is not None:
+            snapshots.append(snapshot)
+    return _sum_snapshots(snapshots)
+
+
+def _format_labels(labels, extra=()):
+    pairs = [*labels, *extra]
+    if not pairs:
+        return ""
+    escaped = (
+        f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for key, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render_prometheus():
+    """Метрики в текстовом формате Prometheus (version 0.0.4)"""
+    counters, gauges, histograms = collect()
+    lines = []
+
+    for kind, values in (("counter", counters), ("gauge", gauges)):
+        for name in sorted({name for name, _ in values}):
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(values.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(DEFAULT_BUCKETS, histogram["buckets"]):
+                cumulative += count
+                bucket_labels = _format_labels(labels, [("le", bound)])
+                lines.append(f"{name}_bucket{bucket_labels} {cumulative}")
+            inf_labels = _format_labels(labels, [("le", "+Inf")])
+            lines.append(f"{name}_bucket{inf_labels} {histogram['count']}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{_format_labels(labels)} {histogram['count']}")
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,329 @@
+import abc
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import compress_string
+
+from . import metrics
+from .db_pool import pooled_aliases, record_pool_metrics
+from .db_router import PIN_COOKIE, replica_databases, use_primary
+from .instrumentation import (
+    QueryRecorder,
+    SlowQueryLog,
+    get_query_budget,
+    in_sync_thread,
+)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+
+re_accepts_gzip = _lazy_re_compile(r"\bgzip\b")
+re_accepts_brotli = _lazy_re_compile(r"\bbr\b")
+
+
+class HybridMiddleware(abc.ABC):
+    """
+    Основа middleware для синхронного (WSGI) и асинхронного (ASGI) стека.
+    Подклассы реализуют handle() и ahandle(); в асинхронном стеке Django
+    не переключается ради них в поток, и async-представления остаются
+    в цикле событий.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.ahandle(request)
+        return self.handle(request)
+
+    @abc.abstractmethod
+    def handle(self, request):
+        """Обработка запроса в синхронном стеке"""
+
+    @abc.abstractmethod
+    async def ahandle(self, request):
+        """Обработка запроса в асинхронном стеке"""
+
+
+class PrimaryPinMiddleware(HybridMiddleware):
+    """
+    Закрепляет чтение за основной БД (см. db_router): на время запросов
+    с небезопасным методом и, через cookie, еще REPLICA_STICKY_SECONDS
+    секунд после них или после stick_to_primary(). Без REPLICA_DATABASES
+    не подключается.
+    """
+
+    def __init__(self, get_response):
+        if not replica_databases():
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.sticky_seconds = getattr(settings, "REPLICA_STICKY_SECONDS", 5)
+
+    def writes(self, request):
+        return request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+
+    def pinned(self, request):
+        return self.writes(request) or PIN_COOKIE in request.COOKIES
+
+    def handle(self, request):
+        with use_primary(self.pinned(request)):
+            return self.stick(request, self.get_response(request))
+
+    async def ahandle(self, request):
+        with use_primary(self.pinned(request)):
+            return self.stick(request, await self.get_response(request))
+
+    def stick(self, request, response):
+        if self.writes(request) or getattr(request, "sticks_to_primary", False):
+            response.set_cookie(
+                PIN_COOKIE,
+                "1",
+                max_age=self.sticky_seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
+
+
+class ApiCompressionMiddleware(HybridMiddleware):
+    """
+    Сжатие ответов API (brotli, если библиотека установлена, иначе gzip).
+    Сжимаются только ответы по API_COMPRESSION_PATH_PREFIX размером
+    от API_COMPRESSION_MIN_SIZE байт: мелкие ответы быстрее отдать как есть.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.path_prefix = getattr(settings, "API_COMPRESSION_PATH_PREFIX", "/api/")
+        self.min_size = getattr(settings, "API_COMPRESSION_MIN_SIZE", 1024)
+
+    def handle(self, request):
+        return self.compress(request, self.get_response(request))
+
+    async def ahandle(self, request):
+        return self.compress(request, await self.get_response(request))
+
+    def compress(self, request, response):
+        if not request.path.startswith(self.path_prefix):
+            return response
+        if response.streaming or response.has_header("Content-Encoding"):
+            return response
+        if len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ("Accept-Encoding",))
+
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if brotli is not None and re_accepts_brotli.search(accept_encoding):
+            compressed = brotli.compress(response.content, quality=5)
+            encoding = "br"
+        elif re_accepts_gzip.search(accept_encoding):
+            compressed = compress_string(response.content)
+            encoding = "gzip"
+        else:
+            return response
+
+        # Несжимаемые данные (например, уже упакованные) отдаем как есть
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response["Content-Length"] = str(len(compressed))
+        response["Content-Encoding"] = encoding
+
+        # Сжатый ответ не совпадает побайтно с исходным - ETag становится слабым
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response["ETag"] = "W/" + etag
+
+        return response
+
+
+class QueryBudgetMiddleware(HybridMiddleware):
+    """
+    Считает SQL-запросы, их суммарное время и повторяющиеся шаблоны
+    на каждый запрос. Пишет предупреждение в лог при превышении бюджета
+    view (см. instrumentation.query_budget) или вероятном N+1.
+    Включается QUERY_INSTRUMENTATION, заголовок Server-Timing - QUERY_SERVER_TIMING.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "QUERY_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.server_timing = getattr(settings, "QUERY_SERVER_TIMING", False)
+
+    def handle(self, request):
+        recorder = QueryRecorder()
+        with recorder.record():
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def ahandle(self, request):
+        recorder = QueryRecorder()
+        async with in_sync_thread(recorder.record()):
+            response = await self.get_response(request)
+        return self.report(request, response, recorder)
+
+    def report(self, request, response, recorder):
+        budget = getattr(request, "query_budget", None)
+        if budget is not None and recorder.count > budget:
+            logger.warning(
+                "Превышен бюджет запросов %s %s: %d > %d\n%s",
+                request.method,
+                request.path,
+                recorder.count,
+                budget,
+                recorder.report(),
+            )
+        elif recorder.repeated_templates():
+            logger.warning(
+                "Вероятный N+1 в %s %s\n%s",
+                request.method,
+                request.path,
+                recorder.report(),
+            )
+
+        if self.server_timing:
+            response["Server-Timing"] = (
+                f"db;dur={recorder.total_time * 1000:.1f};"
+                f'desc="{recorder.count} queries"'
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.query_budget = get_query_budget(view_func, request.method)
+
+
+class MetricsMiddleware(HybridMiddleware):
+    """
+    Метрики запросов по имени URL: гистограмма задержек, число и время
+    SQL-запросов, состояние пулов соединений. Нераспознанные URL сводятся
+    в одну метку, чтобы число рядов не росло вместе с мусорными путями.
+    Выключается METRICS_ENABLED.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.pooled_aliases = pooled_aliases()
+
+    def handle(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        self.record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    async def ahandle(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        async with in_sync_thread(recorder.record()):
+            response = await self.get_response(request)
+        self.record(request, response, recorder, time.perf_counter() - started)
+        return response
+
+    def record(self, request, response, recorder, duration):
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match else "<unresolved>"
+        metrics.observe(
+            "http_request_duration_seconds",
+            duration,
+            view=view,
+            method=request.method,
+            status=f"{response.status_code // 100}xx",
+        )
+        metrics.inc("db_queries_total", recorder.count, view=view)
+        metrics.inc("db_query_duration_seconds_total", recorder.total_time, view=view)
+        if self.pooled_aliases:
+            record_pool_metrics(self.pooled_aliases)
+
+
+class SlowQueryMiddleware(HybridMiddleware):
+    """
+    Журнал медленных SQL-запросов с привязкой к view (см. SlowQueryLog).
+    Выключается SLOW_QUERY_THRESHOLD_MS = None.
+    """
+
+    def __init__(self, get_response):
+        if getattr(settings, "SLOW_QUERY_THRESHOLD_MS", None) is None:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def handle(self, request):
+        with SlowQueryLog(request).record():
+            return self.get_response(request)
+
+    async def ahandle(self, request):
+        async with in_sync_thread(SlowQueryLog(request).record()):
+            return await self.get_response(request)
+
+
+class ProfilingMiddleware(HybridMiddleware):
+    """
+    Профилирование запроса для персонала по заголовку X-Profile: 1
+    или параметру ?_profile=1 (см. profiling.RequestProfiler).
+    Id профиля возвращается в заголовке X-Profile-Id. Без флага запрос
+    проходит без накладных расходов. Выключается PROFILING_ENABLED.
+    Должен стоять после AuthenticationMiddleware.
+
+    Под ASGI cProfile работает в потоке цикла событий и, пока запрос ждет
+    БД, записывает и другие корутины этого цикла. Точный профиль
+    async-запроса получается на сервере без параллельной нагрузки.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def profiler(self):
+        # cProfile и tracemalloc импортируются только для запросов с флагом
+        from .profiling import RequestProfiler
+
+        return RequestProfiler()
+
+    def requested(self, request):
+        return (
+            request.headers.get("X-Profile") == "1"
+            or request.GET.get("_profile") == "1"
+        )
+
+    def handle(self, request):
+        if not self.requested(request) or not request.user.is_staff:
+            return self.get_response(request)
+
+        with self.profiler() as profiler:
+            response = self.get_response(request)
+        if profiler.started:
+            response["X-Profile-Id"] = profiler.profile_id
+        return response
+
+    async def ahandle(self, request):
+        if not self.requested(request) or not (await request.auser()).is_staff:
+            return await self.get_response(request)
+
+        # Профилируется весь цикл событий на время запроса, см. docstring
+        with self.profiler() as profiler:
+            response = await self.get_response(request)
+        if profiler.started:
+            response["X-Profile-Id"] = profiler.profile_id
+        return response
@@ -0,0 +1,79 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+
+# С какого числа строк точный COUNT(*) заменяется оценкой
+ESTIMATED_COUNT_THRESHOLD = 100_000
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор для больших таблиц на PostgreSQL: вместо точного COUNT(*)
+    берет оценку числа строк - из pg_class.reltuples для всей таблицы
+    или из плана запроса для отфильтрованной выборки. Точный подсчет
+    выполняется, только если оценка меньше ESTIMATED_COUNT_THRESHOLD.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[getattr(queryset, "db", "default")]
+        if not hasattr(queryset, "query") or connection.vendor != "postgresql":
+            return super().count
+
+        threshold = getattr(
+            settings, "ADMIN_ESTIMATED_COUNT_THRESHOLD", ESTIMATED_COUNT_THRESHOLD
+        )
+        estimate = self._table_estimate(connection, queryset.model._meta.db_table)
+        if estimate < threshold:
+            return super().count
+
+        if queryset.query.where:
+            estimate = self._plan_estimate(queryset)
+            if estimate < threshold:
+                return super().count
+        return estimate
+
+    def _table_estimate(self, connection, table):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                [table],
+            )
+            row = cursor.fetchone()
+        # reltuples = -1 у таблицы, для которой еще не собиралась статистика
+        return max(row[0], 0) if row else 0
+
+    def _plan_estimate(self, queryset):
+        plan = json.loads(queryset.order_by().explain(format="json"))
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def apaginate_queryset(paginator, queryset, request):
+    """
+    Асинхронный аналог paginate_queryset() пагинатора DRF с номерами страниц:
+    COUNT(*) и выборка страницы идут через async ORM, после чего
+    paginator.get_paginated_response() работает как обычно.
+    None - пагинация выключена (PAGE_SIZE не задан).
+    """
+    page_size = paginator.get_page_size(request)
+    if not page_size:
+        return None
+
+    django_paginator = paginator.django_paginator_class(queryset, page_size)
+    django_paginator.count = await queryset.acount()
+    page_number = paginator.get_page_number(request, django_paginator)
+    try:
+        paginator.page = django_paginator.page(page_number)
+    except InvalidPage as exc:
+        raise NotFound(
+            paginator.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            )
+        )
+    paginator.request = request
+    return [obj async for obj in paginator.page.object_list]
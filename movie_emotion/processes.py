@@ -0,0 +1,53 @@
+"""
+Пул процессов для тяжелых пакетных задач (рассылка, обработка изображений).
+
+Процессы запускаются через spawn: вызов может идти из потока воркера
+очереди, а fork многопоточного процесса небезопасен. Модуль не импортирует
+модели, чтобы его можно было загрузить в новом процессе до django.setup().
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from . import metrics
+
+
+def _init_process(database_names):
+    """Инициализация процесса пула: Django и те же БД, что у родителя"""
+    django.setup()
+    # Родитель мог работать на тестовой БД (например, в бенчмарке)
+    for alias, name in database_names.items():
+        connections[alias].settings_dict["NAME"] = name
+
+
+def _call(job):
+    path, args = job
+    try:
+        return import_string(path)(*args)
+    finally:
+        connections.close_all()
+        # Процесс может завершиться раньше периодического сброса метрик
+        metrics.flush()
+
+
+def map_in_processes(path, args_list, workers):
+    """
+    Вызывает функцию path (строка импорта) для каждого кортежа аргументов
+    в пуле из workers процессов и возвращает результаты в том же порядке
+    """
+    args_list = list(args_list)
+    database_names = {
+        alias: connections[alias].settings_dict["NAME"] for alias in settings.DATABASES
+    }
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(workers, len(args_list))),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_process,
+        initargs=(database_names,),
+    ) as pool:
+        return list(pool.map(_call, [(path, tuple(args)) for args in args_list]))
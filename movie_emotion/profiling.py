@@ -0,0 +1,140 @@
+"""
+Профилирование отдельных запросов по требованию персонала.
+
+Запрос выполняется под cProfile, параллельно поток-сэмплер снимает стеки
+(формат collapsed stacks для flamegraph.pl / speedscope), а tracemalloc -
+самые крупные выделения памяти. Результаты сохраняются в PROFILING_DIR
+под идентификатором, который возвращается в заголовке X-Profile-Id.
+"""
+
+import cProfile
+import io
+import pstats
+import sys
+import threading
+import tracemalloc
+import uuid
+from collections import Counter
+from pathlib import Path
+
+from django.conf import settings
+
+# Что сохраняется по каждому профилю: вид -> расширение файла
+PROFILE_KINDS = {
+    "stats": "txt",
+    "stacks": "collapsed",
+    "allocations": "alloc.txt",
+    "raw": "prof",
+}
+TOP_ALLOCATIONS = 30
+
+# tracemalloc и cProfile глобальны для процесса - профилируем по одному запросу
+_lock = threading.Lock()
+
+
+def profiles_dir():
+    return Path(settings.PROFILING_DIR)
+
+
+def profile_path(profile_id, kind):
+    return profiles_dir() / f"{profile_id}.{PROFILE_KINDS[kind]}"
+
+
+def _frame_label(code):
+    filename = code.co_filename
+    if "site-packages/" in filename:
+        filename = filename.rsplit("site-packages/", 1)[1]
+    elif filename.startswith(str(settings.BASE_DIR)):
+        filename = filename[len(str(settings.BASE_DIR)) + 1 :]
+    return f"{filename}:{code.co_name}"
+
+
+class StackSampler(threading.Thread):
+    """Раз в interval секунд снимает стек потока thread_id"""
+
+    def __init__(self, thread_id, interval):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def collapsed(self):
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+class RequestProfiler:
+    """
+    Контекстный менеджер: профилирует блок и сохраняет результаты.
+    Если уже идет профилирование другого запроса, started = False
+    и блок выполняется без замеров.
+    """
+
+    def __init__(self):
+        self.profile_id = str(uuid.uuid4())
+        self.started = False
+
+    def __enter__(self):
+        if not _lock.acquire(blocking=False):
+            return self
+        self.started = True
+        self.sampler = StackSampler(
+            threading.get_ident(),
+            getattr(settings, "PROFILING_SAMPLE_INTERVAL", 0.005),
+        )
+        self.profiler = cProfile.Profile()
+        tracemalloc.start()
+        self.sampler.start()
+        self.profiler.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.started:
+            return
+        try:
+            self.profiler.disable()
+            self.sampler.stop()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.save(snapshot)
+        finally:
+            _lock.release()
+
+    def save(self, snapshot):
+        profiles_dir().mkdir(parents=True, exist_ok=True)
+
+        self.profiler.dump_stats(profile_path(self.profile_id, "raw"))
+
+        stats_report = io.StringIO()
+        stats = pstats.Stats(self.profiler, stream=stats_report)
+        stats.sort_stats("cumulative").print_stats(50)
+        profile_path(self.profile_id, "stats").write_text(
+            stats_report.getvalue(), encoding="utf-8"
+        )
+
+        profile_path(self.profile_id, "stacks").write_text(
+            self.sampler.collapsed(), encoding="utf-8"
+        )
+
+        snapshot = snapshot.filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)]
+        )
+        allocations = snapshot.statistics("lineno")[:TOP_ALLOCATIONS]
+        profile_path(self.profile_id, "allocations").write_text(
+            "\n".join(str(statistic) for statistic in allocations) + "\n",
+            encoding="utf-8",
+        )
@@ -53,14 +53,21 @@ INSTALLED_APPS = [
     "emotions",
     "users",
     "notifications",
+    "tasks",
 ]
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "movie_emotion.middleware.PrimaryPinMiddleware",
+    "movie_emotion.middleware.MetricsMiddleware",
+    "movie_emotion.middleware.ApiCompressionMiddleware",
+    "movie_emotion.middleware.SlowQueryMiddleware",
+    "movie_emotion.middleware.QueryBudgetMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "movie_emotion.middleware.ProfilingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -92,9 +99,40 @@ DATABASES = {
         "NAME": env_settings.postgres.POSTGRES_DB_NAME,
         "USER": env_settings.postgres.POSTGRES_USER.get_secret_value(),
         "PASSWORD": env_settings.postgres.POSTGRES_PASS.get_secret_value(),
+        "CONN_MAX_AGE": env_settings.postgres.POSTGRES_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": env_settings.postgres.POSTGRES_CONN_HEALTH_CHECKS,
     }
 }
 
+# Пул соединений psycopg в каждом процессе вместо постоянных соединений.
+# Под ASGI постоянные соединения привязаны к потокам и не переиспользуются,
+# поэтому там нужен пул
+if env_settings.postgres.POSTGRES_POOL:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"] = {
+        "pool": {
+            "min_size": env_settings.postgres.POSTGRES_POOL_MIN_SIZE,
+            "max_size": env_settings.postgres.POSTGRES_POOL_MAX_SIZE,
+            "timeout": env_settings.postgres.POSTGRES_POOL_TIMEOUT,
+        }
+    }
+
+# Реплики для чтения каталога и уведомлений (movie_emotion.db_router).
+# В тестах они указывают на тестовую основную БД
+for index, replica in enumerate(env_settings.postgres.POSTGRES_REPLICA_HOSTS):
+    host, _, port = replica.partition(":")
+    DATABASES[f"replica_{index}"] = {
+        **DATABASES["default"],
+        "HOST": host,
+        "PORT": int(port) if port else DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+REPLICA_DATABASES = [alias for alias in DATABASES if alias != "default"]
+# Сколько секунд после записи чтение пользователя идет с основной БД
+REPLICA_STICKY_SECONDS = env_settings.postgres.POSTGRES_REPLICA_STICKY_SECONDS
+DATABASE_ROUTERS = ["movie_emotion.db_router.PrimaryReplicaRouter"]
+
 EMAIL_BACKEND = env_settings.email.EMAIL_BACKEND
 EMAIL_HOST = env_settings.email.EMAIL_HOST
 EMAIL_PORT = env_settings.email.EMAIL_PORT
@@ -150,7 +188,7 @@ MEDIA_ROOT = BASE_DIR / "media"
 # Django REST Framework
 REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
     "DEFAULT_PERMISSION_CLASSES": [
@@ -162,8 +200,80 @@ REST_FRAMEWORK = {
         "rest_framework.renderers.JSONRenderer",
         "rest_framework.renderers.BrowsableAPIRenderer",
     ],
+    "DEFAULT_THROTTLE_CLASSES": [
+        "movie_emotion.throttling.TokenBucketThrottle",
+    ],
+    # Емкость ведра и период его полного восполнения (movie_emotion.throttling);
+    # expensive - поиск, подбор по эмоциям, batch и emotion_matrix.
+    # Без лимитов (API_THROTTLE_ENABLED=false) ведра не проверяются
+    "DEFAULT_THROTTLE_RATES": (
+        {
+            "api_anon": "120/min",
+            "api_user": "300/min",
+            "expensive_anon": "30/min",
+            "expensive_user": "60/min",
+        }
+        if env_settings.api.API_THROTTLE_ENABLED
+        else {}
+    ),
 }
 
+# Кэш для ведер ограничения частоты API: на Redis лимит общий и атомарный
+# для всех процессов, с другими бэкендами - свой в каждом процессе
+API_THROTTLE_CACHE = "default"
+
+# Сколько секунд пользователь JWT-запросов хранится в кэше (users.auth_cache).
+# Кэш работает только с общим для процессов бэкендом CACHES, не с LocMemCache
+AUTH_CACHE_TIMEOUT = 60
+
+# Сжатие ответов API (brotli/gzip) начиная с указанного размера в байтах
+API_COMPRESSION_PATH_PREFIX = "/api/"
+API_COMPRESSION_MIN_SIZE = 1024
+
+# Подсчет SQL-запросов на запрос, поиск N+1 и заголовок Server-Timing
+QUERY_INSTRUMENTATION = DEBUG
+QUERY_SERVER_TIMING = DEBUG
+QUERY_N_PLUS_ONE_THRESHOLD = 3
+
+# Метрики в формате Prometheus (/metrics/): задержки по view, SQL, кэш, почта
+METRICS_ENABLED = True
+METRICS_DIR = env_settings.monitoring.METRICS_DIR
+METRICS_ALLOWED_IPS = env_settings.monitoring.METRICS_ALLOWED_IPS
+METRICS_TOKEN = (
+    env_settings.monitoring.METRICS_TOKEN.get_secret_value()
+    if env_settings.monitoring.METRICS_TOKEN
+    else None
+)
+
+# Журнал медленных SQL-запросов (None - выключен) и доля запросов с планом
+SLOW_QUERY_THRESHOLD_MS = 200
+SLOW_QUERY_EXPLAIN_SAMPLE_RATE = 0.1
+SLOW_QUERY_LOG_FILE = BASE_DIR / "logs" / "slow_queries.jsonl"
+
+# Профилирование запросов персонала по X-Profile: 1 или ?_profile=1
+PROFILING_ENABLED = True
+PROFILING_DIR = BASE_DIR / "logs" / "profiles"
+PROFILING_SAMPLE_INTERVAL = 0.005
+
+# Очередь фоновых задач (manage.py run_worker). При True задачи выполняются
+# сразу после коммита в процессе, который их поставил - без воркера
+TASKS_ALWAYS_EAGER = False
+
+# Рассылка уведомлений: подписки делятся на шарды по диапазонам id,
+# шарды выполняются параллельно в пуле процессов (только PostgreSQL)
+NOTIFY_SHARD_SIZE = 50_000
+NOTIFY_FANOUT_WORKERS = 4
+
+# Поток уведомлений (SSE): как часто хаб процесса проверяет новые уведомления,
+# через сколько секунд простоя отправлять клиенту пинг и через сколько секунд
+# браузер переподключается под WSGI, где поток не держится открытым
+NOTIFICATION_STREAM_POLL_INTERVAL = 1.0
+NOTIFICATION_STREAM_HEARTBEAT = 15
+NOTIFICATION_STREAM_FALLBACK_RETRY = 60
+
+# Начиная с этого числа строк админка показывает оценку вместо точного COUNT(*)
+ADMIN_ESTIMATED_COUNT_THRESHOLD = 100_000
+
 # Login URLs
 LOGIN_URL = "/users/login/"
 LOGIN_REDIRECT_URL = "/"
@@ -0,0 +1,81 @@
+"""
+Замер холодного старта: manage.py запускается в новом процессе,
+время импорта модулей берется из вывода python -X importtime.
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+# Что запускается для замера и сколько секунд он может длиться:
+# management-команда (cron) и старт воркера очереди
+STARTUP_TARGETS = {
+    "manage": (["check"], 2.0),
+    "worker": (["run_worker", "--help"], 2.0),
+}
+
+
+def parse_importtime(output):
+    """
+    Строки python -X importtime: [{module, self_ms, cumulative_ms, depth}].
+    depth 0 - модуль, импортированный не из другого модуля проекта или
+    библиотеки (из manage.py, при загрузке приложений)
+    """
+    modules = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        depth = (len(name) - len(name.lstrip(" ")) - 1) // 2
+        modules.append(
+            {
+                "module": name.strip(),
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": depth,
+            }
+        )
+    return modules
+
+
+def _run(args, importtime=False):
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += [str(settings.BASE_DIR / "manage.py"), *args]
+    started = time.perf_counter()
+    result = subprocess.run(
+        command, capture_output=True, text=True, env=os.environ.copy()
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        # Процесс мог завершиться без вывода (например, по сигналу)
+        lines = result.stderr.strip().splitlines() or ["(stderr пуст)"]
+        raise RuntimeError(
+            f"manage.py {' '.join(args)} завершился с кодом {result.returncode}: "
+            + lines[-1]
+        )
+    return elapsed, result.stderr
+
+
+def profile_startup(args, runs=3):
+    """
+    Холодный старт manage.py с args: лучшее время из runs запусков
+    (без -X importtime, который сам замедляет импорт) и время импорта
+    модулей по отдельному запуску
+    """
+    seconds = min(_run(args)[0] for _ in range(runs))
+    _, output = _run(args, importtime=True)
+    return {"seconds": round(seconds, 3), "modules": parse_importtime(output)}
+
+
+def package_times(modules):
+    """Собственное время импорта по пакетам верхнего уровня, мс"""
+    packages = {}
+    for module in modules:
+        package = module["module"].partition(".")[0]
+        packages[package] = packages.get(package, 0) + module["self_ms"]
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,84 @@
+import re
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import resolve
+
+from .instrumentation import QueryRecorder, get_query_budget
+
+
+class QueryBudgetTestMixin:
+    """Проверки количества SQL-запросов и N+1 для TestCase"""
+
+    @contextmanager
+    def assertMaxQueries(self, budget, allow_n_plus_one=False):
+        recorder = QueryRecorder()
+        with recorder.record():
+            yield recorder
+        if recorder.count > budget:
+            self.fail(f"Превышен бюджет {budget} запросов:\n{recorder.report()}")
+        if not allow_n_plus_one and recorder.repeated_templates():
+            self.fail(f"Обнаружен вероятный N+1:\n{recorder.report()}")
+
+    def assertViewWithinBudget(self, url, client=None, **extra):
+        """GET url укладывается в бюджет запросов, объявленный у view"""
+        budget = get_query_budget(resolve(urlsplit(url).path).func, "GET")
+        if budget is None:
+            self.fail(f"Для {url} не объявлен бюджет запросов")
+        with self.assertMaxQueries(budget):
+            response = (client or self.client).get(url, **extra)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+
+class QueryPlanTestMixin:
+    """
+    Проверки планов запросов: таблица читается по индексу, а не полным
+    сканированием. На PostgreSQL последовательное сканирование запрещается
+    (enable_seqscan = off), чтобы на маленьком наборе данных план не зависел
+    от статистики: если подходящего индекса нет, в плане остается Seq Scan.
+    """
+
+    def get_plan(self, queryset):
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET LOCAL enable_seqscan = off")
+            return queryset.explain()
+        if connection.vendor == "sqlite":
+            return queryset.explain()
+        self.skipTest(f"Нет проверки планов для {connection.vendor}")
+
+    def assertNoFullScan(self, queryset, table):
+        plan = self.get_plan(queryset)
+        if connection.vendor == "postgresql":
+            pattern = rf"Seq Scan on {re.escape(table)}\b"
+        else:
+            pattern = rf"\bSCAN {re.escape(table)}\b"
+        if re.search(pattern, plan):
+            self.fail(f"Полное сканирование {table}:\n{plan}")
+        return plan
+
+
+class DatasetTestCase(TestCase):
+    """
+    TestCase на синтетическом наборе данных (films.synthetic): параметры
+    generate_dataset задаются атрибутом dataset. Кэш очищается до и после
+    каждого теста, чтобы фасеты, ведра ограничения частоты и кэш
+    аутентификации не переходили из теста в тест
+    """
+
+    dataset = {"films": 5, "emotions": 3, "ratings": 10, "users": 1, "seed": 1}
+
+    @classmethod
+    def setUpTestData(cls):
+        from films.synthetic import generate_dataset
+
+        generate_dataset(**cls.dataset)
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
@@ -0,0 +1,149 @@
+"""
+Ограничение частоты запросов к API по алгоритму token bucket.
+
+У каждого клиента (IP для анонимов, id для пользователей) на каждую
+область (scope) свое ведро: емкость N из DEFAULT_THROTTLE_RATES вида
+"N/min" расходуется по токену на запрос и равномерно восполняется за
+период. Дорогие действия (FilmViewSet.get_throttle_scope) расходуют
+отдельное ведро с меньшим лимитом. Ведра хранятся в кэше
+API_THROTTLE_CACHE: на Redis проверка и списание - один атомарный
+Lua-скрипт, общий для всех процессов; с другими бэкендами (LocMem)
+атомарность обеспечивает блокировка внутри процесса.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from . import metrics
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+# Время берется на сервере Redis, чтобы не зависеть от часов процессов
+TAKE_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local time = redis.call("TIME")
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call("HMGET", KEYS[1], "tokens", "updated")
+local tokens = tonumber(state[1]) or capacity
+local updated = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local allowed, wait = 0, 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = (cost - tokens) / rate
+end
+redis.call("HSET", KEYS[1], "tokens", tostring(tokens), "updated", tostring(now))
+redis.call("EXPIRE", KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+
+def parse_rate(rate):
+    """"120/min" -> (емкость 120, восполнение 2 токена в секунду)"""
+    count, period = rate.split("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period[0]]
+
+
+class RedisBuckets:
+    def __init__(self, cache):
+        self.cache = cache
+        self._script = None
+
+    def take(self, key, capacity, rate, cost=1):
+        """(разрешено ли, через сколько секунд накопится нужное число токенов)"""
+        key = self.cache.make_and_validate_key(key)
+        client = self.cache._cache.get_client(key, write=True)
+        if self._script is None:
+            self._script = client.register_script(TAKE_SCRIPT)
+        allowed, wait = self._script(
+            keys=[key], args=[capacity, rate, cost], client=client
+        )
+        return bool(allowed), float(wait)
+
+
+class CacheBuckets:
+    """
+    Ведра в обычном кэше Django. Атомарность только в пределах процесса,
+    поэтому для нескольких воркеров с общим лимитом нужен Redis
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, cost=1):
+        with self._lock:
+            now = time.time()
+            tokens, updated = self.cache.get(key, (capacity, now))
+            tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                allowed, wait = True, 0.0
+            else:
+                allowed, wait = False, (cost - tokens) / rate
+            self.cache.set(key, (tokens, now), int(capacity / rate) + 1)
+        return allowed, wait
+
+
+_buckets = {}
+
+
+def get_buckets():
+    alias = getattr(settings, "API_THROTTLE_CACHE", "default")
+    if alias not in _buckets:
+        cache = caches[alias]
+        _buckets[alias] = (
+            RedisBuckets(cache) if isinstance(cache, RedisCache) else CacheBuckets(cache)
+        )
+    return _buckets[alias]
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Лимит по области view (get_throttle_scope() или throttle_scope,
+    по умолчанию "api") отдельно для анонимов и пользователей: ставки
+    "<область>_anon" и "<область>_user". Без ставки запрос не ограничивается
+    """
+
+    default_scope = "api"
+
+    def get_scope(self, view):
+        get_throttle_scope = getattr(view, "get_throttle_scope", None)
+        if get_throttle_scope is not None:
+            return get_throttle_scope()
+        return getattr(view, "throttle_scope", self.default_scope)
+
+    def allow_request(self, request, view):
+        self._wait = None
+        scope = self.get_scope(view)
+        if request.user and request.user.is_authenticated:
+            kind, ident = "user", request.user.pk
+        else:
+            kind, ident = "anon", self.get_ident(request)
+
+        rate = api_settings.DEFAULT_THROTTLE_RATES.get(f"{scope}_{kind}")
+        if rate is None:
+            return True
+        capacity, refill = parse_rate(rate)
+
+        allowed, wait = get_buckets().take(
+            f"throttle:{scope}:{kind}:{ident}", capacity, refill
+        )
+        if not allowed:
+            self._wait = wait
+            metrics.inc("api_throttled_total", scope=scope, kind=kind)
+        return allowed
+
+    def wait(self):
+        return self._wait
@@ -6,12 +6,20 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .views import metrics_view, profile_detail_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path("", include("films.urls")),
     path("users/", include("users.urls")),
     path("notifications/", include("notifications.urls")),
     path("api/", include("films.api_urls")),
+    path("metrics/", metrics_view, name="metrics"),
+    path(
+        "profiles/<uuid:profile_id>/<str:kind>/",
+        profile_detail_view,
+        name="profile_detail",
+    ),
 ]
 
 # Обслуживание медиа-файлов в режиме разработки
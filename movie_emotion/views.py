@@ -0,0 +1,55 @@
+import hmac
+
+from django.conf import settings
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden
+
+from . import metrics
+
+
+def _has_metrics_token(request):
+    token = getattr(settings, "METRICS_TOKEN", None)
+    if not token:
+        return False
+    scheme, _, value = request.headers.get("Authorization", "").partition(" ")
+    return scheme.lower() == "bearer" and hmac.compare_digest(
+        value.encode(), token.encode()
+    )
+
+
+def metrics_view(request):
+    """
+    Метрики всех воркеров в текстовом формате Prometheus. Доступ - по токену
+    METRICS_TOKEN, с адресов METRICS_ALLOWED_IPS или для персонала
+    """
+    allowed_ips = getattr(settings, "METRICS_ALLOWED_IPS", [])
+    if not (
+        _has_metrics_token(request)
+        or request.META.get("REMOTE_ADDR") in allowed_ips
+        or (request.user.is_authenticated and request.user.is_staff)
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.render_prometheus(),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
+
+
+@staff_member_required
+def profile_detail_view(request, profile_id, kind):
+    """
+    Сохраненный профиль запроса: stats (отчет cProfile), stacks
+    (collapsed stacks для флеймграфа), allocations (tracemalloc), raw (.prof)
+    """
+    from .profiling import PROFILE_KINDS, profile_path
+
+    if kind not in PROFILE_KINDS:
+        raise Http404
+    path = profile_path(profile_id, kind)
+    if not path.exists():
+        raise Http404
+    if kind == "raw":
+        return FileResponse(path.open("rb"), as_attachment=True, filename=path.name)
+    return HttpResponse(
+        path.read_text(encoding="utf-8"), content_type="text/plain; charset=utf-8"
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from movie_emotion.pagination import EstimatedCountPaginator
 from .models import Subscription, Notification
 
 
@@ -16,6 +17,9 @@ class SubscriptionAdmin(admin.ModelAdmin):
     list_filter = ["is_active", "emotion", "min_intensity", "created_at"]
     search_fields = ["user__user__username", "emotion__name"]
     readonly_fields = ["created_at", "last_notified"]
+    autocomplete_fields = ["user"]
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return (
@@ -44,7 +48,12 @@ class NotificationAdmin(admin.ModelAdmin):
     ]
     search_fields = ["user__user__username", "title", "message", "film__title"]
     readonly_fields = ["created_at"]
-    date_hierarchy = "created_at"
+    autocomplete_fields = ["user", "film"]
+    raw_id_fields = ["subscription"]
+    paginator = EstimatedCountPaginator
+    # Точный COUNT(*) по всей таблице и date_hierarchy (выборка всех дат)
+    # на миллионах уведомлений слишком дороги
+    show_full_result_count = False
 
     def get_queryset(self, request):
         return (
@@ -0,0 +1,211 @@
+"""
+Рассылка уведомлений о фильме подписчикам, разбитая на части (шарды)
+по диапазонам id подписок. Шарды независимы: каждый читает свои подписки
+потоково (server-side cursor на PostgreSQL), вставляет уведомления пачками
+и в той же транзакции ставит отметку FanoutShard. Шарды выполняются
+параллельно в пуле процессов.
+"""
+
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Exists, Max, Min, OuterRef, Q
+from django.utils import timezone
+
+from emotions.models import Emotion
+from films.models import Film, FilmEmotionRating
+from movie_emotion import metrics
+from movie_emotion.db_router import use_primary
+from movie_emotion.processes import map_in_processes
+from .models import FanoutShard, Notification, Subscription
+
+logger = logging.getLogger(__name__)
+
+# Ширина диапазона id подписок в одном шарде
+SHARD_SIZE = 50_000
+# Сколько строк читать с курсора и вставлять за раз
+BATCH_SIZE = 2000
+
+
+def ratings_hash(ratings):
+    """Отпечаток набора оценок фильма: после их изменения рассылка идет заново"""
+    payload = ",".join(f"{emotion_id}:{intensity}" for emotion_id, intensity in ratings)
+    return hashlib.md5(payload.encode()).hexdigest()
+
+
+def _film_ratings(film_id):
+    return list(
+        FilmEmotionRating.objects.filter(film_id=film_id)
+        .order_by("emotion_id")
+        .values_list("emotion_id", "intensity")
+    )
+
+
+def _matching_subscriptions(film_id, ratings):
+    match = Q()
+    for emotion_id, intensity in ratings:
+        match |= Q(emotion_id=emotion_id, min_intensity__lte=intensity)
+    already_notified = Notification.objects.filter(
+        user_id=OuterRef("user_id"),
+        film_id=film_id,
+        emotion_id=OuterRef("emotion_id"),
+        notification_type="subscription",
+    )
+    return Subscription.objects.filter(match, is_active=True).exclude(
+        Exists(already_notified)
+    )
+
+
+def plan_shards(film_id, shard_size=None):
+    """
+    Границы шардов [start, end) по id подходящих подписок. Границы кратны
+    shard_size, поэтому при повторе совпадают с уже отмеченными шардами.
+    """
+    shard_size = shard_size or getattr(settings, "NOTIFY_SHARD_SIZE", SHARD_SIZE)
+    ratings = _film_ratings(film_id)
+    if not ratings:
+        return []
+    bounds = _matching_subscriptions(film_id, ratings).aggregate(
+        low=Min("id"), high=Max("id")
+    )
+    if bounds["low"] is None:
+        return []
+    first = bounds["low"] // shard_size * shard_size
+    return [
+        (start, start + shard_size)
+        for start in range(first, bounds["high"] + 1, shard_size)
+    ]
+
+
+@use_primary()
+def process_shard(film_id, start, end):
+    """Создает уведомления для подписок с id в [start, end); повтор безопасен"""
+    from .tasks import send_notification_email
+
+    started = time.perf_counter()
+    film = Film.objects.get(pk=film_id)
+    ratings = _film_ratings(film_id)
+    fingerprint = ratings_hash(ratings)
+    report = {"start": start, "end": end, "created": 0, "skipped": False}
+
+    if FanoutShard.objects.filter(
+        film_id=film_id, ratings_hash=fingerprint, shard_start=start
+    ).exists():
+        report["skipped"] = True
+        return report
+
+    intensities = dict(ratings)
+    emotion_names = dict(
+        Emotion.objects.filter(id__in=intensities).values_list("id", "name")
+    )
+    subscriptions = (
+        _matching_subscriptions(film_id, ratings)
+        .filter(id__gte=start, id__lt=end)
+        .order_by("id")
+        .values_list(
+            "id",
+            "user_id",
+            "emotion_id",
+            "user__email_notifications",
+            "user__user__email",
+        )
+    )
+
+    notified_at = timezone.now()
+    batch, batch_emails, emails = [], [], []
+
+    def flush():
+        created = Notification.objects.bulk_create(batch)
+        Subscription.objects.filter(
+            id__in=[notification.subscription_id for notification in created]
+        ).update(last_notified=notified_at)
+        emails.extend(
+            (notification.id,)
+            for notification, wants_email in zip(created, batch_emails)
+            if wants_email
+        )
+        report["created"] += len(created)
+        batch.clear()
+        batch_emails.clear()
+
+    try:
+        with transaction.atomic():
+            for row in subscriptions.iterator(chunk_size=BATCH_SIZE):
+                subscription_id, user_id, emotion_id, email_enabled, email = row
+                batch.append(
+                    Notification(
+                        user_id=user_id,
+                        subscription_id=subscription_id,
+                        film_id=film_id,
+                        emotion_id=emotion_id,
+                        notification_type="subscription",
+                        title=f'Новый фильм: "{film.title}"',
+                        message=(
+                            f'По вашей подписке на эмоцию "{emotion_names[emotion_id]}" '
+                            f'появился новый фильм "{film.title}" ({film.year}) '
+                            f"с интенсивностью {intensities[emotion_id]}/10."
+                        ),
+                    )
+                )
+                batch_emails.append(bool(email_enabled and email))
+                if len(batch) >= BATCH_SIZE:
+                    flush()
+            if batch:
+                flush()
+
+            # Письма отправляет воркер очереди
+            send_notification_email.enqueue_many(emails)
+
+            report["duration_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            FanoutShard.objects.create(
+                film_id=film_id,
+                ratings_hash=fingerprint,
+                shard_start=start,
+                shard_end=end,
+                notifications_created=report["created"],
+                duration_ms=report["duration_ms"],
+            )
+    except IntegrityError:
+        # Тот же шард параллельно завершил другой процесс - его работа откатана
+        return {**report, "created": 0, "skipped": True}
+
+    metrics.inc("notifications_created_total", report["created"], type="subscription")
+    metrics.observe("notify_shard_duration_seconds", report["duration_ms"] / 1000)
+    return report
+
+
+@use_primary()
+def fan_out(film_id, workers=None, shard_size=None):
+    """
+    Рассылка по фильму: шарды выполняются в пуле из workers процессов
+    (NOTIFY_FANOUT_WORKERS). Возвращает отчеты шардов с временем выполнения.
+    """
+    workers = workers or getattr(settings, "NOTIFY_FANOUT_WORKERS", 1)
+    shards = plan_shards(film_id, shard_size)
+
+    # SQLite не допускает параллельной записи - там шарды идут по очереди
+    if workers <= 1 or len(shards) <= 1 or connection.vendor == "sqlite":
+        reports = [process_shard(film_id, start, end) for start, end in shards]
+    else:
+        reports = map_in_processes(
+            "notifications.fanout.process_shard",
+            [(film_id, start, end) for start, end in shards],
+            workers,
+        )
+
+    created = sum(report["created"] for report in reports)
+    logger.info(
+        "Рассылка по фильму %s: %d уведомлений, %d шардов (%s)",
+        film_id,
+        created,
+        len(reports),
+        ", ".join(
+            f"[{report['start']}, {report['end']}) "
+            + ("пропущен" if report["skipped"] else f"{report['duration_ms']} мс")
+            for report in reports
+        ),
+    )
+    return reports
@@ -0,0 +1,207 @@
+import asyncio
+import json
+import random
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from films.benchmarks import _percentile
+from users.models import UserProfile
+from ...models import Notification
+
+
+def _rss_kb(pid):
+    """Резидентная память процесса (Linux), КБ"""
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1])
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный тест потока уведомлений: держит N одновременных "
+        "SSE-подключений к запущенному ASGI-серверу и измеряет задержку доставки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--url",
+            default="http://127.0.0.1:8000",
+            help="Адрес сервера (по умолчанию http://127.0.0.1:8000)",
+        )
+        parser.add_argument(
+            "--clients",
+            type=int,
+            default=1000,
+            help="Число подключений; пользователей должно быть не меньше "
+            "(generate_dataset --users), а лимит файлов (ulimit -n) - больше",
+        )
+        parser.add_argument(
+            "--notifications",
+            type=int,
+            default=200,
+            help="Сколько уведомлений создать случайным подключенным пользователям",
+        )
+        parser.add_argument(
+            "--timeout",
+            type=float,
+            default=30,
+            help="Сколько секунд ждать подключения и доставки",
+        )
+        parser.add_argument(
+            "--server-pid",
+            type=int,
+            help="PID процесса сервера, чтобы посчитать память на подключение",
+        )
+        parser.add_argument("--output", help="Записать результат в JSON-файл")
+
+    def handle(self, *args, **options):
+        url = urlsplit(options["url"])
+        if url.scheme != "http":
+            raise CommandError("Поддерживается только http://")
+
+        profiles = list(
+            UserProfile.objects.select_related("user").order_by("id")[
+                : options["clients"]
+            ]
+        )
+        if len(profiles) < options["clients"]:
+            raise CommandError(
+                f"Пользователей {len(profiles)}, нужно {options['clients']}: "
+                "создайте их через generate_dataset --users"
+            )
+
+        self.stdout.write(f"Создание сессий для {len(profiles)} пользователей...")
+        cookies = []
+        for profile in profiles:
+            # Новый вход в том же клиенте сбросил бы предыдущую сессию
+            client = Client()
+            client.force_login(profile.user)
+            cookies.append(client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+        result = asyncio.run(self.run(url, profiles, cookies, options))
+        self.stdout.write(json.dumps(result, indent=2, ensure_ascii=False))
+        if options["output"]:
+            Path(options["output"]).write_text(
+                json.dumps(result, indent=2, ensure_ascii=False), encoding="utf-8"
+            )
+
+    async def run(self, url, profiles, cookies, options):
+        host, port = url.hostname, url.port or 80
+        path = reverse("notifications:notification_stream")
+        server_pid = options["server_pid"]
+        rss_before = _rss_kb(server_pid) if server_pid else None
+
+        connected = asyncio.Semaphore(0)
+        received = {}
+        errors = []
+
+        async def subscriber(cookie):
+            try:
+                reader, writer = await asyncio.open_connection(host, port)
+            except OSError as error:
+                errors.append(str(error))
+                connected.release()
+                return
+            try:
+                writer.write(
+                    (
+                        f"GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+                        f"Accept: text/event-stream\r\n"
+                        f"Cookie: {settings.SESSION_COOKIE_NAME}={cookie}\r\n\r\n"
+                    ).encode()
+                )
+                await writer.drain()
+                status = await reader.readline()
+                if b" 200 " not in status:
+                    errors.append(status.decode().strip())
+                    connected.release()
+                    return
+                while await reader.readline() not in (b"\r\n", b""):
+                    pass
+                connected.release()
+                # Каждое событие приходит отдельным chunk, поэтому строки
+                # "id: ..." не разрываются границами chunked-кодирования
+                while line := await reader.readline():
+                    if line.startswith(b"id: "):
+                        received[int(line[4:])] = time.perf_counter()
+            except OSError as error:
+                errors.append(str(error))
+            finally:
+                writer.close()
+
+        started = time.perf_counter()
+        tasks = [asyncio.create_task(subscriber(cookie)) for cookie in cookies]
+        try:
+            for _ in tasks:
+                await asyncio.wait_for(connected.acquire(), options["timeout"])
+        except TimeoutError:
+            pass
+        connect_seconds = time.perf_counter() - started
+        clients = len(tasks) - len(errors)
+
+        # Даем серверу освободить память, выделенную на время подключения
+        await asyncio.sleep(1)
+        rss_after = _rss_kb(server_pid) if server_pid else None
+
+        rng = random.Random(0)
+        targets = [rng.choice(profiles) for _ in range(options["notifications"])]
+        created = await sync_to_async(self.create_notifications)(targets)
+
+        deadline = time.monotonic() + options["timeout"]
+        while time.monotonic() < deadline and not created.keys() <= received.keys():
+            await asyncio.sleep(0.1)
+
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        latencies = [
+            (received[notification_id] - created_at) * 1000
+            for notification_id, created_at in created.items()
+            if notification_id in received
+        ]
+        result = {
+            "clients": clients,
+            "errors": len(errors),
+            "connect_seconds": round(connect_seconds, 2),
+            "notifications": len(created),
+            "delivered": len(latencies),
+            "latency_ms": (
+                {
+                    "p50": round(_percentile(latencies, 50), 1),
+                    "p95": round(_percentile(latencies, 95), 1),
+                    "max": round(max(latencies), 1),
+                }
+                if latencies
+                else None
+            ),
+        }
+        if rss_before is not None and rss_after is not None:
+            result["server_rss_kb"] = {"before": rss_before, "after": rss_after}
+            result["kb_per_connection"] = round(
+                (rss_after - rss_before) / max(clients, 1), 1
+            )
+        if errors:
+            result["first_error"] = errors[0]
+        return result
+
+    def create_notifications(self, profiles):
+        """Создает уведомления и возвращает {id: момент создания}"""
+        created = {}
+        for profile in profiles:
+            notification = Notification.objects.create(
+                user=profile,
+                notification_type="system",
+                title="Нагрузочный тест",
+                message="Проверка доставки уведомлений в реальном времени",
+            )
+            created[notification.id] = time.perf_counter()
+        return created
@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-19 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("emotions", "0001_initial"),
+        ("films", "0005_film_films_film_is_publ_2ef980_idx"),
+        ("notifications", "0001_initial"),
+        ("users", "0002_emailconfirmation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["user", "film", "emotion", "notification_type"],
+                name="notificatio_user_id_b34dba_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="subscription",
+            index=models.Index(
+                fields=["emotion", "is_active", "min_intensity"],
+                name="notificatio_emotion_ee90f7_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 6.1.2 on 2026-10-19 11:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("films", "0005_film_films_film_is_publ_2ef980_idx"),
+        ("notifications", "0002_notification_notificatio_user_id_b34dba_idx_and_more"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="FanoutShard",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "ratings_hash",
+                    models.CharField(max_length=32, verbose_name="Хэш оценок фильма"),
+                ),
+                (
+                    "shard_start",
+                    models.BigIntegerField(verbose_name="Начало диапазона id"),
+                ),
+                (
+                    "shard_end",
+                    models.BigIntegerField(verbose_name="Конец диапазона id"),
+                ),
+                (
+                    "notifications_created",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="Создано уведомлений"
+                    ),
+                ),
+                (
+                    "duration_ms",
+                    models.FloatField(default=0, verbose_name="Длительность (мс)"),
+                ),
+                (
+                    "completed_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="Завершено"),
+                ),
+                (
+                    "film",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fanout_shards",
+                        to="films.film",
+                        verbose_name="Фильм",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Часть рассылки",
+                "verbose_name_plural": "Части рассылки",
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("film", "ratings_hash", "shard_start"),
+                        name="unique_fanout_shard",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -35,10 +35,14 @@ class Subscription(models.Model):
         verbose_name_plural = "Подписки"
         unique_together = ["user", "emotion"]
         ordering = ["-created_at"]
+        indexes = [
+            # Поиск подписчиков на эмоцию при публикации фильма
+            models.Index(fields=["emotion", "is_active", "min_intensity"]),
+        ]
 
     def __str__(self):
         return (
-            f"{self.user.username} → {self.emotion.name} (от {self.min_intensity}/10)"
+            f"{self.user.user.username} → {self.emotion.name} (от {self.min_intensity}/10)"
         )
 
     def check_film(self, film):
@@ -108,10 +112,12 @@ class Notification(models.Model):
         ordering = ["-created_at"]
         indexes = [
             models.Index(fields=["user", "is_read", "created_at"]),
+            # Проверка, что уведомление о фильме уже отправлялось
+            models.Index(fields=["user", "film", "emotion", "notification_type"]),
         ]
 
     def __str__(self):
-        return f"{self.title} для {self.user.username}"
+        return f"{self.title} для {self.user.user.username}"
 
     def mark_as_read(self):
         """Помечает уведомление как прочитанное"""
@@ -131,3 +137,40 @@ class Notification(models.Model):
         if self.user.profile.telegram_id:
             self.sent_via_telegram = True
             self.save(update_fields=["sent_via_telegram"])
+
+
+class FanoutShard(models.Model):
+    """
+    Отметка о завершенной части рассылки по фильму: подписки с id
+    в [shard_start, shard_end) для набора оценок ratings_hash.
+    Пишется в одной транзакции с уведомлениями, поэтому повтор
+    рассылки пропускает уже обработанные части.
+    """
+
+    film = models.ForeignKey(
+        Film,
+        on_delete=models.CASCADE,
+        related_name="fanout_shards",
+        verbose_name="Фильм",
+    )
+    ratings_hash = models.CharField(max_length=32, verbose_name="Хэш оценок фильма")
+    shard_start = models.BigIntegerField(verbose_name="Начало диапазона id")
+    shard_end = models.BigIntegerField(verbose_name="Конец диапазона id")
+    notifications_created = models.PositiveIntegerField(
+        default=0, verbose_name="Создано уведомлений"
+    )
+    duration_ms = models.FloatField(default=0, verbose_name="Длительность (мс)")
+    completed_at = models.DateTimeField(auto_now_add=True, verbose_name="Завершено")
+
+    class Meta:
+        verbose_name = "Часть рассылки"
+        verbose_name_plural = "Части рассылки"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["film", "ratings_hash", "shard_start"],
+                name="unique_fanout_shard",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.film_id}: [{self.shard_start}, {self.shard_end})"
@@ -1,12 +1,13 @@
 from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from django.conf import settings
 
-from films.models import Film, FilmEmotionRating
-from .models import Subscription, Notification
+from films.models import Film, defer_rating_update
+from films.signals import ratings_changed
+from movie_emotion import metrics
+from .tasks import notify_subscribers
 
 
+@metrics.timer("notify_subscribers_duration_seconds")
 def _notify_subscribers_for_film(film):
     """Отправляет уведомления всем подписчикам для опубликованного фильма."""
 
@@ -14,95 +15,12 @@ def _notify_subscribers_for_film(film):
     if not film.is_published:
         return
 
-    # Получаем все эмоциональные оценки фильма
-    emotion_ratings = FilmEmotionRating.objects.filter(film=film).select_related(
-        "emotion"
-    )
+    # Подписки обрабатываются шардами (см. fanout.py): уже отправленные
+    # уведомления не дублируются, письма уходят через очередь задач.
+    # Модуль с пулом процессов импортируется при первой рассылке
+    from .fanout import fan_out
 
-    # Если у фильма нет оценок - не отправляем уведомления
-    if not emotion_ratings.exists():
-        return
-
-    # Для каждой эмоциональной оценки
-    for rating in emotion_ratings:
-        emotion = rating.emotion
-        intensity = rating.intensity
-
-        # Ищем активные подписки для этой эмоции с подходящей интенсивностью
-        subscriptions = Subscription.objects.filter(
-            emotion=emotion, min_intensity__lte=intensity, is_active=True
-        ).select_related("user__user")
-
-        for subscription in subscriptions:
-            user_profile = subscription.user
-            user = user_profile.user
-
-            # Проверяем, не было ли уже уведомления для этой комбинации
-            existing_notification = Notification.objects.filter(
-                user=user_profile,
-                film=film,
-                emotion=emotion,
-                notification_type="subscription",
-            ).exists()
-
-            if existing_notification:
-                continue
-
-            # Создаём уведомление
-            notification = Notification.objects.create(
-                user=user_profile,
-                subscription=subscription,
-                film=film,
-                emotion=emotion,
-                notification_type="subscription",
-                title=f'Новый фильм: "{film.title}"',
-                message=(
-                    f'По вашей подписке на эмоцию "{emotion.name}" '
-                    f'появился новый фильм "{film.title}" ({film.year}) '
-                    f"с интенсивностью {intensity}/10."
-                ),
-            )
-
-            # Отправляем email если включено
-            if user_profile.email_notifications and user.email:
-                try:
-                    site_domain = (
-                        settings.ALLOWED_HOSTS[0]
-                        if settings.ALLOWED_HOSTS
-                        else "localhost"
-                    )
-                    if "://" not in site_domain:
-                        site_domain = f"http://{site_domain}"
-
-                    send_mail(
-                        subject=f'MovieEmotion: Новый фильм по подписке - "{film.title}"',
-                        message=(
-                            f"Здравствуйте, {user.username}!\n\n"
-                            f'По вашей подписке на эмоцию "{emotion.name}" '
-                            f"появился новый фильм:\n\n"
-                            f'"{film.title}" ({film.year})\n'
-                            f"Режиссер: {film.director}\n"
-                            f"Жанр: {film.get_genre_display()}\n"
-                            f'Интенсивность эмоции "{emotion.name}": {intensity}/10\n\n'
-                            f"Описание: {film.description[:200]}...\n\n"
-                            f"Посмотреть фильм: {site_domain}/films/{film.id}/\n\n"
-                            f"---\n"
-                            f"MovieEmotion - подбор фильмов по эмоциям\n"
-                            f"Отписаться от уведомлений можно в личном кабинете"
-                        ),
-                        from_email=settings.DEFAULT_FROM_EMAIL,
-                        recipient_list=[user.email],
-                    )
-                    notification.sent_via_email = True
-                    notification.save(update_fields=["sent_via_email"])
-                except Exception as e:
-                    print(
-                        f"Ошибка отправки email для пользователя {user.username}: {e}"
-                    )
-
-            # Обновляем дату последнего уведомления
-            subscription.last_notified = notification.created_at
-            subscription.save(update_fields=["last_notified"])
+    return fan_out(film.pk)
 
 
 @receiver(pre_save, sender=Film)
@@ -138,7 +56,23 @@ def handle_film_publish_changes(sender, instance, created, **kwargs):
     if not just_published:
         return
 
-    # Используем transaction.on_commit чтобы гарантировать, что фильм сохранен
-    from django.db import transaction
+    # Оценки фильма еще сохраняются (например, инлайн в админке) -
+    # рассылка пройдет один раз после пересчета, см. _notify_for_changed_ratings
+    if defer_rating_update(instance.pk):
+        return
 
-    transaction.on_commit(lambda: _notify_subscribers_for_film(instance))
+    # Рассылка выполняется воркером очереди; внутри транзакции задача
+    # станет видна ему только после коммита, то есть после сохранения фильма
+    notify_subscribers.enqueue(instance.pk)
+
+
+@receiver(ratings_changed)
+def _notify_for_changed_ratings(sender, film_ids, **kwargs):
+    """
+    После изменения оценок рассылаем уведомления по опубликованным фильмам:
+    подписчики, которым фильм теперь подходит, получат его один раз
+    (уже отправленные уведомления не дублируются).
+    """
+    published = Film.objects.filter(pk__in=film_ids, is_published=True)
+    for film_id in published.values_list("pk", flat=True):
+        notify_subscribers.enqueue(film_id)
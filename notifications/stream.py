@@ -0,0 +1,393 @@
+"""
+Доставка уведомлений в браузер через server-sent events.
+
+Один на процесс NotificationHub раз в NOTIFICATION_STREAM_POLL_INTERVAL
+секунд выбирает новые уведомления одним запросом и раскладывает их
+по очередям подключенных пользователей. Уведомления создаются в других
+процессах (воркеры очереди, пул рассылки), поэтому хаб читает их из БД,
+а не получает сигналом. Подключение - это асинхронный генератор и
+asyncio.Queue без отдельного потока, так что тысячи простаивающих
+соединений почти ничего не стоят.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+from collections import defaultdict
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import close_old_connections, connection
+from django.db.models import Count, Max, Q
+from django.http import HttpRequest, parse_cookie
+from django.urls import reverse
+
+from movie_emotion import metrics
+from users.models import UserProfile
+from .models import Notification
+
+logger = logging.getLogger(__name__)
+
+# Сколько событий может накопиться у медленного клиента
+QUEUE_SIZE = 100
+# Сколько уведомлений хаб забирает за один опрос
+POLL_LIMIT = 1000
+# Через сколько мс браузер переподключается после обрыва
+RETRY_MS = 5000
+# То же под WSGI, где поток закрывается сразу: каждое переподключение -
+# полный проход middleware, поэтому реже (NOTIFICATION_STREAM_FALLBACK_RETRY)
+FALLBACK_RETRY = 60
+
+NOTIFICATION_FIELDS = ["id", "user_id", "film_id", "title", "message", "created_at"]
+
+
+def format_event(event, data, event_id=None):
+    """Событие в формате text/event-stream"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False, default=str)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def notification_event(notification, unread):
+    return format_event(
+        "notification",
+        {
+            "id": notification["id"],
+            "film_id": notification["film_id"],
+            "title": notification["title"],
+            "message": notification["message"],
+            "created_at": notification["created_at"].isoformat(),
+            "unread": unread,
+        },
+        event_id=notification["id"],
+    )
+
+
+async def unread_counts(user_ids):
+    counts = dict.fromkeys(user_ids, 0)
+    rows = (
+        Notification.objects.filter(user_id__in=user_ids, is_read=False)
+        .values("user_id")
+        .annotate(count=Count("id"))
+        .order_by()
+    )
+    async for row in rows:
+        counts[row["user_id"]] = row["count"]
+    return counts
+
+
+class NotificationHub:
+    """Раздает новые уведомления подключенным пользователям одного процесса"""
+
+    def __init__(self, poll_interval=None):
+        self.loop = asyncio.get_running_loop()
+        self.poll_interval = poll_interval or getattr(
+            settings, "NOTIFICATION_STREAM_POLL_INTERVAL", 1.0
+        )
+        self.last_id = None
+        self._subscribers = defaultdict(set)
+        self._task = None
+
+    @property
+    def connections(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    async def subscribe(self, user_id):
+        if self.last_id is None:
+            result = await Notification.objects.aaggregate(last_id=Max("id"))
+            self.last_id = result["last_id"] or 0
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self._subscribers[user_id].add(queue)
+        metrics.inc("notification_stream_connections_total")
+        if self._task is None or self._task.done():
+            # Пустой контекст: иначе задача унаследует контекст запроса,
+            # и ее запросы к БД пойдут в поток этого запроса
+            self._task = asyncio.create_task(self._run(), context=contextvars.Context())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        queues = self._subscribers.get(user_id)
+        if queues is None:
+            return
+        queues.discard(queue)
+        metrics.inc("notification_stream_disconnects_total")
+        if not queues:
+            del self._subscribers[user_id]
+
+    async def poll(self):
+        """Один опрос БД: рассылает уведомления, появившиеся с прошлого раза"""
+        notifications = [
+            notification
+            async for notification in Notification.objects.filter(id__gt=self.last_id)
+            .order_by("id")
+            .values(*NOTIFICATION_FIELDS)[:POLL_LIMIT]
+        ]
+        if not notifications:
+            return 0
+        # Уведомление из транзакции, зафиксированной позже следующих id,
+        # сюда не попадет - браузер получит его при переподключении
+        self.last_id = notifications[-1]["id"]
+
+        notifications = [
+            notification
+            for notification in notifications
+            if notification["user_id"] in self._subscribers
+        ]
+        if not notifications:
+            return 0
+        counts = await unread_counts({n["user_id"] for n in notifications})
+
+        for notification in notifications:
+            event = (
+                notification["id"],
+                notification_event(notification, counts[notification["user_id"]]),
+            )
+            for queue in self._subscribers.get(notification["user_id"], ()):
+                try:
+                    queue.put_nowait(event)
+                except asyncio.QueueFull:
+                    # Клиент не успевает читать: событие теряется, но счетчик
+                    # непрочитанных придет со следующим уведомлением
+                    metrics.inc("notification_stream_dropped_total")
+        metrics.inc("notification_stream_events_total", len(notifications))
+        return len(notifications)
+
+    async def _run(self):
+        while self._subscribers:
+            try:
+                # Хаб работает вне цикла запроса Django, и request_started/
+                # request_finished не закрывают его соединение: без этого
+                # не действуют CONN_MAX_AGE и CONN_HEALTH_CHECKS, а после
+                # перезапуска БД опросы падали бы до перезапуска процесса.
+                # sync_to_async - тот же поток, что у запросов async ORM
+                await sync_to_async(close_old_connections)()
+                await self.poll()
+                await sync_to_async(close_old_connections)()
+            except Exception:
+                logger.exception("Ошибка опроса уведомлений для потока событий")
+            await asyncio.sleep(self.poll_interval)
+        # Без подписчиков хаб не опрашивает БД; следующий начнет с текущего id
+        self.last_id = None
+
+
+_hub = None
+
+
+def get_hub():
+    """Хаб текущего цикла событий (один на процесс ASGI-сервера)"""
+    global _hub
+    if _hub is None or _hub.loop is not asyncio.get_running_loop():
+        _hub = NotificationHub()
+    return _hub
+
+
+async def unread_state(user_id):
+    """(число непрочитанных, id последнего уведомления или 0) одним запросом"""
+    result = await Notification.objects.filter(user_id=user_id).aaggregate(
+        unread=Count("id", filter=Q(is_read=False)), last_id=Max("id")
+    )
+    return result["unread"], result["last_id"] or 0
+
+
+async def missed_events(user_id, last_event_id):
+    """Уведомления, пропущенные за время переподключения (по Last-Event-ID)"""
+    notifications = [
+        notification
+        async for notification in Notification.objects.filter(
+            user_id=user_id, id__gt=last_event_id
+        )
+        .order_by("id")
+        .values(*NOTIFICATION_FIELDS)[:QUEUE_SIZE]
+    ]
+    if not notifications:
+        return []
+    unread = (await unread_counts([user_id]))[user_id]
+    return [
+        (notification["id"], notification_event(notification, unread))
+        for notification in notifications
+    ]
+
+
+async def event_stream(user_id, last_event_id=None, follow=True, heartbeat=None):
+    """
+    Поток событий пользователя: пропущенные уведомления и число непрочитанных,
+    затем (follow=True) новые уведомления из хаба. Без follow поток сразу
+    завершается, и браузер переподключится через
+    NOTIFICATION_STREAM_FALLBACK_RETRY секунд.
+
+    Событие unread несет id последнего уведомления пользователя: браузер
+    вернет его в Last-Event-ID, и при переподключении придет все, что
+    появилось за время разрыва.
+    """
+    heartbeat = heartbeat or getattr(settings, "NOTIFICATION_STREAM_HEARTBEAT", 15)
+    hub = queue = None
+    if follow:
+        # Подписываемся до выборки пропущенного, чтобы не потерять уведомления
+        # между ними; повторы отсекаются по id
+        hub = get_hub()
+        queue = await hub.subscribe(user_id)
+    if follow:
+        retry_ms = RETRY_MS
+    else:
+        retry_ms = (
+            getattr(settings, "NOTIFICATION_STREAM_FALLBACK_RETRY", FALLBACK_RETRY)
+            * 1000
+        )
+    try:
+        yield f"retry: {retry_ms}\n\n"
+        sent_id = last_event_id or 0
+        if last_event_id is not None:
+            for event_id, event in await missed_events(user_id, last_event_id):
+                sent_id = event_id
+                yield event
+        unread, last_id = await unread_state(user_id)
+        # sent_id не сдвигаем: уведомления из очереди хаба с id не больше
+        # last_id еще не отправлены
+        yield format_event(
+            "unread", {"unread": unread}, event_id=max(sent_id, last_id)
+        )
+
+        while follow:
+            try:
+                event_id, event = await asyncio.wait_for(queue.get(), heartbeat)
+            except TimeoutError:
+                # Комментарий не дает прокси закрыть простаивающее соединение
+                yield ": ping\n\n"
+                continue
+            if event_id > sent_id:
+                yield event
+    finally:
+        if follow:
+            hub.unsubscribe(user_id, queue)
+
+
+def parse_event_id(value):
+    """Значение Last-Event-ID: id последнего полученного уведомления"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def _authenticate(cookie_header):
+    """id профиля пользователя по cookie сессии или None"""
+    try:
+        session_key = parse_cookie(cookie_header).get(settings.SESSION_COOKIE_NAME)
+        if not session_key:
+            return None
+        request = HttpRequest()
+        request.session = import_module(settings.SESSION_ENGINE).SessionStore(
+            session_key
+        )
+        user = get_user(request)
+        if not user.is_authenticated:
+            return None
+        profile, created = UserProfile.objects.get_or_create(
+            user=user,
+            defaults={
+                "notification_frequency": "daily",
+                "email_notifications": True,
+            },
+        )
+        return profile.id
+    finally:
+        # Вызывается в общем пуле потоков, вне цикла запроса Django
+        connection.close()
+
+
+class NotificationStreamApp:
+    """
+    ASGI-обертка: поток уведомлений обслуживается в цикле событий,
+    минуя обработчик Django. Тот держит на каждый запрос до конца ответа
+    отдельный поток для синхронных middleware (и с ним соединение с БД),
+    что для долгих подключений обходится в сотни КБ на каждое.
+    Остальные запросы и неавторизованные подключения уходят в application.
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self._path = None
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = reverse("notifications:notification_stream")
+        return self._path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            return await self.application(scope, receive, send)
+
+        headers = {
+            name.decode("latin-1"): value.decode("latin-1")
+            for name, value in scope["headers"]
+        }
+        user_id = await sync_to_async(_authenticate, thread_sensitive=False)(
+            headers.get("cookie", "")
+        )
+        if user_id is None:
+            # Перенаправление на вход делает обычное представление
+            return await self.application(scope, receive, send)
+
+        last_event_id = parse_event_id(headers.get("last-event-id"))
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (b"content-type", b"text/event-stream; charset=utf-8"),
+                    (b"cache-control", b"no-cache"),
+                    (b"x-accel-buffering", b"no"),
+                ],
+            }
+        )
+
+        async def stream():
+            try:
+                async for event in event_stream(user_id, last_event_id):
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": event.encode(),
+                            "more_body": True,
+                        }
+                    )
+            except OSError:
+                # Клиент отключился
+                return
+            except Exception:
+                logger.exception("Ошибка потока уведомлений")
+                metrics.inc("notification_stream_errors_total")
+            # Поток оборвался из-за ошибки: завершаем ответ, чтобы браузер
+            # переподключился через retry, а не ждал на мертвом соединении
+            try:
+                await send(
+                    {"type": "http.response.body", "body": b"", "more_body": False}
+                )
+            except OSError:
+                pass
+
+        async def wait_disconnect():
+            while (await receive())["type"] != "http.disconnect":
+                pass
+
+        streaming = asyncio.create_task(stream())
+        disconnect = asyncio.create_task(wait_disconnect())
+        try:
+            await asyncio.wait(
+                {streaming, disconnect}, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            for task in (streaming, disconnect):
+                task.cancel()
+                try:
+                    await task
+                except (asyncio.CancelledError, OSError):
+                    pass
@@ -0,0 +1,69 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from films.models import Film, FilmEmotionRating
+from movie_emotion import metrics
+from tasks.queue import task
+from .models import Notification
+
+
+@task(timeout=600)
+def notify_subscribers(film_id):
+    """Рассылка уведомлений подписчикам по опубликованному фильму"""
+    from .signals import _notify_subscribers_for_film
+
+    film = Film.objects.filter(pk=film_id).first()
+    if film is not None:
+        _notify_subscribers_for_film(film)
+
+
+@task(max_attempts=5, timeout=60)
+def send_notification_email(notification_id):
+    """Письмо о новом фильме по подписке (повторяется при ошибке SMTP)"""
+    notification = (
+        Notification.objects.select_related("user__user", "film", "emotion")
+        .filter(pk=notification_id, sent_via_email=False)
+        .first()
+    )
+    if notification is None:
+        return
+
+    user = notification.user.user
+    film = notification.film
+    emotion = notification.emotion
+    intensity = (
+        FilmEmotionRating.objects.filter(film=film, emotion=emotion)
+        .values_list("intensity", flat=True)
+        .first()
+    )
+
+    site_domain = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else "localhost"
+    if "://" not in site_domain:
+        site_domain = f"http://{site_domain}"
+
+    try:
+        send_mail(
+            subject=f'MovieEmotion: Новый фильм по подписке - "{film.title}"',
+            message=(
+                f"Здравствуйте, {user.username}!\n\n"
+                f'По вашей подписке на эмоцию "{emotion.name}" '
+                f"появился новый фильм:\n\n"
+                f'"{film.title}" ({film.year})\n'
+                f"Режиссер: {film.director}\n"
+                f"Жанр: {film.get_genre_display()}\n"
+                f'Интенсивность эмоции "{emotion.name}": {intensity}/10\n\n'
+                f"Описание: {film.description[:200]}...\n\n"
+                f"Посмотреть фильм: {site_domain}/films/{film.id}/\n\n"
+                f"---\n"
+                f"MovieEmotion - подбор фильмов по эмоциям\n"
+                f"Отписаться от уведомлений можно в личном кабинете"
+            ),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[user.email],
+        )
+    except Exception:
+        metrics.inc("emails_failed_total", kind="subscription")
+        raise
+
+    Notification.objects.filter(pk=notification.pk).update(sent_via_email=True)
+    metrics.inc("emails_sent_total", kind="subscription")
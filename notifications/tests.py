@@ -1,3 +1,388 @@
-from django.test import TestCase
+import asyncio
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from emotions.models import Emotion
+from films.models import Film, FilmEmotionRating
+from movie_emotion.testing import (
+    DatasetTestCase,
+    QueryBudgetTestMixin,
+    QueryPlanTestMixin,
+)
+from tasks.models import Task
+from users.models import UserProfile
+from .fanout import fan_out, plan_shards
+from .models import FanoutShard, Notification, Subscription
+from .stream import NotificationHub, NotificationStreamApp, get_hub
+
+
+class NotificationQueryBudgetTests(QueryBudgetTestMixin, DatasetTestCase):
+    dataset = {
+        "films": 20,
+        "emotions": 4,
+        "ratings": 40,
+        "users": 2,
+        "subscriptions": 8,
+        "notifications": 60,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.first()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+
+    def test_notification_list(self):
+        self.assertViewWithinBudget(reverse("notifications:notification_list"))
+
+    def test_subscription_list(self):
+        self.assertViewWithinBudget(reverse("notifications:subscription_list"))
+
+
+class NotificationQueryPlanTests(QueryPlanTestMixin, DatasetTestCase):
+    dataset = {
+        "films": 50,
+        "emotions": 6,
+        "ratings": 200,
+        "users": 20,
+        "subscriptions": 60,
+        "notifications": 500,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.profile = UserProfile.objects.first()
+        cls.film = Film.objects.first()
+        cls.emotion = Emotion.objects.first()
+
+    def test_subscription_match(self):
+        self.assertNoFullScan(
+            Subscription.objects.filter(
+                emotion=self.emotion, min_intensity__lte=7, is_active=True
+            ),
+            "notifications_subscription",
+        )
+
+    def test_notification_dedup(self):
+        self.assertNoFullScan(
+            Notification.objects.filter(
+                user=self.profile,
+                film=self.film,
+                emotion=self.emotion,
+                notification_type="subscription",
+            ),
+            "notifications_notification",
+        )
+
+    def test_user_notifications(self):
+        self.assertNoFullScan(
+            Notification.objects.filter(user=self.profile)[:20],
+            "notifications_notification",
+        )
+
+
+class NotificationAdminTests(DatasetTestCase):
+    dataset = {
+        "films": 10,
+        "emotions": 3,
+        "ratings": 20,
+        "users": 3,
+        "subscriptions": 6,
+        "notifications": 40,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = User.objects.create_superuser("admin", password="x")
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.admin)
+
+    def test_changelists(self):
+        for name in [
+            "admin:notifications_notification_changelist",
+            "admin:notifications_subscription_changelist",
+            "admin:films_film_changelist",
+            "admin:films_filmemotionrating_changelist",
+        ]:
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    response.context["cl"].result_count,
+                    len(response.context["cl"].model.objects.all()),
+                )
+
+    def test_change_form_uses_autocomplete(self):
+        notification = Notification.objects.first()
+        response = self.client.get(
+            reverse("admin:notifications_notification_change", args=[notification.pk])
+        )
+        self.assertContains(response, "admin-autocomplete")
+
+
+class FanoutTests(DatasetTestCase):
+    dataset = {
+        "films": 5,
+        "emotions": 3,
+        "ratings": 10,
+        "users": 30,
+        "subscriptions": 60,
+        "notifications": 0,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.film = Film.objects.filter(emotion_ratings__isnull=False).first()
+        UserProfile.objects.filter(pk__in=UserProfile.objects.all()[:10]).update(
+            email_notifications=False
+        )
+        Task.objects.all().delete()
+
+    def expected_subscriptions(self):
+        return {
+            subscription.pk
+            for rating in FilmEmotionRating.objects.filter(film=self.film)
+            for subscription in Subscription.objects.filter(
+                emotion_id=rating.emotion_id,
+                min_intensity__lte=rating.intensity,
+                is_active=True,
+            )
+        }
+
+    def test_fan_out_by_shards(self):
+        expected = self.expected_subscriptions()
+        self.assertTrue(expected)
+        shards = plan_shards(self.film.pk, 10)
+
+        reports = fan_out(self.film.pk, workers=4, shard_size=10)
+
+        self.assertGreater(len(shards), 1)
+        self.assertEqual(len(reports), len(shards))
+        notifications = Notification.objects.filter(film=self.film)
+        self.assertEqual(
+            set(notifications.values_list("subscription_id", flat=True)), expected
+        )
+        self.assertEqual(sum(report["created"] for report in reports), len(expected))
+        self.assertEqual(
+            FanoutShard.objects.filter(film=self.film).count(), len(reports)
+        )
+
+        # Письма ставятся в очередь только тем, кто их не отключил
+        emailed = set(
+            notifications.filter(user__email_notifications=True).values_list(
+                "id", flat=True
+            )
+        )
+        queued = {
+            task.args[0]
+            for task in Task.objects.filter(
+                name="notifications.tasks.send_notification_email"
+            )
+        }
+        self.assertEqual(queued, emailed)
+
+    def test_repeat_is_idempotent(self):
+        fan_out(self.film.pk, shard_size=10)
+        created = Notification.objects.filter(film=self.film).count()
+
+        reports = fan_out(self.film.pk, shard_size=10)
+
+        self.assertTrue(all(report["skipped"] for report in reports))
+        self.assertEqual(Notification.objects.filter(film=self.film).count(), created)
+
+    def test_changed_ratings_notify_new_matches_only(self):
+        fan_out(self.film.pk, shard_size=10)
+        FilmEmotionRating.objects.filter(film=self.film).update(intensity=10)
+        expected = self.expected_subscriptions()
+
+        fan_out(self.film.pk, shard_size=10)
+
+        notifications = Notification.objects.filter(film=self.film)
+        self.assertEqual(notifications.count(), len(expected))
+        self.assertEqual(
+            set(notifications.values_list("subscription_id", flat=True)), expected
+        )
+
+
+class NotificationStreamViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("viewer", password="x")
+        cls.profile = UserProfile.objects.create(user=cls.user)
+        cls.notifications = [
+            Notification.objects.create(
+                user=cls.profile,
+                notification_type="system",
+                title=f"Уведомление {i}",
+                message="Текст",
+            )
+            for i in range(2)
+        ]
+
+    def test_login_required(self):
+        response = self.client.get(reverse("notifications:notification_stream"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_missed_events_and_unread(self):
+        self.client.force_login(self.user)
+        response = self.client.get(
+            reverse("notifications:notification_stream"),
+            headers={"Last-Event-ID": str(self.notifications[0].id)},
+        )
+        content = response.content.decode()
+
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertIn("retry: 60000\n", content)
+        self.assertNotIn(f"id: {self.notifications[0].id}\n", content)
+        self.assertIn(f"id: {self.notifications[1].id}\nevent: notification", content)
+        self.assertIn('event: unread\ndata: {"unread": 2}', content)
+
+    def test_first_connection_sets_event_id(self):
+        self.client.force_login(self.user)
+        url = reverse("notifications:notification_stream")
+        content = self.client.get(url).content.decode()
+        # Уведомления до первого подключения не повторяются, но id
+        # последнего попадает в Last-Event-ID следующего подключения
+        self.assertNotIn("event: notification", content)
+        last_id = self.notifications[1].id
+        self.assertIn(f"id: {last_id}\nevent: unread", content)
+
+        notification = Notification.objects.create(
+            user=self.profile,
+            notification_type="system",
+            title="Новое",
+            message="Текст",
+        )
+        content = self.client.get(
+            url, headers={"Last-Event-ID": str(last_id)}
+        ).content.decode()
+        self.assertIn(f"id: {notification.id}\nevent: notification", content)
+
+
+@override_settings(NOTIFICATION_STREAM_POLL_INTERVAL=0.05)
+class NotificationStreamAppTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("listener", password="x")
+        self.profile = UserProfile.objects.create(user=self.user)
+        self.client.force_login(self.user)
+        self.cookie = (
+            f"{settings.SESSION_COOKIE_NAME}="
+            f"{self.client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        )
+        self.fallback_calls = []
+
+    async def fallback(self, scope, receive, send):
+        self.fallback_calls.append(scope["path"])
+
+    def scope(self, cookie):
+        return {
+            "type": "http",
+            "path": reverse("notifications:notification_stream"),
+            "headers": [(b"cookie", cookie.encode())],
+        }
+
+    async def test_pushes_new_notifications(self):
+        app = NotificationStreamApp(self.fallback)
+        messages = asyncio.Queue()
+        disconnected = asyncio.Event()
+
+        async def receive():
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def next_body():
+            message = await asyncio.wait_for(messages.get(), 5)
+            return message["body"].decode()
+
+        connection = asyncio.create_task(
+            app(self.scope(self.cookie), receive, messages.put)
+        )
+        start = await asyncio.wait_for(messages.get(), 5)
+        self.assertEqual(start["status"], 200)
+        self.assertTrue((await next_body()).startswith("retry: "))
+        self.assertIn('"unread": 0', await next_body())
+
+        notification = await Notification.objects.acreate(
+            user=self.profile,
+            notification_type="system",
+            title="Новое",
+            message="Текст",
+        )
+        event = await next_body()
+        self.assertIn(f"id: {notification.id}\n", event)
+        self.assertIn('"unread": 1', event)
+
+        hub = get_hub()
+        self.assertEqual(hub.connections, 1)
+        disconnected.set()
+        await asyncio.wait_for(connection, 5)
+        self.assertEqual(hub.connections, 0)
+        # Без подписчиков хаб прекращает опрос БД
+        await asyncio.wait_for(hub._task, 5)
+        self.assertEqual(self.fallback_calls, [])
+
+    async def test_stream_error_finishes_response(self):
+        app = NotificationStreamApp(self.fallback)
+        messages = []
+
+        async def receive():
+            # Клиент не отключается: ответ должен завершить сам поток
+            await asyncio.Event().wait()
+
+        async def send(message):
+            messages.append(message)
+
+        failing = mock.AsyncMock(side_effect=DatabaseError("БД недоступна"))
+        with mock.patch("notifications.stream.unread_state", failing):
+            with self.assertLogs("notifications.stream", "ERROR"):
+                await asyncio.wait_for(
+                    app(self.scope(self.cookie), receive, send), 5
+                )
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertTrue(messages[1]["body"].startswith(b"retry: "))
+        self.assertEqual(
+            messages[-1],
+            {"type": "http.response.body", "body": b"", "more_body": False},
+        )
+
+    async def test_hub_recycles_connections_around_polls(self):
+        hub = NotificationHub(poll_interval=0.01)
+        hub._subscribers[self.profile.id].add(asyncio.Queue())
+        calls = []
+
+        async def poll():
+            calls.append("poll")
+            if calls.count("poll") == 2:
+                hub._subscribers.clear()
+
+        with mock.patch.object(hub, "poll", poll), mock.patch(
+            "notifications.stream.close_old_connections",
+            lambda: calls.append("close"),
+        ):
+            await asyncio.wait_for(hub._run(), 5)
+        self.assertEqual(calls, ["close", "poll", "close"] * 2)
+
+    async def test_anonymous_goes_to_django(self):
+        app = NotificationStreamApp(self.fallback)
+        await app(self.scope(f"{settings.SESSION_COOKIE_NAME}=invalid"), None, None)
+        self.assertEqual(
+            self.fallback_calls, [reverse("notifications:notification_stream")]
+        )
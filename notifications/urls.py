@@ -7,6 +7,7 @@ from .views import (
     notification_list,
     notification_mark_read,
     notification_mark_all_read,
+    notification_stream,
 )
 
 app_name = "notifications"
@@ -31,4 +32,5 @@ urlpatterns = [
         name="notification_mark_read",
     ),
     path("mark-all-read/", notification_mark_all_read, name="mark_all_read"),
+    path("stream/", notification_stream, name="notification_stream"),
 ]
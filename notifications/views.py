@@ -2,14 +2,19 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.paginator import Paginator
+from django.http import HttpResponse
 
 from .models import Subscription, Notification
 from .forms import SubscriptionForm
+from .stream import event_stream, parse_event_id
 from emotions.models import Emotion
 from users.models import UserProfile
+from movie_emotion.db_router import stick_to_primary
+from movie_emotion.instrumentation import query_budget
 
 
 @login_required
+@query_budget(5)
 def subscription_list(request):
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,
@@ -88,6 +93,7 @@ def subscription_delete(request, subscription_id):
 
 @login_required
 def subscription_toggle(request, subscription_id):
+    stick_to_primary(request)
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,
         defaults={
@@ -108,6 +114,7 @@ def subscription_toggle(request, subscription_id):
 
 
 @login_required
+@query_budget(6)
 def notification_list(request):
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,
@@ -136,6 +143,7 @@ def notification_list(request):
 
 @login_required
 def notification_mark_read(request, notification_id):
+    stick_to_primary(request)
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,
         defaults={
@@ -155,6 +163,7 @@ def notification_mark_read(request, notification_id):
 
 @login_required
 def notification_mark_all_read(request):
+    stick_to_primary(request)
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,
         defaults={
@@ -167,3 +176,32 @@ def notification_mark_all_read(request):
     messages.success(request, "Все уведомления отмечены как прочитанные")
     
     return redirect("notifications:notification_list")
+
+
+@login_required
+async def notification_stream(request):
+    """
+    События уведомлений (server-sent events) без удержания соединения:
+    пропущенные с Last-Event-ID уведомления и число непрочитанных,
+    после чего браузер переподключается сам. Под ASGI авторизованные
+    подключения держит открытыми NotificationStreamApp.
+    """
+    profile, created = await UserProfile.objects.aget_or_create(
+        user=await request.auser(),
+        defaults={
+            "notification_frequency": "daily",
+            "email_notifications": True,
+        },
+    )
+    last_event_id = parse_event_id(
+        request.headers.get("Last-Event-ID") or request.GET.get("last_event_id")
+    )
+    events = [
+        event
+        async for event in event_stream(
+            profile.id, last_event_id=last_event_id, follow=False
+        )
+    ]
+    response = HttpResponse("".join(events), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    return response
@@ -0,0 +1,24 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    list_display = ["name", "status", "attempts", "run_at", "created_at", "finished_at"]
+    list_filter = ["status", "name"]
+    search_fields = ["name"]
+    readonly_fields = ["created_at", "finished_at", "locked_until", "last_error"]
+    show_full_result_count = False
+    actions = ["retry"]
+
+    @admin.action(description="Перезапустить выбранные задачи")
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Task.STATUS_RUNNING).update(
+            status=Task.STATUS_QUEUED,
+            attempts=0,
+            run_at=timezone.now(),
+            finished_at=None,
+        )
+        self.message_user(request, f"Поставлено в очередь задач: {updated}")
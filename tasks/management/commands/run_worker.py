@@ -0,0 +1,46 @@
+import signal
+
+from django.core.management.base import BaseCommand
+
+from tasks.worker import Worker
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди фоновых задач (рассылка уведомлений, письма, пересчеты)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--threads",
+            type=int,
+            default=4,
+            help="Количество потоков-исполнителей (по умолчанию 4)",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Пауза между опросами пустой очереди, сек (по умолчанию 1)",
+        )
+        parser.add_argument(
+            "--burst",
+            action="store_true",
+            help="Выполнить накопившиеся задачи и завершиться",
+        )
+
+    def handle(self, *args, **options):
+        worker = Worker(
+            threads=options["threads"],
+            poll_interval=options["poll_interval"],
+            stdout=self.stdout,
+        )
+        if options["burst"]:
+            processed = worker.run_pending()
+            self.stdout.write(self.style.SUCCESS(f"✅ Выполнено задач: {processed}"))
+            return
+
+        # Текущие задачи дорабатываются, новые не забираются
+        signal.signal(signal.SIGTERM, lambda *_: worker.stop())
+        signal.signal(signal.SIGINT, lambda *_: worker.stop())
+        self.stdout.write(f"Воркер запущен, потоков: {options['threads']}")
+        worker.run()
+        self.stdout.write(self.style.SUCCESS("✅ Воркер остановлен"))
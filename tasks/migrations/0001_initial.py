@@ -0,0 +1,116 @@
+# Generated by Django 6.1.2 on 2026-10-19 11:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = []
+
+    operations = [
+        migrations.CreateModel(
+            name="Task",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=200, verbose_name="Задача")),
+                (
+                    "args",
+                    models.JSONField(
+                        blank=True, default=list, verbose_name="Аргументы"
+                    ),
+                ),
+                (
+                    "kwargs",
+                    models.JSONField(
+                        blank=True, default=dict, verbose_name="Именованные аргументы"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("queued", "В очереди"),
+                            ("running", "Выполняется"),
+                            ("done", "Выполнена"),
+                            ("failed", "Ошибка"),
+                        ],
+                        default="queued",
+                        max_length=20,
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="Попыток"),
+                ),
+                (
+                    "max_attempts",
+                    models.PositiveIntegerField(
+                        default=3, verbose_name="Максимум попыток"
+                    ),
+                ),
+                (
+                    "timeout",
+                    models.PositiveIntegerField(
+                        default=300,
+                        help_text="Если воркер не завершил задачу за это время, ее заберет другой",
+                        verbose_name="Таймаут (сек)",
+                    ),
+                ),
+                (
+                    "run_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        verbose_name="Выполнить после",
+                    ),
+                ),
+                (
+                    "locked_until",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Заблокирована до"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="Последняя ошибка"),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "finished_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="Дата завершения"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Задача",
+                "verbose_name_plural": "Задачи",
+                "ordering": ["-created_at"],
+                "indexes": [
+                    models.Index(
+                        fields=["status", "run_at"], name="tasks_task_status_de4ee3_idx"
+                    ),
+                    models.Index(
+                        fields=["status", "locked_until"],
+                        name="tasks_task_status_9a0f79_idx",
+                    ),
+                ],
+            },
+        ),
+    ]
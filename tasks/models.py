@@ -0,0 +1,60 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди (выполняется командой run_worker)"""
+
+    STATUS_QUEUED = "queued"
+    STATUS_RUNNING = "running"
+    STATUS_DONE = "done"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, "В очереди"),
+        (STATUS_RUNNING, "Выполняется"),
+        (STATUS_DONE, "Выполнена"),
+        (STATUS_FAILED, "Ошибка"),
+    ]
+
+    name = models.CharField(max_length=200, verbose_name="Задача")
+    args = models.JSONField(default=list, blank=True, verbose_name="Аргументы")
+    kwargs = models.JSONField(
+        default=dict, blank=True, verbose_name="Именованные аргументы"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default=STATUS_QUEUED,
+        verbose_name="Статус",
+    )
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    max_attempts = models.PositiveIntegerField(
+        default=3, verbose_name="Максимум попыток"
+    )
+    timeout = models.PositiveIntegerField(
+        default=300,
+        verbose_name="Таймаут (сек)",
+        help_text="Если воркер не завершил задачу за это время, ее заберет другой",
+    )
+    run_at = models.DateTimeField(default=timezone.now, verbose_name="Выполнить после")
+    locked_until = models.DateTimeField(
+        null=True, blank=True, verbose_name="Заблокирована до"
+    )
+    last_error = models.TextField(blank=True, verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата создания")
+    finished_at = models.DateTimeField(
+        null=True, blank=True, verbose_name="Дата завершения"
+    )
+
+    class Meta:
+        verbose_name = "Задача"
+        verbose_name_plural = "Задачи"
+        ordering = ["-created_at"]
+        indexes = [
+            # Выборка готовых к запуску и зависших задач воркером
+            models.Index(fields=["status", "run_at"]),
+            models.Index(fields=["status", "locked_until"]),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.get_status_display()})"
@@ -0,0 +1,67 @@
+from functools import update_wrapper
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Task
+
+
+class TaskFunction:
+    """
+    Функция, которую можно поставить в очередь: func.enqueue(*args, **kwargs).
+    Аргументы сохраняются в JSON, поэтому передавать нужно id, а не объекты.
+    При TASKS_ALWAYS_EAGER задача выполняется сразу после коммита транзакции.
+    """
+
+    def __init__(self, func, max_attempts, timeout):
+        update_wrapper(self, func)
+        self.func = func
+        self.name = f"{func.__module__}.{func.__name__}"
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def enqueue(self, *args, **kwargs):
+        if getattr(settings, "TASKS_ALWAYS_EAGER", False):
+            transaction.on_commit(lambda: self.func(*args, **kwargs))
+            return None
+        # Внутри транзакции задача станет видна воркеру только после коммита
+        return Task.objects.create(
+            name=self.name,
+            args=list(args),
+            kwargs=kwargs,
+            max_attempts=self.max_attempts,
+            timeout=self.timeout,
+        )
+
+    def enqueue_many(self, args_list, batch_size=1000):
+        """Ставит в очередь по задаче на каждый кортеж аргументов одной вставкой"""
+        if getattr(settings, "TASKS_ALWAYS_EAGER", False):
+            for args in args_list:
+                self.enqueue(*args)
+            return []
+        return Task.objects.bulk_create(
+            (
+                Task(
+                    name=self.name,
+                    args=list(args),
+                    max_attempts=self.max_attempts,
+                    timeout=self.timeout,
+                )
+                for args in args_list
+            ),
+            batch_size=batch_size,
+        )
+
+
+def task(func=None, *, max_attempts=3, timeout=300):
+    """Декоратор фоновой задачи: @task или @task(max_attempts=5, timeout=60)"""
+
+    def decorator(func):
+        return TaskFunction(func, max_attempts, timeout)
+
+    if func is not None:
+        return decorator(func)
+    return decorator
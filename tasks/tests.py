@@ -0,0 +1,99 @@
+from datetime import timedelta
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from movie_emotion.startup import STARTUP_TARGETS, profile_startup
+
+from .models import Task
+from .queue import task
+from .worker import claim_task, execute_task
+
+CALLS = []
+
+
+@task(max_attempts=2)
+def record_call(value):
+    CALLS.append(value)
+
+
+@task(max_attempts=2)
+def always_fails():
+    raise RuntimeError("SMTP недоступен")
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue_and_execute(self):
+        record_call.enqueue(42)
+        task_row = claim_task()
+        self.assertEqual(task_row.status, Task.STATUS_RUNNING)
+        self.assertEqual(execute_task(task_row), "done")
+        self.assertEqual(CALLS, [42])
+        self.assertIsNone(claim_task())
+
+    def test_retries_then_fails(self):
+        task_row = always_fails.enqueue()
+        with self.assertLogs("tasks.worker", "ERROR"):
+            self.assertEqual(execute_task(claim_task()), "retry")
+
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, Task.STATUS_QUEUED)
+        self.assertGreater(task_row.run_at, timezone.now())
+        # Повтор - после паузы
+        self.assertIsNone(claim_task())
+
+        Task.objects.filter(pk=task_row.pk).update(run_at=timezone.now())
+        with self.assertLogs("tasks.worker", "ERROR"):
+            self.assertEqual(execute_task(claim_task()), "failed")
+        task_row.refresh_from_db()
+        self.assertEqual(task_row.status, Task.STATUS_FAILED)
+        self.assertIn("SMTP недоступен", task_row.last_error)
+
+    def test_reclaims_task_after_visibility_timeout(self):
+        record_call.enqueue(1)
+        stuck = claim_task()
+        self.assertIsNone(claim_task())
+
+        Task.objects.filter(pk=stuck.pk).update(
+            locked_until=timezone.now() - timedelta(seconds=1)
+        )
+        reclaimed = claim_task()
+        self.assertEqual(reclaimed.pk, stuck.pk)
+        self.assertEqual(reclaimed.attempts, 2)
+
+        # Результат первого (зависшего) воркера не перезаписывает новый
+        execute_task(reclaimed)
+        execute_task(stuck)
+        self.assertEqual(Task.objects.get(pk=stuck.pk).status, Task.STATUS_DONE)
+
+    @override_settings(TASKS_ALWAYS_EAGER=True)
+    def test_eager_mode_runs_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(record_call.enqueue(7))
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, [7])
+        self.assertFalse(Task.objects.exists())
+
+
+class ColdStartTests(SimpleTestCase):
+    # Нужны только по конкретным запросам, а не на старте процесса
+    DEFERRED_MODULES = {
+        "slugify",
+        "cProfile",
+        "notifications.fanout",
+        "concurrent.futures.process",
+    }
+
+    # Время старта зависит от машины и ее загрузки - бюджет проверяет
+    # manage.py startup_profile --check, здесь только состав импортов
+    def test_deferred_modules_not_imported(self):
+        for target, (command, _) in STARTUP_TARGETS.items():
+            with self.subTest(target=target):
+                result = profile_startup(command, runs=1)
+                imported = {module["module"] for module in result["modules"]}
+                if target == "worker":
+                    self.assertIn("tasks.worker", imported)
+                self.assertFalse(self.DEFERRED_MODULES & imported)
@@ -0,0 +1,137 @@
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.db import close_old_connections, connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from movie_emotion import metrics
+from movie_emotion.db_router import use_primary
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+# Пауза перед повтором: RETRY_BACKOFF * 2 ** (попытка - 1) секунд
+RETRY_BACKOFF = 10
+
+
+def claim_task():
+    """
+    Забирает одну готовую задачу: из очереди или зависшую у другого воркера
+    (истек locked_until). Строки, заблокированные другими воркерами,
+    пропускаются (SELECT ... FOR UPDATE SKIP LOCKED на PostgreSQL).
+    """
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            task = (
+                Task.objects.select_for_update(skip_locked=True)
+                .filter(
+                    Q(status=Task.STATUS_QUEUED, run_at__lte=now)
+                    | Q(status=Task.STATUS_RUNNING, locked_until__lt=now)
+                )
+                .order_by("run_at")
+                .first()
+            )
+            if task is None:
+                return None
+
+            if task.attempts >= task.max_attempts:
+                # Воркер упал или завис на последней попытке
+                task.status = Task.STATUS_FAILED
+                task.finished_at = now
+                task.last_error = task.last_error or "Превышен таймаут выполнения"
+                task.save(update_fields=["status", "finished_at", "last_error"])
+                continue
+
+            task.status = Task.STATUS_RUNNING
+            task.attempts += 1
+            task.locked_until = now + timedelta(seconds=task.timeout)
+            task.save(update_fields=["status", "attempts", "locked_until"])
+            return task
+
+
+def execute_task(task):
+    """Выполняет задачу и записывает результат; при ошибке планирует повтор"""
+    try:
+        # Задача читает то, что только что записал поставивший ее запрос
+        with use_primary(), metrics.timer("task_duration_seconds", task=task.name):
+            import_string(task.name)(*task.args, **task.kwargs)
+    except Exception:
+        logger.exception("Ошибка задачи %s #%s", task.name, task.pk)
+        now = timezone.now()
+        if task.attempts >= task.max_attempts:
+            changes = {"status": Task.STATUS_FAILED, "finished_at": now}
+        else:
+            delay = RETRY_BACKOFF * 2 ** (task.attempts - 1)
+            changes = {
+                "status": Task.STATUS_QUEUED,
+                "run_at": now + timedelta(seconds=delay),
+            }
+        changes["last_error"] = traceback.format_exc()
+        result = "retry" if changes["status"] == Task.STATUS_QUEUED else "failed"
+    else:
+        changes = {"status": Task.STATUS_DONE, "finished_at": timezone.now()}
+        result = "done"
+
+    metrics.inc("tasks_total", task=task.name, result=result)
+    # Если таймаут истек и задачу уже забрал другой воркер, результат не пишем
+    Task.objects.filter(pk=task.pk, attempts=task.attempts).update(
+        locked_until=None, **changes
+    )
+    return result
+
+
+class Worker:
+    """Пул потоков, которые забирают и выполняют задачи из очереди"""
+
+    def __init__(self, threads=4, poll_interval=1.0, stdout=None):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self.stdout = stdout
+        self._stop_event = threading.Event()
+
+    def run_pending(self):
+        """Выполняет задачи в текущем потоке, пока очередь не опустеет"""
+        processed = 0
+        while (task := claim_task()) is not None:
+            execute_task(task)
+            processed += 1
+        return processed
+
+    def _loop(self):
+        try:
+            while not self._stop_event.is_set():
+                close_old_connections()
+                task = claim_task()
+                if task is None:
+                    self._stop_event.wait(self.poll_interval)
+                    continue
+                result = execute_task(task)
+                if self.stdout:
+                    self.stdout.write(f"{task.name} #{task.pk}: {result}")
+        finally:
+            # У каждого потока свое соединение с БД
+            connection.close()
+
+    def run(self):
+        """Запускает потоки и ждет вызова stop()"""
+        workers = [
+            threading.Thread(target=self._loop, name=f"task-worker-{number}")
+            for number in range(self.threads)
+        ]
+        for thread in workers:
+            thread.start()
+        try:
+            while not self._stop_event.wait(0.5):
+                pass
+        finally:
+            self.stop()
+            for thread in workers:
+                thread.join()
+
+    def stop(self):
+        self._stop_event.set()
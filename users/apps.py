@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class UsersConfig(AppConfig):
     name = 'users'
+
+    def ready(self):
+        # Сброс кэша JWT-аутентификации при изменении пользователя
+        import users.signals
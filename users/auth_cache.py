@@ -0,0 +1,64 @@
+"""
+Кэш пользователей для JWT-аутентификации API (см. authentication.py).
+
+Ключ записи включает версию авторизации пользователя: смена пароля,
+деактивация, изменение профиля и выход из аккаунта увеличивают ее
+(см. signals.py), и следующие запросы читают пользователя из БД заново.
+Версия должна быть видна всем воркерам, поэтому кэш пользователей работает
+только с общим для процессов бэкендом (Redis, Memcached, БД, файлы).
+Модуль не импортирует DRF, поэтому сигналы не утяжеляют старт процесса.
+"""
+
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+
+AUTH_CACHE_TIMEOUT = 60
+
+# Бэкенды со своим кэшем в каждом процессе: сброс версии в одном воркере
+# не дошел бы до остальных, и они отдавали бы устаревшего пользователя
+PROCESS_LOCAL_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def auth_cache_enabled():
+    """Кэш пользователей включен, только если кэш общий для всех процессов"""
+    backend = settings.CACHES[DEFAULT_CACHE_ALIAS]["BACKEND"]
+    return backend not in PROCESS_LOCAL_BACKENDS
+
+
+def _version_key(user_id):
+    return f"auth:version:{user_id}"
+
+
+def _user_key(user_id, version):
+    return f"auth:user:{user_id}:{version}"
+
+
+def user_cache_key(user_id):
+    return _user_key(user_id, cache.get(_version_key(user_id), 0))
+
+
+def cache_user(key, user):
+    cache.set(key, user, getattr(settings, "AUTH_CACHE_TIMEOUT", AUTH_CACHE_TIMEOUT))
+
+
+def invalidate_user(user_id):
+    """
+    Увеличивает версию авторизации. Запрос, загрузивший пользователя
+    до этого, положит его в кэш под старой версией, где его уже не ищут
+    """
+    if not auth_cache_enabled():
+        return
+    key = _version_key(user_id)
+    cache.add(key, 0, None)
+    try:
+        version = cache.incr(key)
+    except ValueError:
+        # Ключ вытеснен между add и incr
+        version = 1
+        cache.set(key, version, None)
+    # Если версию вытеснят из кэша, она начнется с нуля: записи
+    # под прежней версией уже не должно быть
+    cache.delete(_user_key(user_id, version - 1))
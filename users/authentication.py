@@ -0,0 +1,38 @@
+from django.core.cache import cache
+from django.db.models import prefetch_related_objects
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+from movie_emotion import metrics
+from .auth_cache import auth_cache_enabled, cache_user, user_cache_key
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT-аутентификация без запроса пользователя к БД на каждый вызов API:
+    подпись и срок действия токена проверяются как обычно, а пользователь
+    вместе с профилем берется из кэша (см. auth_cache.py). С кэшем, который
+    у каждого процесса свой, работает как обычный JWTAuthentication
+    """
+
+    def get_user(self, validated_token):
+        if not auth_cache_enabled():
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            # Ошибку "нет идентификатора пользователя" формирует simplejwt
+            return super().get_user(validated_token)
+
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+        if user is not None:
+            metrics.inc("cache_requests_total", cache="auth", result="hit")
+            return user
+        metrics.inc("cache_requests_total", cache="auth", result="miss")
+
+        user = super().get_user(validated_token)
+        # Профиль кэшируется вместе с пользователем (user.profile без запроса)
+        prefetch_related_objects([user], "profile")
+        cache_user(key, user)
+        return user
@@ -0,0 +1,26 @@
+from django.contrib.auth.models import User
+from django.contrib.auth.signals import user_logged_out
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth_cache import invalidate_user
+from .models import UserProfile
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def _invalidate_cached_user(sender, instance, **kwargs):
+    """Смена пароля, деактивация и другие изменения пользователя"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def _invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
+@receiver(user_logged_out)
+def _invalidate_on_logout(sender, request, user, **kwargs):
+    if user is not None:
+        invalidate_user(user.pk)
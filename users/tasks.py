@@ -0,0 +1,26 @@
+from django.conf import settings
+from django.core.mail import send_mail
+
+from movie_emotion import metrics
+from tasks.queue import task
+
+
+@task(max_attempts=5, timeout=60)
+def send_confirmation_email(email, username, code):
+    """Письмо с кодом подтверждения регистрации"""
+    try:
+        send_mail(
+            subject="Код подтверждения регистрации",
+            message=(
+                f"Здравствуйте, {username}!\n\n"
+                f"Ваш код подтверждения: {code}\n"
+                f"Если вы не регистрировались, просто проигнорируйте это письмо.\n"
+            ),
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[email],
+            fail_silently=False,
+        )
+    except Exception:
+        metrics.inc("emails_failed_total", kind="confirmation")
+        raise
+    metrics.inc("emails_sent_total", kind="confirmation")
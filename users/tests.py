@@ -1,3 +1,115 @@
-from django.test import TestCase
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache.backends.filebased import FileBasedCache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework_simplejwt.tokens import AccessToken
+
+from films.models import Film
+from movie_emotion.testing import DatasetTestCase, QueryBudgetTestMixin
+
+FILE_CACHE = "django.core.cache.backends.filebased.FileBasedCache"
+LOCMEM_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+
+
+class ProfileQueryBudgetTests(QueryBudgetTestMixin, DatasetTestCase):
+    dataset = {
+        "films": 20,
+        "emotions": 4,
+        "ratings": 40,
+        "users": 1,
+        "subscriptions": 4,
+        "notifications": 20,
+        "seed": 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.first()
+        cls.user.profile.favorite_films.add(*Film.objects.all()[:10])
+
+    def test_profile(self):
+        self.client.force_login(self.user)
+        self.assertViewWithinBudget(reverse("users:profile"))
+
+
+# Бюджеты запросов рассчитаны на анонимные запросы
+@override_settings(QUERY_INSTRUMENTATION=False)
+class CachedJWTAuthenticationTests(DatasetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.user = User.objects.first()
+
+    def setUp(self):
+        super().setUp()
+        self.token = str(AccessToken.for_user(self.user))
+        # Файловый кэш общий для процессов, как Redis или Memcached
+        self.cache_dir = self.enterContext(tempfile.TemporaryDirectory())
+        self.enterContext(
+            override_settings(
+                CACHES={"default": {"BACKEND": FILE_CACHE, "LOCATION": self.cache_dir}}
+            )
+        )
+
+    def get(self, token=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse("emotion-list"),
+                HTTP_AUTHORIZATION=f"Bearer {token or self.token}",
+            )
+        return response, len(queries)
+
+    def test_user_and_profile_served_from_cache(self):
+        response, cold_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        response, warm_queries = self.get()
+        self.assertEqual(response.status_code, 200)
+        # Пользователь и профиль
+        self.assertEqual(cold_queries - warm_queries, 2)
+
+    def test_password_change_invalidates_cache(self):
+        self.get()
+        self.user.set_password("new-password")
+        self.user.save()
+        _, queries = self.get()
+        _, warm_queries = self.get()
+        self.assertEqual(queries - warm_queries, 2)
+
+    def test_deactivation_rejects_cached_user(self):
+        self.get()
+        self.user.is_active = False
+        self.user.save()
+        response, _ = self.get()
+        self.assertEqual(response.status_code, 401)
+
+    def test_invalidation_reaches_other_processes(self):
+        self.get()
+        # Пароль меняется в другом воркере: у него свой экземпляр кэша
+        other_process_cache = FileBasedCache(self.cache_dir, {})
+        with mock.patch("users.auth_cache.cache", other_process_cache):
+            self.user.set_password("new-password")
+            self.user.save()
+        _, queries = self.get()
+        _, warm_queries = self.get()
+        self.assertEqual(queries - warm_queries, 2)
+
+    def test_disabled_with_process_local_cache(self):
+        with override_settings(CACHES={"default": {"BACKEND": LOCMEM_CACHE}}):
+            response, cold_queries = self.get()
+            self.assertEqual(response.status_code, 200)
+            _, warm_queries = self.get()
+        self.assertEqual(cold_queries, warm_queries)
+
+    def test_logout_invalidates_cache(self):
+        self.get()
+        self.client.force_login(self.user)
+        self.client.post(reverse("users:logout"))
+        _, queries = self.get()
+        _, warm_queries = self.get()
+        self.assertEqual(queries - warm_queries, 2)
@@ -4,8 +4,6 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.generic import CreateView, UpdateView, FormView
 from django.urls import reverse_lazy, reverse
-from django.core.mail import send_mail
-from django.conf import settings
 from django.utils import timezone
 from datetime import timedelta
 import random
@@ -16,7 +14,10 @@ from django.contrib.auth.models import User
 
 from .models import UserProfile, EmailConfirmation
 from .forms import UserRegistrationForm, UserProfileForm, ConfirmCodeForm
+from .tasks import send_confirmation_email
 from films.models import Film
+from movie_emotion.db_router import stick_to_primary
+from movie_emotion.instrumentation import query_budget
 
 
 class CustomLoginView(auth_views.LoginView):
@@ -59,21 +60,8 @@ class RegisterView(CreateView):
         code = str(random.randint(100000, 999999))
         EmailConfirmation.objects.create(email=email, code=code)
 
-        # Отправляем письмо с кодом подтверждения
-        try:
-            send_mail(
-                subject="Код подтверждения регистрации",
-                message=(
-                    f"Здравствуйте, {username}!\n\n"
-                    f"Ваш код подтверждения: {code}\n"
-                    f"Если вы не регистрировались, просто проигнорируйте это письмо.\n"
-                ),
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[email],
-                fail_silently=False,
-            )
-        except Exception as e:
-            print(f"Ошибка отправки письма с кодом подтверждения: {e}")
+        # Письмо отправляет воркер очереди - ответ не ждет SMTP
+        send_confirmation_email.enqueue(email, username, code)
 
         messages.info(
             self.request,
@@ -178,6 +166,7 @@ class ConfirmRegistrationView(FormView):
 
 
 @login_required
+@query_budget(8)
 def profile_view(request):
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,
@@ -190,7 +179,9 @@ def profile_view(request):
     )
 
     favorite_films = profile.favorite_films.all()
-    subscriptions = profile.subscriptions.filter(is_active=True)
+    subscriptions = profile.subscriptions.filter(is_active=True).select_related(
+        "emotion"
+    )
     notifications = profile.notifications.filter(is_read=False).order_by("-created_at")[
         :10
     ]
@@ -232,6 +223,7 @@ def profile_edit_view(request):
 
 @login_required
 def toggle_favorite(request, film_id):
+    stick_to_primary(request)
     film = get_object_or_404(Film, id=film_id, is_published=True)
     profile, created = UserProfile.objects.get_or_create(
         user=request.user,